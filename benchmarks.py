@@ -0,0 +1,1283 @@
+"""
+Benchmarks - Healthcare AI RAG System
+Latency and quality comparisons for retrieval and ingestion options
+
+Usage:
+    python benchmarks.py mmr-select
+    python benchmarks.py mmr --collection healthcare_ai_500_large
+    python benchmarks.py shards --shards 1 2 4 8
+    python benchmarks.py ingest --workers 1 2 4 8
+    python benchmarks.py startup --save startup_history.jsonl
+    python benchmarks.py microbatch --clients 32 --window-ms 5
+    python benchmarks.py memory --chunks 100000 --dim 3072
+    python benchmarks.py parent-child --docs 50 --parent-size 2000 --child-size 300
+    python benchmarks.py bulk-ask --concurrency 1 4 16 64 --llm-ms 500
+    python benchmarks.py tenants --tenants 20 --memory-mb 16
+    python benchmarks.py embed --chunks 20000 --dim 256
+    python benchmarks.py chunk-store --docs 100 --chunk-size 500 --chunk-overlap 100
+    python benchmarks.py reindex --docs 40 --rebuilds 3
+    python benchmarks.py multi-query --variants 4 --latency-ms 80
+
+Add --embeddings hashing (rag_cli.py) or EMBEDDING_PROVIDER=hashing to run
+the collection benchmarks offline.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+# Heavy modules (chromadb, LangChain, the RAG modules) are imported inside
+# each benchmark so `rag_cli.py bench` starts quickly.
+
+
+BENCH_QUERIES = [
+    "What is Elevance Health's AI strategy?",
+    "How are payers using AI in 2025?",
+    "What are the workforce challenges in healthcare?",
+    "How is AI being used in utilization management?",
+    "What are the cybersecurity concerns for health systems?",
+    "What are the main challenges for health systems in 2026?",
+]
+
+
+def _timed(fn, repeats):
+    """Run fn repeats times and return (last result, per-call latencies in ms)"""
+    latencies = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return result, np.array(latencies)
+
+
+def _mmr_select_loop(query_embedding, candidate_embeddings, k=5, lambda_mult=0.5):
+    """Reference MMR with a Python loop over every candidate pair"""
+    from retrieval_modes import _normalize
+
+    candidates = [list(v) for v in _normalize(candidate_embeddings)]
+    query = list(_normalize(query_embedding))
+
+    def dot(a, b):
+        return sum(x * y for x, y in zip(a, b))
+
+    relevance = [dot(c, query) for c in candidates]
+    selected = [max(range(len(candidates)), key=lambda i: relevance[i])]
+    while len(selected) < min(k, len(candidates)):
+        best, best_score = None, -float("inf")
+        for i in range(len(candidates)):
+            if i in selected:
+                continue
+            redundancy = max(dot(candidates[i], candidates[j]) for j in selected)
+            score = lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy
+            if score > best_score:
+                best, best_score = i, score
+        selected.append(best)
+    return selected
+
+
+def bench_mmr_select(fetch_k=50, dim=3072, k=5, lambda_mult=0.5, repeats=20):
+    """
+    Compare vectorized MMR selection with a per-pair Python loop
+
+    Uses random vectors, so it runs without an API key or a collection.
+    """
+    from retrieval_modes import mmr_select
+    print("\n" + "="*70)
+    print(" ⏱️  MMR SELECTION: VECTORIZED vs PYTHON LOOP")
+    print("="*70)
+    print(f"   Candidates: {fetch_k} | Dimensions: {dim} | k: {k} | lambda: {lambda_mult}")
+
+    rng = np.random.default_rng(0)
+    candidates = rng.standard_normal((fetch_k, dim)).astype(np.float32)
+    query = rng.standard_normal(dim).astype(np.float32)
+
+    fast, fast_ms = _timed(lambda: mmr_select(query, candidates, k, lambda_mult), repeats)
+    slow, slow_ms = _timed(lambda: _mmr_select_loop(query, candidates, k, lambda_mult), max(1, repeats // 10))
+
+    print(f"\n   Vectorized:  {np.median(fast_ms):8.2f} ms (median)")
+    print(f"   Python loop: {np.median(slow_ms):8.2f} ms (median)")
+    print(f"   Speedup:     {np.median(slow_ms) / np.median(fast_ms):8.1f}x")
+    print(f"   Same selection: {'✅' if fast == slow else '❌'}")
+
+    return {"vectorized_ms": float(np.median(fast_ms)), "loop_ms": float(np.median(slow_ms))}
+
+
+def _redundancy(collection, ids):
+    """Mean pairwise cosine similarity among the returned chunks"""
+    from retrieval_modes import _normalize
+
+    if len(ids) < 2:
+        return 0.0
+    stored = collection.get(ids=ids, include=["embeddings"])
+    vectors = _normalize(stored["embeddings"])
+    sims = vectors @ vectors.T
+    upper = sims[np.triu_indices(len(ids), k=1)]
+    return float(upper.mean())
+
+
+def bench_mmr(collection_name="healthcare_ai_500_large", k=5, fetch_k=20,
+              lambda_mult=0.5, queries=None):
+    """
+    Compare MMR retrieval against plain similarity search on a live collection
+
+    Reports latency, distinct sources, redundancy among the top k,
+    and how many results the two modes share.
+    """
+    import chromadb
+    from collection_versions import resolve
+    from rag_pipeline import RAGSystem
+    from retrieval_modes import mmr_query
+
+    queries = queries or BENCH_QUERIES
+    rag = RAGSystem()
+    client = chromadb.PersistentClient(path="./chroma_db")
+    collection = client.get_collection(resolve(client, collection_name))
+
+    print("\n" + "="*70)
+    print(" ⚖️  MMR vs SIMILARITY SEARCH")
+    print("="*70)
+    print(f"   Collection: {collection_name} | k: {k} | fetch_k: {fetch_k} | lambda: {lambda_mult}")
+
+    rows = []
+    for query in queries:
+        # Embed once so both modes measure only the search itself
+        query_embedding = rag.embeddings.embed_query(query)
+        sim, sim_ms = _timed(lambda: collection.query(query_embeddings=[query_embedding], n_results=k), 3)
+        mmr, mmr_ms = _timed(lambda: mmr_query(client, collection_name, query_embedding, k, fetch_k, lambda_mult), 3)
+
+        sim_ids, mmr_ids = sim["ids"][0], mmr["ids"][0]
+        rows.append({
+            "query": query,
+            "sim_ms": float(np.median(sim_ms)),
+            "mmr_ms": float(np.median(mmr_ms)),
+            "sim_sources": len({m.get("source") for m in sim["metadatas"][0]}),
+            "mmr_sources": len({m.get("source") for m in mmr["metadatas"][0]}),
+            "sim_redundancy": _redundancy(collection, sim_ids),
+            "mmr_redundancy": _redundancy(collection, mmr_ids),
+            "shared": len(set(sim_ids) & set(mmr_ids)),
+        })
+
+    print(f"\n{'Query':<42} {'sim ms':>7} {'mmr ms':>7} {'src s/m':>8} {'redund s/m':>12} {'shared':>7}")
+    print("─"*88)
+    for r in rows:
+        print(f"{r['query'][:40]:<42} {r['sim_ms']:7.1f} {r['mmr_ms']:7.1f} "
+              f"{r['sim_sources']:>3}/{r['mmr_sources']:<4} "
+              f"{r['sim_redundancy']:5.3f}/{r['mmr_redundancy']:<6.3f} {r['shared']:>4}/{k}")
+
+    return rows
+
+
+def bench_shards(shard_counts=(1, 2, 4, 8), n_chunks=20000, dim=256, n_queries=200, k=5):
+    """
+    Query latency and ingest throughput as the shard count grows
+
+    Uses random vectors in a temporary directory, so it runs without an
+    API key and leaves ./chroma_db alone.
+    """
+    from sharding import ShardedRAGSystem
+
+    print("\n" + "="*70)
+    print(" 🧩 SHARDED SCATTER-GATHER SEARCH")
+    print("="*70)
+    print(f"   Chunks: {n_chunks:,} | Dimensions: {dim} | Queries: {n_queries} | k: {k}")
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((n_chunks, dim)).astype(np.float32)
+    queries = rng.standard_normal((n_queries, dim)).astype(np.float32)
+    ids = [f"doc_{i}" for i in range(n_chunks)]
+    texts = [f"chunk {i}" for i in range(n_chunks)]
+    metadatas = [{"source": f"source_{i % 10}"} for i in range(n_chunks)]
+
+    rows = []
+    for num_shards in shard_counts:
+        with tempfile.TemporaryDirectory() as path:
+            sharded = ShardedRAGSystem(collection_name="bench", num_shards=num_shards, path=path)
+
+            start = time.perf_counter()
+            sharded.add(ids, embeddings, texts, metadatas, batch_size=500)
+            ingest_s = time.perf_counter() - start
+
+            latencies = []
+            for query in queries:
+                t0 = time.perf_counter()
+                sharded.search(query, n_results=k)
+                latencies.append((time.perf_counter() - t0) * 1000)
+            latencies = np.array(latencies)
+
+            rows.append({
+                "shards": num_shards,
+                "ingest_per_s": n_chunks / ingest_s,
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p95_ms": float(np.percentile(latencies, 95)),
+            })
+
+    print(f"\n{'Shards':>7} {'Ingest chunks/s':>16} {'Query p50 ms':>13} {'Query p95 ms':>13}")
+    print("─"*52)
+    for r in rows:
+        print(f"{r['shards']:>7} {r['ingest_per_s']:>16,.0f} {r['p50_ms']:>13.2f} {r['p95_ms']:>13.2f}")
+
+    return rows
+
+
+def _synthetic_documents(n_docs, doc_chars, seed=0):
+    """Random prose-like documents with paragraph and sentence structure"""
+    from langchain_core.documents import Document
+
+    rng = np.random.default_rng(seed)
+    vocab = ["payer", "health", "system", "AI", "utilization", "management", "prior",
+             "authorization", "workforce", "member", "claims", "model", "clinical", "data"]
+    documents = []
+    for d in range(n_docs):
+        words = rng.choice(vocab, size=doc_chars // 7)
+        breaks = rng.integers(0, 40, size=len(words))
+        parts = []
+        for word, b in zip(words, breaks):
+            parts.append(word + ("\n\n" if b == 0 else ". " if b < 4 else " "))
+        documents.append(Document(page_content="".join(parts)[:doc_chars],
+                                  metadata={"source": f"synthetic://doc/{d}"}))
+    return documents
+
+
+def bench_ingest(worker_counts=(1, 2, 4), n_docs=200, doc_chars=50000):
+    """
+    Chunking throughput of the serial path vs the process-pool path
+
+    Also checks that every worker count produces exactly the serial chunks.
+    """
+    from rag_pipeline import RAGSystem
+
+    print("\n" + "="*70)
+    print(" ⚙️  PROCESS-POOL INGESTION")
+    print("="*70)
+    print(f"   Documents: {n_docs} | Characters each: {doc_chars:,} | CPUs: {os.cpu_count()}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        rag = RAGSystem(embedding_provider="hashing")
+    documents = _synthetic_documents(n_docs, doc_chars)
+    total_mb = n_docs * doc_chars / 1e6
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        serial = rag.create_chunks(documents)
+        serial_s = time.perf_counter() - start
+
+    rows = [{"workers": "serial", "seconds": serial_s, "identical": True}]
+    for workers in worker_counts:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            chunks = rag.load_and_chunk(documents=documents, workers=workers)
+            elapsed = time.perf_counter() - start
+        identical = [(c.page_content, c.metadata) for c in chunks] == \
+                    [(c.page_content, c.metadata) for c in serial]
+        rows.append({"workers": workers, "seconds": elapsed, "identical": identical})
+
+    print(f"\n{'Workers':>8} {'Seconds':>9} {'MB/s':>8} {'Speedup':>8} {'Identical':>10}")
+    print("─"*47)
+    for r in rows:
+        print(f"{r['workers']:>8} {r['seconds']:>9.2f} {total_mb / r['seconds']:>8.2f} "
+              f"{serial_s / r['seconds']:>7.2f}x {'✅' if r['identical'] else '❌':>9}")
+
+    return rows
+
+
+def bench_startup(repeats=5, save_path=None):
+    """
+    Cold-start time of the CLI and of each subcommand's imports
+
+    Each measurement is a fresh interpreter, so module caches from this
+    process do not help. With save_path, one JSON line per run is appended
+    so startup time can be tracked over time.
+    """
+    from rag_cli import SUBCOMMAND_MODULES
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    cases = [
+        ("python (baseline)", "pass"),
+        ("rag_cli --help", "import sys, rag_cli; sys.argv = ['rag_cli.py', '--help']\n"
+                           "try:\n    rag_cli.main()\nexcept SystemExit:\n    pass"),
+    ]
+    cases += [(name, f"import rag_cli; rag_cli.load_subcommand({name!r})") for name in SUBCOMMAND_MODULES]
+
+    print("\n" + "="*70)
+    print(" 🚀 CLI COLD-START TIME")
+    print("="*70)
+    print(f"   Repeats: {repeats} (fresh interpreter each)")
+
+    rows = []
+    for label, code in cases:
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=repo_dir,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+            times.append((time.perf_counter() - start) * 1000)
+        rows.append({"case": label, "median_ms": float(np.median(times)), "min_ms": float(np.min(times))})
+
+    print(f"\n{'Case':<22} {'Median ms':>10} {'Min ms':>9}")
+    print("─"*43)
+    for r in rows:
+        print(f"{r['case']:<22} {r['median_ms']:>10.0f} {r['min_ms']:>9.0f}")
+
+    if save_path:
+        with open(save_path, "a") as f:
+            f.write(json.dumps({"timestamp": time.time(), "results": rows}) + "\n")
+        print(f"\n💾 Appended results to {save_path}")
+
+    return rows
+
+
+class _LatencyEmbeddings:
+    """Offline stand-in for a remote embedding API: fixed round trip plus per-text cost"""
+
+    def __init__(self, dim, round_trip_ms=30.0, per_text_ms=0.2):
+        self.dim = dim
+        self.round_trip = round_trip_ms / 1000
+        self.per_text = per_text_ms / 1000
+        self.calls = 0
+
+    def _vector(self, text):
+        seed = sum(ord(c) * (i + 1) for i, c in enumerate(text)) % (2**32)
+        return np.random.default_rng(seed).standard_normal(self.dim).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.round_trip + self.per_text * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def bench_microbatch(clients=32, per_client=20, window_ms=5.0, max_batch=16,
+                     n_chunks=5000, dim=256, round_trip_ms=30.0, k=5):
+    """
+    Throughput and tail latency of concurrent searches, direct vs micro-batched
+
+    Each client thread issues queries back to back. The embedding model is
+    simulated with a fixed round trip, so no API key is needed.
+    """
+    import chromadb
+    from micro_batch import MicroBatcher
+    from partitions import search
+
+    print("\n" + "="*70)
+    print(" 📦 MICRO-BATCHED QUERIES")
+    print("="*70)
+    print(f"   Clients: {clients} x {per_client} queries | Chunks: {n_chunks:,} | "
+          f"Embedding round trip: {round_trip_ms:.0f} ms | Window: {window_ms} ms | Max batch: {max_batch}")
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as path:
+        client = chromadb.PersistentClient(path=path)
+        collection = client.create_collection("bench", metadata={"hnsw:space": "cosine"})
+        vectors = rng.standard_normal((n_chunks, dim)).astype(np.float32)
+        for start in range(0, n_chunks, 1000):
+            end = min(start + 1000, n_chunks)
+            collection.add(ids=[f"doc_{i}" for i in range(start, end)], embeddings=vectors[start:end],
+                           documents=[f"chunk {i}" for i in range(start, end)])
+
+        def run(search_fn):
+            latencies = []
+            lock = threading.Lock()
+
+            def worker(c):
+                for q in range(per_client):
+                    t0 = time.perf_counter()
+                    search_fn(f"{BENCH_QUERIES[q % len(BENCH_QUERIES)]} #{c}-{q}")
+                    with lock:
+                        latencies.append((time.perf_counter() - t0) * 1000)
+
+            threads = [threading.Thread(target=worker, args=(c,)) for c in range(clients)]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - start
+            latencies = np.array(latencies)
+            return {
+                "qps": len(latencies) / elapsed,
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+            }
+
+        embeddings = _LatencyEmbeddings(dim, round_trip_ms)
+        direct = run(lambda text: search(client, "bench", embeddings.embed_query(text), n_results=k))
+        direct["calls"] = embeddings.calls
+
+        embeddings = _LatencyEmbeddings(dim, round_trip_ms)
+        batcher = MicroBatcher(embeddings, client, "bench", max_batch=max_batch, max_wait_ms=window_ms)
+        batched = run(lambda text: batcher.search(text, n_results=k))
+        batcher.close()
+        batched["calls"] = embeddings.calls
+        stats = batcher.metrics.snapshot()
+
+    print(f"\n{'Mode':<10} {'Queries/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'Embed calls':>12}")
+    print("─"*54)
+    for name, r in (("direct", direct), ("batched", batched)):
+        print(f"{name:<10} {r['qps']:>10.1f} {r['p50_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['calls']:>12,}")
+    print(f"\n   Mean batch: {stats['mean_batch_size']} ({stats['batch_fill']:.0%} full) | "
+          f"Added queueing p50/p99: {stats['queue_delay_p50_ms']}/{stats['queue_delay_p99_ms']} ms")
+
+    return {"direct": direct, "batched": batched, "batching": stats}
+
+
+class _ListEmbeddings:
+    """Offline embeddings that return lists of Python floats, like the OpenAI client"""
+
+    def __init__(self, dim, seed=0):
+        self.dim = dim
+        self.rng = np.random.default_rng(seed)
+
+    def embed_documents(self, texts):
+        return self.rng.standard_normal((len(texts), self.dim)).tolist()
+
+
+def _rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _memory_run(mode, n_chunks, dim, batch_size=1000):
+    """
+    One side of the memory benchmark, run in a fresh interpreter
+
+    Embeds n_chunks texts, writes the backup pickle and walks the storage
+    batches, either the old way (one list of float lists) or as a float32
+    array. Prints a JSON line with peak and baseline RSS.
+    """
+    import pickle
+    import resource
+    from rag_pipeline import embed_array
+
+    texts = [f"chunk {i}" for i in range(n_chunks)]
+    embeddings = _ListEmbeddings(dim)
+    baseline = _rss_mb()
+    start = time.perf_counter()
+
+    if mode == "lists":
+        vectors = []
+        for i in range(0, n_chunks, batch_size):
+            vectors.extend(embeddings.embed_documents(texts[i:i + batch_size]))
+        batches = lambda rows: [vectors[j] for j in rows]
+    else:
+        vectors = embed_array(embeddings, texts, batch_size=batch_size)
+        batches = lambda rows: vectors[rows]
+
+    with tempfile.TemporaryFile() as f:
+        pickle.dump({"embeddings": vectors}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        backup_mb = f.tell() / 1e6
+
+    for i in range(0, n_chunks, 50):
+        batches(list(range(i, min(i + 50, n_chunks))))
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({
+        "mode": mode,
+        "baseline_mb": baseline,
+        "peak_mb": peak,
+        "backup_mb": backup_mb,
+        "seconds": time.perf_counter() - start,
+    }))
+
+
+def bench_memory(n_chunks=100000, dim=3072):
+    """
+    Peak RSS of the embedding path: lists of floats vs a float32 array
+
+    Each mode runs in its own interpreter so peaks don't mix. The list
+    mode needs roughly 32 bytes per float, so 100k x 3072 needs ~10 GB;
+    lower --chunks or --dim on small machines.
+    """
+    print("\n" + "="*70)
+    print(" 🧮 EMBEDDING MEMORY: LISTS VS FLOAT32 ARRAY")
+    print("="*70)
+    print(f"   Chunks: {n_chunks:,} | Dimensions: {dim}")
+
+    repo = os.path.dirname(os.path.abspath(__file__))
+    rows = []
+    for mode in ("lists", "array"):
+        code = f"import benchmarks; benchmarks._memory_run({mode!r}, {n_chunks}, {dim})"
+        out = subprocess.run([sys.executable, "-c", code], cwd=repo,
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            print(f"   ❌ {mode} run failed (exit {out.returncode}), likely out of memory")
+            continue
+        rows.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"\n{'Mode':<7} {'Peak RSS MB':>12} {'Embeddings MB':>14} {'Per chunk KB':>13} {'Backup MB':>10} {'Seconds':>8}")
+    print("─"*69)
+    for r in rows:
+        used = r["peak_mb"] - r["baseline_mb"]
+        print(f"{r['mode']:<7} {r['peak_mb']:>12,.0f} {used:>14,.0f} {used * 1024 / n_chunks:>13.1f} "
+              f"{r['backup_mb']:>10,.0f} {r['seconds']:>8.1f}")
+
+    return rows
+
+
+def bench_parent_child(n_docs=50, doc_chars=50000, chunk_size=500, chunk_overlap=100,
+                       parent_size=2000, child_size=300, child_overlap=50,
+                       dim=256, n_queries=200, k=5, fetch_k=20):
+    """
+    Storage and search latency: single-size chunks vs a parent-child index
+
+    Both indexes are built from the same synthetic documents in a temporary
+    directory, with offline embeddings, so only the index layout differs.
+    """
+    import chromadb
+    from collection_versions import resolve
+    from parent_child import ParentChildIndex
+    from partitions import search
+    from rag_pipeline import embed_array, iter_split, make_text_splitter
+    from hnsw_tuning import _dir_size
+
+    print("\n" + "="*70)
+    print(" 🪆 PARENT-CHILD VS SINGLE-SIZE INDEX")
+    print("="*70)
+    print(f"   Documents: {n_docs} x {doc_chars:,} chars | Single: {chunk_size}/{chunk_overlap} | "
+          f"Parent {parent_size}, child {child_size}/{child_overlap} | k: {k}, fetch_k: {fetch_k}")
+
+    documents = _synthetic_documents(n_docs, doc_chars)
+    embeddings = _LatencyEmbeddings(dim, round_trip_ms=0.0, per_text_ms=0.0)
+    queries = np.asarray(embeddings.embed_documents(
+        [f"{BENCH_QUERIES[i % len(BENCH_QUERIES)]} #{i}" for i in range(n_queries)]), dtype=np.float32)
+
+    def latencies(fn):
+        fn(queries[0])  # warm
+        times = []
+        contexts = []
+        for query in queries:
+            t0 = time.perf_counter()
+            contexts.append(fn(query))
+            times.append((time.perf_counter() - t0) * 1000)
+        return np.array(times), float(np.mean(contexts))
+
+    rows = []
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "single")
+        client = chromadb.PersistentClient(path=path)
+        chunks = list(iter_split(make_text_splitter(chunk_size, chunk_overlap), documents))
+        texts = [chunk.page_content for chunk in chunks]
+        vectors = embed_array(embeddings, texts)
+        collection = client.create_collection("single")
+        for start in range(0, len(chunks), 1000):
+            end = start + 1000
+            collection.add(ids=[f"doc_{i}" for i in range(start, min(end, len(chunks)))],
+                           embeddings=vectors[start:end], documents=texts[start:end],
+                           metadatas=[chunk.metadata for chunk in chunks[start:end]])
+        times, context = latencies(lambda q: sum(
+            len(text) for text in search(client, "single", q, n_results=k, include=["documents"])["documents"][0]))
+        rows.append({"index": "single", "vectors": len(chunks), "text_chars": sum(map(len, texts)),
+                     "disk_mb": _dir_size(path) / 1e6, "context_chars": context,
+                     "p50_ms": float(np.percentile(times, 50)), "p95_ms": float(np.percentile(times, 95))})
+
+        path = os.path.join(root, "parent_child")
+        index = ParentChildIndex(embeddings, "parent_child", path, parent_size, child_size, child_overlap)
+        with contextlib.redirect_stdout(io.StringIO()):
+            n_parents, n_children = index.store(documents)
+        version = resolve(index.client, "parent_child")
+        child_chars = sum(len(text) for text in index.client.get_collection(version)
+                          .get(include=["documents"])["documents"])
+        _, parent_chars = index.parents.size(version)
+        times, context = latencies(lambda q: sum(
+            len(p.page_content) for p in index.search(None, k=k, fetch_k=fetch_k, query_embedding=q)))
+        rows.append({"index": "parent-child", "vectors": n_children, "text_chars": child_chars + parent_chars,
+                     "disk_mb": _dir_size(path) / 1e6, "context_chars": context,
+                     "p50_ms": float(np.percentile(times, 50)), "p95_ms": float(np.percentile(times, 95))})
+
+    source_chars = sum(len(doc.page_content) for doc in documents)
+    print(f"\n{'Index':<13} {'Vectors':>8} {'Text stored':>12} {'Disk MB':>8} {'Context chars':>14} "
+          f"{'p50 ms':>7} {'p95 ms':>7}")
+    print("─"*75)
+    for r in rows:
+        print(f"{r['index']:<13} {r['vectors']:>8,} {r['text_chars'] / source_chars:>11.2f}x "
+              f"{r['disk_mb']:>8.1f} {r['context_chars']:>14,.0f} {r['p50_ms']:>7.2f} {r['p95_ms']:>7.2f}")
+    print(f"\n   Text stored is relative to the {source_chars:,} source characters; "
+          f"parent-child stores {n_parents:,} parents once")
+
+    return rows
+
+
+def _latency_chat_model(latency_ms, slow_every=0, fail_every=0):
+    """
+    Offline chat model with a fixed generation latency (sync and async)
+
+    Every slow_every-th call takes 20x longer (to trip timeouts) and every
+    fail_every-th call raises, so partial failures can be exercised.
+    """
+    import asyncio
+    from itertools import count
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import AIMessage
+    from langchain_core.outputs import ChatGeneration, ChatResult
+
+    calls = count(1)
+
+    class LatencyChatModel(BaseChatModel):
+        @property
+        def _llm_type(self):
+            return "latency-fake"
+
+        def _plan(self):
+            n = next(calls)
+            if fail_every and n % fail_every == 0:
+                raise RuntimeError(f"injected failure on call {n}")
+            slow = slow_every and n % slow_every == 0
+            return latency_ms / 1000 * (20 if slow else 1)
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            time.sleep(self._plan())
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content="answer"))])
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            await asyncio.sleep(self._plan())
+            return ChatResult(generations=[ChatGeneration(message=AIMessage(content="answer"))])
+
+    return LatencyChatModel()
+
+
+def bench_bulk_ask(concurrencies=(1, 2, 4, 8, 16, 32), n_questions=64, llm_ms=500.0,
+                   timeout=5.0, slow_every=0, fail_every=0, n_chunks=2000, dim=256, k=5):
+    """
+    Bulk Q&A throughput vs concurrency, against an offline model with injected latency
+
+    The serial row is today's loop of rag_chain.invoke calls; the others
+    are ask_many at each concurrency cap.
+    """
+    import chromadb
+    from retrieval_qa_custom import ask_many, create_rag_chain
+
+    print("\n" + "="*70)
+    print(" 🚚 BULK ASK: THROUGHPUT VS CONCURRENCY")
+    print("="*70)
+    print(f"   Questions: {n_questions} | Model latency: {llm_ms:.0f} ms | Timeout: {timeout}s | "
+          f"Slow every: {slow_every or '-'} | Fail every: {fail_every or '-'}")
+
+    questions = [f"{BENCH_QUERIES[i % len(BENCH_QUERIES)]} #{i}" for i in range(n_questions)]
+    rng = np.random.default_rng(0)
+    rows = []
+    with tempfile.TemporaryDirectory() as path:
+        client = chromadb.PersistentClient(path=path)
+        collection = client.create_collection("bench")
+        vectors = rng.standard_normal((n_chunks, dim)).astype(np.float32)
+        for start in range(0, n_chunks, 1000):
+            end = min(start + 1000, n_chunks)
+            collection.add(ids=[f"doc_{i}" for i in range(start, end)], embeddings=vectors[start:end],
+                           documents=[f"chunk {i}" for i in range(start, end)],
+                           metadatas=[{"source": f"synthetic://doc/{i // 10}", "start_index": 0}
+                                      for i in range(start, end)])
+        embeddings = _LatencyEmbeddings(dim, round_trip_ms=0.0, per_text_ms=0.0)
+
+        def chain():
+            llm = _latency_chat_model(llm_ms, slow_every, fail_every)
+            return create_rag_chain("bench", client=client, embeddings=embeddings, llm=llm, k=k)
+
+        rag_chain, retriever = chain()
+        start = time.perf_counter()
+        failed = 0
+        for question in questions:
+            try:
+                rag_chain.invoke(question)
+            except Exception:
+                failed += 1
+        elapsed = time.perf_counter() - start
+        rows.append({"mode": "serial", "concurrency": 1, "seconds": elapsed,
+                     "qps": n_questions / elapsed, "p95_ms": None, "failed": failed})
+
+        for concurrency in concurrencies:
+            rag_chain, retriever = chain()
+            start = time.perf_counter()
+            results = ask_many(questions, rag_chain, retriever, max_concurrency=concurrency,
+                               timeout=timeout, verbose=False)
+            elapsed = time.perf_counter() - start
+            rows.append({"mode": "ask_many", "concurrency": concurrency, "seconds": elapsed,
+                         "qps": n_questions / elapsed,
+                         "p95_ms": float(np.percentile([r["latency_ms"] for r in results], 95)),
+                         "failed": sum(1 for r in results if r["error"])})
+
+    print(f"\n{'Mode':<9} {'Concurrency':>11} {'Seconds':>8} {'Questions/s':>12} {'p95 ms':>8} {'Failed':>7}")
+    print("─"*60)
+    for r in rows:
+        p95 = f"{r['p95_ms']:>8.0f}" if r["p95_ms"] is not None else f"{'-':>8}"
+        print(f"{r['mode']:<9} {r['concurrency']:>11} {r['seconds']:>8.2f} {r['qps']:>12.1f} {p95} {r['failed']:>7}")
+
+    return rows
+
+
+def bench_tenants(n_tenants=20, chunks_per_tenant=2000, dim=256, memory_mb=16.0, n_queries=2000,
+                  zipf_a=1.2, k=5):
+    """
+    Multi-tenant routing: ad hoc collection queries vs the LRU CollectionRouter
+
+    Tenant popularity follows a Zipf distribution and the memory cap holds
+    only some tenants. A second router, started from the saved query
+    counts, shows what pre-warming buys the first queries after a restart.
+    """
+    import chromadb
+    from partitions import search
+    from tenancy import CollectionRouter
+
+    print("\n" + "="*70)
+    print(" 🏢 MULTI-TENANT COLLECTION ROUTING")
+    print("="*70)
+    print(f"   Tenants: {n_tenants} x {chunks_per_tenant:,} chunks | Dimensions: {dim} | "
+          f"Memory cap: {memory_mb} MB | Queries: {n_queries} (Zipf a={zipf_a})")
+
+    rng = np.random.default_rng(0)
+    tenants = {f"tenant_{t:02d}": f"tenant_{t:02d}_docs" for t in range(n_tenants)}
+    names = list(tenants)
+    ranks = np.minimum(rng.zipf(zipf_a, n_queries), n_tenants) - 1
+    order = [names[r] for r in ranks]
+    queries = rng.standard_normal((n_queries, dim)).astype(np.float32)
+
+    def percentiles(latencies):
+        return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95))
+
+    rows = []
+    with tempfile.TemporaryDirectory() as path:
+        client = chromadb.PersistentClient(path=path)
+        for collection_name in tenants.values():
+            collection = client.create_collection(collection_name)
+            vectors = rng.standard_normal((chunks_per_tenant, dim)).astype(np.float32)
+            for start in range(0, chunks_per_tenant, 1000):
+                end = min(start + 1000, chunks_per_tenant)
+                collection.add(ids=[f"doc_{i}" for i in range(start, end)], embeddings=vectors[start:end],
+                               documents=[f"{collection_name} chunk {i}" for i in range(start, end)],
+                               metadatas=[{"source": f"synthetic://doc/{i // 10}"} for i in range(start, end)])
+
+        latencies = []
+        start = time.perf_counter()
+        for tenant, query in zip(order, queries):
+            t0 = time.perf_counter()
+            search(client, tenants[tenant], query, n_results=k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        rows.append({"mode": "ad hoc", "seconds": time.perf_counter() - start, "hit_rate": None,
+                     "evictions": None, "warm_hit_rate": None, **dict(zip(("p50", "p95"), percentiles(latencies)))})
+
+        warmup = min(200, n_queries)
+        for mode, prewarm in (("router (cold)", False), ("router (warm)", True)):
+            router = CollectionRouter(tenants, client=client, path=path, memory_cap_mb=memory_mb)
+            with contextlib.redirect_stdout(io.StringIO()):
+                if prewarm:
+                    router.prewarm()
+            latencies, residency = [], []
+            start = time.perf_counter()
+            for tenant, query in zip(order, queries):
+                t0 = time.perf_counter()
+                residency.append(router.search(tenant, query, n_results=k)["residency"])
+                latencies.append((time.perf_counter() - t0) * 1000)
+            seconds = time.perf_counter() - start
+            router.save_stats()
+            stats = router.stats()
+            rows.append({
+                "mode": mode,
+                "seconds": seconds,
+                "hit_rate": residency.count("hit") / n_queries,
+                "warm_hit_rate": residency[:warmup].count("hit") / warmup,
+                "evictions": sum(s["evictions"] for s in stats["tenants"].values()),
+                **dict(zip(("p50", "p95"), percentiles(latencies))),
+            })
+            hits = [l for l, r in zip(latencies, residency) if r == "hit"]
+            misses = [l for l, r in zip(latencies, residency) if r != "hit"]
+
+    print(f"\n{'Mode':<15} {'Seconds':>8} {'p50 ms':>7} {'p95 ms':>7} {'Hit rate':>9} "
+          f"{f'First {warmup} hits':>15} {'Evictions':>10}")
+    print("─"*77)
+    for r in rows:
+        hit_rate = f"{r['hit_rate']:>9.1%}" if r["hit_rate"] is not None else f"{'-':>9}"
+        warm = f"{r['warm_hit_rate']:>15.1%}" if r["warm_hit_rate"] is not None else f"{'-':>15}"
+        evictions = f"{r['evictions']:>10}" if r["evictions"] is not None else f"{'-':>10}"
+        print(f"{r['mode']:<15} {r['seconds']:>8.2f} {r['p50']:>7.2f} {r['p95']:>7.2f} {hit_rate} {warm} {evictions}")
+    if hits and misses:
+        print(f"\n   Resident query p50: {np.percentile(hits, 50):.2f} ms | "
+              f"load/ChromaDB query p50: {np.percentile(misses, 50):.2f} ms")
+
+    return rows
+
+
+def bench_embed(n_chunks=20000, chunk_size=500, dims=(256, 1024), batch_sizes=(1, 100, 1000)):
+    """
+    Throughput of the local hashing embedder through embed_array
+
+    This is the pipeline's own embedding overhead with no network in the
+    way; the difference to a provider run is the provider's cost.
+    """
+    from embedding_providers import HashingEmbeddings
+    from rag_pipeline import embed_array, iter_split, make_text_splitter
+
+    print("\n" + "="*70)
+    print(" 🔢 LOCAL EMBEDDING THROUGHPUT (hashing provider)")
+    print("="*70)
+
+    documents = _synthetic_documents(max(1, n_chunks * chunk_size // 50000), 50000)
+    chunks = list(iter_split(make_text_splitter(chunk_size, 0), documents))[:n_chunks]
+    texts = [chunk.page_content for chunk in chunks]
+    total_mb = sum(len(text) for text in texts) / 1e6
+    print(f"   Chunks: {len(texts):,} x ~{chunk_size} chars ({total_mb:.1f} MB)")
+
+    rows = []
+    for dim in dims:
+        for batch_size in batch_sizes:
+            embeddings = HashingEmbeddings(dim=dim)
+            start = time.perf_counter()
+            embed_array(embeddings, texts, batch_size=batch_size)
+            seconds = time.perf_counter() - start
+            rows.append({"dim": dim, "batch_size": batch_size, "seconds": seconds,
+                         "chunks_per_s": len(texts) / seconds, "mb_per_s": total_mb / seconds})
+
+    print(f"\n{'Dim':>6} {'Batch':>6} {'Seconds':>8} {'Chunks/s':>10} {'MB/s':>7}")
+    print("─"*41)
+    for r in rows:
+        print(f"{r['dim']:>6} {r['batch_size']:>6} {r['seconds']:>8.2f} {r['chunks_per_s']:>10,.0f} {r['mb_per_s']:>7.2f}")
+
+    return rows
+
+
+def _dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def bench_chunk_store(n_docs=100, doc_chars=50000, chunk_size=500, chunk_overlap=100, dim=64,
+                      n_queries=200, k=5):
+    """
+    Size of chunks as Documents + ChromaDB text vs a ChunkStore, per compression
+
+    Every layout stores the same small random embeddings, so the on-disk
+    difference is the text and metadata. Query latency includes slicing
+    the text back in from the store.
+    """
+    import chromadb
+    from chunk_store import CHUNK_ROW_KEY, COMPRESSIONS, ChunkStore, chunk_layout_bytes, store_path
+    from partitions import CHUNK_STORE_KEY, index_metadata, ingest_stamp, search
+    from rag_pipeline import iter_split, make_text_splitter
+
+    print("\n" + "="*70)
+    print(" 🗜️  COMPACT CHUNK STORE")
+    print("="*70)
+
+    splitter = make_text_splitter(chunk_size, chunk_overlap)
+    ingest_date = ingest_stamp()
+    documents = _synthetic_documents(n_docs, doc_chars)
+    for doc in documents:
+        index_metadata(doc.metadata, ingest_date)
+    chunks = list(iter_split(splitter, documents))
+    n = len(chunks)
+    print(f"   Documents: {n_docs} x {doc_chars:,} chars | Chunks: {n:,} ({chunk_size}/{chunk_overlap}) | "
+          f"Chunk text: {sum(len(c.page_content) for c in chunks) / 1e6:.1f} MB")
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    queries = rng.standard_normal((n_queries, dim)).astype(np.float32)
+    filter_keys = ("source", "source_domain", "title", "ingest_date")
+
+    def query_p50(client, name):
+        latencies = []
+        for query in queries:
+            t0 = time.perf_counter()
+            search(client, name, query, n_results=k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        return float(np.percentile(latencies, 50))
+
+    rows = []
+    with tempfile.TemporaryDirectory() as path:
+        client = chromadb.PersistentClient(path=os.path.join(path, "documents"))
+        start = time.perf_counter()
+        collection = client.create_collection("chunks")
+        for i in range(0, n, 1000):
+            collection.add(ids=[f"doc_{j}" for j in range(i, min(i + 1000, n))], embeddings=vectors[i:i + 1000],
+                           documents=[c.page_content for c in chunks[i:i + 1000]],
+                           metadatas=[c.metadata for c in chunks[i:i + 1000]])
+        rows.append({"layout": "documents", "build_s": time.perf_counter() - start,
+                     "memory": chunk_layout_bytes(chunks), "disk": _dir_bytes(os.path.join(path, "documents")),
+                     "p50_ms": query_p50(client, "chunks")})
+
+        for compression in COMPRESSIONS:
+            db = os.path.join(path, compression)
+            client = chromadb.PersistentClient(path=db)
+            start = time.perf_counter()
+            store = ChunkStore.from_documents(documents, splitter, compression)
+            collection = client.create_collection("chunks", metadata={CHUNK_STORE_KEY: compression})
+            store.save(store_path(db, "chunks"))
+            for i in range(0, n, 1000):
+                batch = range(i, min(i + 1000, n))
+                collection.add(ids=[f"doc_{j}" for j in batch], embeddings=vectors[i:i + 1000],
+                               metadatas=[{**{key: store.doc_metadata[store.doc[j]][key] for key in filter_keys},
+                                           CHUNK_ROW_KEY: j} for j in batch])
+            rows.append({"layout": f"store ({compression})", "build_s": time.perf_counter() - start,
+                         "memory": store.nbytes()["total"], "disk": _dir_bytes(db),
+                         "p50_ms": query_p50(client, "chunks")})
+
+    base = rows[0]
+    print(f"\n{'Layout':<15} {'Build s':>8} {'Memory MB':>10} {'B/chunk':>8} {'Disk MB':>8} "
+          f"{'vs docs':>8} {'Query p50 ms':>13}")
+    print("─"*76)
+    for r in rows:
+        print(f"{r['layout']:<15} {r['build_s']:>8.2f} {r['memory'] / 1e6:>10.2f} {r['memory'] / n:>8.0f} "
+              f"{r['disk'] / 1e6:>8.1f} {r['disk'] / base['disk']:>7.0%} {r['p50_ms']:>13.2f}")
+
+    return rows
+
+
+def bench_reindex(n_docs=40, doc_chars=50000, rebuilds=3, k=5):
+    """
+    Queries during a rebuild: delete-and-recreate in place vs a versioned alias swap
+
+    A reader thread searches the collection back to back while it is
+    rebuilt `rebuilds` times. Counts failed queries and incomplete result
+    lists (fewer than k chunks) and the latency seen during the rebuilds.
+    """
+    import chromadb
+    from collection_versions import resolve
+    from partitions import search
+    from rag_pipeline import RAGSystem
+
+    print("\n" + "="*70)
+    print(" 🔀 QUERIES DURING A REBUILD")
+    print("="*70)
+
+    rows = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as path:
+        os.chdir(path)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                rag = RAGSystem(embedding_provider="hashing")
+                chunks = rag.create_chunks(_synthetic_documents(n_docs, doc_chars))
+            texts = [chunk.page_content for chunk in chunks]
+            queries = rag.embeddings.embed_array(BENCH_QUERIES + texts[:50:5])
+            client = chromadb.PersistentClient(path="./chroma_db")
+            print(f"   Chunks: {len(chunks):,} | Rebuilds: {rebuilds} | Reader: back-to-back top-{k} searches")
+
+            def in_place(name):
+                # The pre-versioning store_in_chromadb
+                try:
+                    client.delete_collection(name=name)
+                except Exception:
+                    pass
+                collection = client.create_collection(name=name, metadata=rag._collection_metadata())
+                embeddings = rag.embed_texts(texts)
+                for i in range(0, len(chunks), 50):
+                    collection.add(ids=[f"doc_{j}" for j in range(i, min(i + 50, len(chunks)))],
+                                   embeddings=embeddings[i:i + 50], documents=texts[i:i + 50],
+                                   metadatas=[c.metadata for c in chunks[i:i + 50]])
+
+            for mode, name, rebuild in (
+                ("delete + recreate", "reindex_in_place", in_place),
+                ("versioned swap", "reindex_alias", lambda name: rag.store_in_chromadb(chunks, name)),
+            ):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    rebuild(name)
+                stop = threading.Event()
+                stats = {"queries": 0, "errors": 0, "incomplete": 0, "latencies": []}
+
+                def reader():
+                    i = 0
+                    while not stop.is_set():
+                        t0 = time.perf_counter()
+                        try:
+                            results = search(client, name, queries[i % len(queries)], n_results=k)
+                            if len(results["ids"][0]) < k:
+                                stats["incomplete"] += 1
+                        except Exception:
+                            stats["errors"] += 1
+                        stats["latencies"].append((time.perf_counter() - t0) * 1000)
+                        stats["queries"] += 1
+                        i += 1
+
+                thread = threading.Thread(target=reader)
+                thread.start()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for _ in range(rebuilds):
+                        rebuild(name)
+                elapsed = time.perf_counter() - start
+                stop.set()
+                thread.join()
+                latencies = np.array(stats["latencies"])
+                rows.append({"mode": mode, "rebuild_s": elapsed / rebuilds, "queries": stats["queries"],
+                             "errors": stats["errors"], "incomplete": stats["incomplete"],
+                             "p50_ms": float(np.percentile(latencies, 50)),
+                             "p95_ms": float(np.percentile(latencies, 95)),
+                             "collection": resolve(client, name)})
+        finally:
+            os.chdir(cwd)
+
+    print(f"\n{'Mode':<18} {'Rebuild s':>9} {'Queries':>8} {'Failed':>7} {'Incomplete':>11} "
+          f"{'p50 ms':>7} {'p95 ms':>7}")
+    print("─"*73)
+    for r in rows:
+        print(f"{r['mode']:<18} {r['rebuild_s']:>9.2f} {r['queries']:>8,} {r['errors']:>7,} "
+              f"{r['incomplete']:>11,} {r['p50_ms']:>7.2f} {r['p95_ms']:>7.2f}")
+    print(f"\n   Serving after the last swap: {rows[-1]['collection']}")
+
+    return rows
+
+
+# Vague questions over regression/corpus.jsonl; a chunk is relevant if it
+# contains one of the phrases
+MULTI_QUERY_QUESTIONS = [
+    ("What are the main challenges for health systems in 2026?",
+     ["financial pressure", "main challenges for health systems", "workforce challenges remain",
+      "cybersecurity is a board-level", "ransomware"]),
+    ("How are payers using AI in 2025?",
+     ["from pilots into daily operations", "prior authorization was the most common",
+      "claims processing and payment integrity", "predictive analytics rounded out", "member-centered tools"]),
+    ("What problems do hospitals have with staff?",
+     ["workforce challenges remain", "retention bonuses", "workforce shortages"]),
+    ("How do insurers make sure AI decisions are fair?",
+     ["responsible ai review", "auditing models for bias", "ai governance frameworks",
+      "disparities can be detected", "licensed clinician make any decision"]),
+    ("What are the risks of generative AI in healthcare?",
+     ["fluent but incorrect", "phishing more convincing", "needs stronger validation",
+      "inappropriate denials at scale"]),
+    ("Where does AI save money for health plans?",
+     ["auto-approve requests", "fewer manual touches", "lowers administrative cost",
+      "resolve a growing share of calls"]),
+    ("What rules apply to AI in coverage decisions?",
+     ["several states proposed rules", "sole basis for coverage", "adverse determination"]),
+    ("How is ChatGPT used in utilization management?",
+     ["chatgpt and other large language models", "role of chatgpt", "chatgpt-style assistants"]),
+]
+
+
+def bench_multi_query(variants=4, k=5, fetch_k=20, latency_ms=80.0, chunk_size=300, chunk_overlap=50,
+                      dim=1024, repeats=5):
+    """
+    Recall and latency: single search vs multi-query with rank fusion
+
+    The regression corpus is indexed in a temporary directory. Embeddings
+    come from fake_openai.py through the OpenAI pool, so every embedding
+    call pays an API-like round trip (latency_ms). Multi-query is timed
+    twice: one embed + search per variant, and the batched fan-out
+    (multi_query_search: one embedding call, one multi-vector search).
+    """
+    import chromadb
+    from langchain_core.documents import Document
+    from fake_openai import FakeOpenAI
+    from ir_metrics import gain_matrix, metrics_at
+    from multi_query import expand_queries, multi_query_search, reciprocal_rank_fusion
+    from openai_pool import OpenAIPool
+    from partitions import search
+    from rag_pipeline import embed_array, iter_split, make_text_splitter
+
+    print("\n" + "="*70)
+    print(" 🔀 MULTI-QUERY FAN-OUT WITH RANK FUSION")
+    print("="*70)
+
+    corpus = os.path.join(os.path.dirname(os.path.abspath(__file__)), "regression", "corpus.jsonl")
+    with open(corpus, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    documents = [Document(page_content=r["text"], metadata={"source": r["source"], "title": r["title"]})
+                 for r in records]
+    chunks = list(iter_split(make_text_splitter(chunk_size, chunk_overlap), documents))
+    texts = [chunk.page_content for chunk in chunks]
+    ids = [f"doc_{i}" for i in range(len(chunks))]
+    questions = [q for q, _ in MULTI_QUERY_QUESTIONS]
+    relevance = [{id_: 1 for id_, text in zip(ids, texts) if any(p in text.lower() for p in phrases)}
+                 for _, phrases in MULTI_QUERY_QUESTIONS]
+    expanded = expand_queries(questions, variants)
+    print(f"   Chunks: {len(chunks)} | Questions: {len(questions)} | Variants: {variants} | "
+          f"k: {k}, fetch_k: {fetch_k} | Embedding round trip: {latency_ms:.0f} ms")
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    server = FakeOpenAI(latency_ms=latency_ms, dim=dim).start()
+    rows = []
+    try:
+        embeddings = OpenAIPool(rpm=100_000, tpm=100_000_000, base_url=server.base_url).embeddings("fake")
+        with tempfile.TemporaryDirectory() as path:
+            client = chromadb.PersistentClient(path=path)
+            collection = client.create_collection("multi_query")
+            collection.add(ids=ids, embeddings=embed_array(embeddings, texts), documents=texts,
+                           metadatas=[chunk.metadata for chunk in chunks])
+
+            def single(i):
+                return search(client, "multi_query", embeddings.embed_query(questions[i]), n_results=k)
+
+            def sequential(i):
+                pools = [search(client, "multi_query", embeddings.embed_query(v), n_results=max(k, fetch_k))
+                         for v in expanded[i]]
+                return reciprocal_rank_fusion(pools, k=k)
+
+            def fanned_out(i):
+                return multi_query_search(client, "multi_query", embeddings, [questions[i]], k=k,
+                                          fetch_k=fetch_k, n_variants=variants)[0]
+
+            for mode, fn in (("single query", single), ("multi, one by one", sequential),
+                             ("multi, fanned out", fanned_out)):
+                fn(0)  # warm
+                calls = server.stats["embeddings"]
+                times, retrieved = [], []
+                for _ in range(repeats):
+                    retrieved = []
+                    for i in range(len(questions)):
+                        t0 = time.perf_counter()
+                        retrieved.append(fn(i)["ids"][0])
+                        times.append((time.perf_counter() - t0) * 1000)
+                gains, ideal, n_relevant = gain_matrix(retrieved, relevance)
+                scores = metrics_at(gains, ideal, n_relevant, k)
+                times = np.array(times)
+                rows.append({"mode": mode, "recall": float(scores["recall"].mean()),
+                             "mrr": float(scores["mrr"].mean()), "ndcg": float(scores["ndcg"].mean()),
+                             "calls": (server.stats["embeddings"] - calls) / (repeats * len(questions)),
+                             "p50_ms": float(np.percentile(times, 50)),
+                             "p95_ms": float(np.percentile(times, 95))})
+    finally:
+        server.close()
+
+    print(f"\n{'Mode':<20} {f'Recall@{k}':>9} {f'MRR@{k}':>7} {f'nDCG@{k}':>7} {'Embed calls':>11} "
+          f"{'p50 ms':>7} {'p95 ms':>7}")
+    print("─"*74)
+    for r in rows:
+        print(f"{r['mode']:<20} {r['recall']:>9.3f} {r['mrr']:>7.3f} {r['ndcg']:>7.3f} {r['calls']:>11.1f} "
+              f"{r['p50_ms']:>7.1f} {r['p95_ms']:>7.1f}")
+    print("\n   Variants of the first question:")
+    for variant in expanded[0]:
+        print(f"   - {variant}")
+
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RAG system benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("mmr-select", help="Vectorized vs looped MMR selection")
+    p.add_argument("--fetch-k", type=int, default=50)
+    p.add_argument("--dim", type=int, default=3072)
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--lambda-mult", type=float, default=0.5)
+
+    p = sub.add_parser("mmr", help="MMR vs similarity search on a collection")
+    p.add_argument("--collection", default="healthcare_ai_500_large")
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--fetch-k", type=int, default=20)
+    p.add_argument("--lambda-mult", type=float, default=0.5)
+
+    p = sub.add_parser("shards", help="Latency/throughput vs shard count (synthetic vectors)")
+    p.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    p.add_argument("--chunks", type=int, default=20000)
+    p.add_argument("--dim", type=int, default=256)
+    p.add_argument("--queries", type=int, default=200)
+
+    p = sub.add_parser("ingest", help="Serial vs process-pool chunking (synthetic documents)")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--docs", type=int, default=200)
+    p.add_argument("--chars", type=int, default=50000)
+
+    p = sub.add_parser("startup", help="Cold-start time per CLI subcommand")
+    p.add_argument("--repeats", type=int, default=5)
+    p.add_argument("--save", help="Append results as a JSON line to this file")
+
+    p = sub.add_parser("microbatch", help="Concurrent queries, direct vs micro-batched (offline)")
+    p.add_argument("--clients", type=int, default=32)
+    p.add_argument("--queries", type=int, default=20, help="Queries per client")
+    p.add_argument("--window-ms", type=float, default=5.0)
+    p.add_argument("--max-batch", type=int, default=16)
+    p.add_argument("--round-trip-ms", type=float, default=30.0)
+
+    p = sub.add_parser("memory", help="Peak RSS of list vs float32 array embeddings (offline)")
+    p.add_argument("--chunks", type=int, default=100000)
+    p.add_argument("--dim", type=int, default=3072)
+
+    p = sub.add_parser("parent-child", help="Parent-child vs single-size index (offline)")
+    p.add_argument("--docs", type=int, default=50)
+    p.add_argument("--chars", type=int, default=50000)
+    p.add_argument("--parent-size", type=int, default=2000)
+    p.add_argument("--child-size", type=int, default=300)
+    p.add_argument("--child-overlap", type=int, default=50)
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--fetch-k", type=int, default=20)
+
+    p = sub.add_parser("bulk-ask", help="Bulk Q&A throughput vs concurrency (offline model)")
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    p.add_argument("--questions", type=int, default=64)
+    p.add_argument("--llm-ms", type=float, default=500.0, help="Injected generation latency")
+    p.add_argument("--timeout", type=float, default=5.0, help="Seconds allowed per answer")
+    p.add_argument("--slow-every", type=int, default=0, help="Make every Nth call 20x slower")
+    p.add_argument("--fail-every", type=int, default=0, help="Make every Nth call raise")
+
+    p = sub.add_parser("tenants", help="Ad hoc vs LRU-routed multi-tenant queries (offline)")
+    p.add_argument("--tenants", type=int, default=20)
+    p.add_argument("--chunks", type=int, default=2000, help="Chunks per tenant")
+    p.add_argument("--dim", type=int, default=256)
+    p.add_argument("--memory-mb", type=float, default=16.0)
+    p.add_argument("--queries", type=int, default=2000)
+    p.add_argument("--zipf", type=float, default=1.2, help="Zipf exponent of tenant popularity")
+
+    p = sub.add_parser("embed", help="Local hashing embedder throughput (offline)")
+    p.add_argument("--chunks", type=int, default=20000)
+    p.add_argument("--dim", type=int, nargs="+", default=[256, 1024])
+    p.add_argument("--batch-size", type=int, nargs="+", default=[1, 100, 1000])
+
+    p = sub.add_parser("chunk-store", help="Chunk Documents + ChromaDB text vs a compact chunk store (offline)")
+    p.add_argument("--docs", type=int, default=100)
+    p.add_argument("--chars", type=int, default=50000)
+    p.add_argument("--chunk-size", type=int, default=500)
+    p.add_argument("--chunk-overlap", type=int, default=100)
+
+    p = sub.add_parser("reindex", help="Queries during a rebuild, in place vs versioned swap (offline)")
+    p.add_argument("--docs", type=int, default=40)
+    p.add_argument("--chars", type=int, default=50000)
+    p.add_argument("--rebuilds", type=int, default=3)
+    p.add_argument("--k", type=int, default=5)
+
+    p = sub.add_parser("multi-query", help="Recall and latency, single search vs multi-query fusion (offline)")
+    p.add_argument("--variants", type=int, default=4)
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--fetch-k", type=int, default=20)
+    p.add_argument("--latency-ms", type=float, default=80.0, help="Embedding round trip of the fake API")
+    p.add_argument("--chunk-size", type=int, default=300)
+    p.add_argument("--chunk-overlap", type=int, default=50)
+
+    args = parser.parse_args(argv)
+
+    if args.bench == "mmr-select":
+        bench_mmr_select(args.fetch_k, args.dim, args.k, args.lambda_mult)
+    elif args.bench == "mmr":
+        bench_mmr(args.collection, args.k, args.fetch_k, args.lambda_mult)
+    elif args.bench == "shards":
+        bench_shards(args.shards, args.chunks, args.dim, args.queries)
+    elif args.bench == "ingest":
+        bench_ingest(args.workers, args.docs, args.chars)
+    elif args.bench == "startup":
+        bench_startup(args.repeats, args.save)
+    elif args.bench == "microbatch":
+        bench_microbatch(args.clients, args.queries, args.window_ms, args.max_batch,
+                         round_trip_ms=args.round_trip_ms)
+    elif args.bench == "memory":
+        bench_memory(args.chunks, args.dim)
+    elif args.bench == "parent-child":
+        bench_parent_child(args.docs, args.chars, parent_size=args.parent_size, child_size=args.child_size,
+                           child_overlap=args.child_overlap, k=args.k, fetch_k=args.fetch_k)
+    elif args.bench == "bulk-ask":
+        bench_bulk_ask(args.concurrency, args.questions, args.llm_ms, args.timeout,
+                       args.slow_every, args.fail_every)
+    elif args.bench == "tenants":
+        bench_tenants(args.tenants, args.chunks, args.dim, args.memory_mb, args.queries, args.zipf)
+    elif args.bench == "embed":
+        bench_embed(args.chunks, dims=args.dim, batch_sizes=args.batch_size)
+    elif args.bench == "chunk-store":
+        bench_chunk_store(args.docs, args.chars, args.chunk_size, args.chunk_overlap)
+    elif args.bench == "reindex":
+        bench_reindex(args.docs, args.chars, args.rebuilds, args.k)
+    elif args.bench == "multi-query":
+        bench_multi_query(args.variants, args.k, args.fetch_k, args.latency_ms, args.chunk_size,
+                          args.chunk_overlap)
+
+
+if __name__ == "__main__":
+    main()
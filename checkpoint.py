@@ -0,0 +1,179 @@
+"""
+Ingestion Checkpoints - Healthcare AI RAG System
+Durable manifest for resumable ingestion runs
+
+A run directory holds:
+- manifest.json: run configuration and progress (which URLs were fetched,
+  whether chunking finished, and the state of every storage batch)
+- documents.pkl / custom_documents.pkl: fetched and custom documents
+- chunks.pkl: chunked documents
+- embeddings/batch_<n>.npy: embeddings of a batch, written before the
+  batch is committed so a resumed run never embeds it again
+
+Every file is written to a temporary name, fsynced and renamed into
+place, so a crash at any point leaves either the old or the new version.
+"""
+
+import json
+import os
+import pickle
+
+import numpy as np
+
+
+MANIFEST = "manifest.json"
+
+BATCH_EMBEDDED = "embedded"
+BATCH_COMMITTED = "committed"
+
+
+def _fsync_dir(path):
+    """Flush a directory entry so a rename survives power loss (POSIX only)"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, write):
+    """
+    Write a file atomically
+
+    Args:
+        path: Destination path
+        write: Callable that writes to the open binary file object
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(os.path.dirname(path) or ".")
+
+
+class IngestCheckpoint:
+    """
+    Manifest and artifacts of one ingestion run
+    """
+
+    def __init__(self, run_dir):
+        self.run_dir = run_dir
+        self.manifest = {}
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.run_dir, MANIFEST)
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    @classmethod
+    def create(cls, run_dir, config, custom_documents=None):
+        """
+        Start a new run, discarding any previous run in run_dir
+
+        The manifest is written last, so a run only exists once all of its
+        inputs are on disk.
+
+        Args:
+            run_dir: Run directory
+            config: Run configuration (collection name, chunking, URLs, ...)
+            custom_documents: Documents supplied directly rather than fetched
+        """
+        checkpoint = cls(run_dir)
+        if checkpoint.exists():
+            os.remove(checkpoint.manifest_path)
+        os.makedirs(os.path.join(run_dir, "embeddings"), exist_ok=True)
+        for name in os.listdir(os.path.join(run_dir, "embeddings")):
+            os.remove(os.path.join(run_dir, "embeddings", name))
+        for name in ("documents", "custom_documents", "chunks"):
+            if os.path.exists(checkpoint._pickle_path(name)):
+                os.remove(checkpoint._pickle_path(name))
+        checkpoint.save_pickle("custom_documents", list(custom_documents or []))
+        checkpoint.manifest = {
+            **config,
+            "stage": "fetching",
+            "fetched": {},
+            "collection_created": False,
+            "num_chunks": None,
+            "batches": {},
+        }
+        checkpoint.save()
+        return checkpoint
+
+    @classmethod
+    def load(cls, run_dir):
+        """Open an existing run"""
+        checkpoint = cls(run_dir)
+        with open(checkpoint.manifest_path, "r") as f:
+            checkpoint.manifest = json.load(f)
+        return checkpoint
+
+    def save(self):
+        data = json.dumps(self.manifest, indent=2).encode("utf-8")
+        atomic_write(self.manifest_path, lambda f: f.write(data))
+
+    def update(self, **fields):
+        """Set manifest fields and persist"""
+        self.manifest.update(fields)
+        self.save()
+
+    # Documents and chunks -------------------------------------------------
+
+    def _pickle_path(self, name):
+        return os.path.join(self.run_dir, f"{name}.pkl")
+
+    def save_pickle(self, name, obj):
+        """Persist documents or chunks under run_dir/<name>.pkl"""
+        atomic_write(self._pickle_path(name), lambda f: pickle.dump(obj, f))
+
+    def load_pickle(self, name, default=None):
+        path = self._pickle_path(name)
+        if not os.path.exists(path):
+            return default
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    # Batches --------------------------------------------------------------
+
+    def _batch_path(self, batch):
+        return os.path.join(self.run_dir, "embeddings", f"batch_{batch:05d}.npy")
+
+    def batch_state(self, batch):
+        return self.manifest["batches"].get(str(batch))
+
+    def save_batch_embeddings(self, batch, embeddings):
+        """Persist a batch's embeddings, then record it as embedded"""
+        array = np.asarray(embeddings, dtype=np.float32)
+        atomic_write(self._batch_path(batch), lambda f: np.save(f, array))
+        self.manifest["batches"][str(batch)] = BATCH_EMBEDDED
+        self.save()
+
+    def has_batch_embeddings(self, batch):
+        """True if a batch's embeddings were saved (even if the manifest missed it)"""
+        return os.path.exists(self._batch_path(batch))
+
+    def load_batch_embeddings(self, batch):
+        return np.load(self._batch_path(batch))
+
+    def mark_committed(self, batch):
+        """Record a batch as stored; its embeddings file is no longer needed"""
+        self.manifest["batches"][str(batch)] = BATCH_COMMITTED
+        self.save()
+        path = self._batch_path(batch)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def summary(self):
+        """Counts of batches per state"""
+        states = list(self.manifest["batches"].values())
+        return {
+            "stage": self.manifest["stage"],
+            "committed": states.count(BATCH_COMMITTED),
+            "embedded": states.count(BATCH_EMBEDDED),
+            "num_chunks": self.manifest["num_chunks"],
+        }
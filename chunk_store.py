@@ -0,0 +1,307 @@
+"""
+Chunk Store - Healthcare AI RAG System
+Source text kept once, chunks as (document, start, end) offsets
+
+create_chunks gives every chunk its own text copy and metadata dict, and
+ChromaDB then stores that text again, overlaps included, for every chunk.
+A ChunkStore keeps instead:
+
+- the text of each source document once, optionally zlib or lzma
+  compressed (per document, so one document decompresses on its own)
+- chunks as three int32 arrays: document index, start and end offset
+- one metadata dict per document; start_index, end_index and
+  chunk_index are derived from the offsets
+
+Chunk text is sliced out on demand. RAGSystem.store_compact() writes the
+store to chroma_db/chunk_store/<collection>.npz and stores only the
+embeddings and the filterable metadata in ChromaDB; partitions.search
+fills documents and metadata back in from the store at query time.
+
+Usage:
+    store = ChunkStore.from_documents(documents, rag.text_splitter, compression="zlib")
+    store.text(12)                    # chunk text
+    store.document(12)                # chunk as a Document
+    store.nbytes()                    # size breakdown
+    store.save("chunks.npz"); ChunkStore.load("chunks.npz")
+"""
+
+import json
+import lzma
+import os
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.documents import Document
+
+from checkpoint import atomic_write
+
+
+COMPRESSIONS = ("none", "zlib", "lzma")
+CHUNK_STORE_DIR = "chunk_store"
+# Chunk metadata key (in ChromaDB) pointing at the chunk's row in the store
+CHUNK_ROW_KEY = "chunk_row"
+FORMAT_VERSION = 1
+
+
+def _compress(text, compression):
+    data = text.encode("utf-8")
+    if compression == "zlib":
+        return zlib.compress(data, 6)
+    if compression == "lzma":
+        return lzma.compress(data, preset=6)
+    return data
+
+
+def _decompress(blob, compression):
+    if compression == "zlib":
+        blob = zlib.decompress(blob)
+    elif compression == "lzma":
+        blob = lzma.decompress(blob)
+    return blob.decode("utf-8")
+
+
+class ChunkStore:
+    """
+    Chunks as offsets into source texts stored once
+
+    Args:
+        compression: "none", "zlib" or "lzma"
+        cache_documents: Decompressed source texts kept for repeated slicing
+    """
+
+    def __init__(self, compression="zlib", cache_documents=32):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression!r}; choose from {', '.join(COMPRESSIONS)}")
+        self.compression = compression
+        self.cache_documents = cache_documents
+        self.sources = []
+        self.doc_metadata = []
+        self.doc_chars = []
+        self.doc = np.empty(0, dtype=np.int32)
+        self.start = np.empty(0, dtype=np.int32)
+        self.end = np.empty(0, dtype=np.int32)
+        self.first_row = np.empty(0, dtype=np.int32)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_documents(cls, documents, text_splitter, compression="zlib", cache_documents=32):
+        """
+        Split documents straight into a store (no per-chunk Documents are kept)
+
+        Args:
+            documents: Iterable of source Documents
+            text_splitter: Splitter from make_text_splitter (add_start_index=True)
+            compression: "none", "zlib" or "lzma"
+
+        Returns:
+            ChunkStore
+        """
+        store = cls(compression, cache_documents)
+        doc, start, end, first_row = [], [], [], []
+        for document in documents:
+            text = document.page_content
+            first_row.append(len(doc))
+            for piece in text_splitter.create_documents([text]):
+                doc.append(len(store.sources))
+                start.append(piece.metadata["start_index"])
+                end.append(piece.metadata["start_index"] + len(piece.page_content))
+            store.sources.append(_compress(text, compression))
+            store.doc_metadata.append(dict(document.metadata))
+            store.doc_chars.append(len(text))
+        store.doc = np.asarray(doc, dtype=np.int32)
+        store.start = np.asarray(start, dtype=np.int32)
+        store.end = np.asarray(end, dtype=np.int32)
+        store.first_row = np.asarray(first_row, dtype=np.int32)
+        return store
+
+    def __len__(self):
+        return len(self.doc)
+
+    @property
+    def num_documents(self):
+        return len(self.sources)
+
+    # Access -------------------------------------------------------------
+
+    def source_text(self, doc):
+        """Full text of source document doc (decompressed, cached)"""
+        if self.compression == "none":
+            return self.sources[doc].decode("utf-8")
+        with self._lock:
+            text = self._cache.get(doc)
+            if text is not None:
+                self._cache.move_to_end(doc)
+                return text
+        text = _decompress(self.sources[doc], self.compression)
+        with self._lock:
+            self._cache[doc] = text
+            while len(self._cache) > self.cache_documents:
+                self._cache.popitem(last=False)
+        return text
+
+    def text(self, row):
+        """Text of chunk row"""
+        return self.source_text(int(self.doc[row]))[self.start[row]:self.end[row]]
+
+    def texts(self, rows):
+        """Texts of several chunks (rows of one document share one decompression)"""
+        return [self.text(row) for row in rows]
+
+    def metadata(self, row):
+        """Chunk metadata: the document's metadata plus start_index, end_index and chunk_index"""
+        doc = int(self.doc[row])
+        return {
+            **self.doc_metadata[doc],
+            "start_index": int(self.start[row]),
+            "end_index": int(self.end[row]),
+            "chunk_index": int(row - self.first_row[doc]),
+        }
+
+    def document(self, row):
+        return Document(page_content=self.text(row), metadata=self.metadata(row))
+
+    def iter_documents(self):
+        """Chunk Documents in row order, built one at a time"""
+        for row in range(len(self)):
+            yield self.document(row)
+
+    # Sizes --------------------------------------------------------------
+
+    def nbytes(self):
+        """
+        Size of the store
+
+        Returns:
+            Dict with text, offsets and metadata bytes, total, per_chunk, and
+            raw_text (characters of source text before compression)
+        """
+        text = sum(len(blob) for blob in self.sources)
+        offsets = self.doc.nbytes + self.start.nbytes + self.end.nbytes + self.first_row.nbytes
+        metadata = len(json.dumps(self.doc_metadata).encode("utf-8"))
+        total = text + offsets + metadata
+        return {
+            "text": text,
+            "offsets": offsets,
+            "metadata": metadata,
+            "total": total,
+            "per_chunk": total / max(len(self), 1),
+            "raw_text": sum(self.doc_chars),
+        }
+
+    # Persistence --------------------------------------------------------
+
+    def save(self, path):
+        """Write the store atomically as one .npz file"""
+        lengths = np.fromiter((len(blob) for blob in self.sources), dtype=np.int64, count=len(self.sources))
+        header = json.dumps({
+            "version": FORMAT_VERSION,
+            "compression": self.compression,
+            "doc_metadata": self.doc_metadata,
+            "doc_chars": self.doc_chars,
+        }).encode("utf-8")
+        arrays = {
+            "header": np.frombuffer(header, dtype=np.uint8),
+            "text": np.frombuffer(b"".join(self.sources), dtype=np.uint8),
+            "text_offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            "doc": self.doc,
+            "start": self.start,
+            "end": self.end,
+            "first_row": self.first_row,
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        atomic_write(path, lambda f: np.savez(f, **arrays))
+
+    @classmethod
+    def load(cls, path, cache_documents=32):
+        with np.load(path) as data:
+            header = json.loads(data["header"].tobytes().decode("utf-8"))
+            store = cls(header["compression"], cache_documents)
+            blob = data["text"].tobytes()
+            offsets = data["text_offsets"]
+            store.sources = [blob[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+            store.doc = data["doc"]
+            store.start = data["start"]
+            store.end = data["end"]
+            store.first_row = data["first_row"]
+        store.doc_metadata = header["doc_metadata"]
+        store.doc_chars = header["doc_chars"]
+        return store
+
+
+def chunk_layout_bytes(chunks):
+    """
+    Approximate in-memory size of chunks as a list of Documents (the current layout)
+
+    Counts each Document object, its text and its metadata dict with its
+    values (keys are shared strings and not counted).
+    """
+    total = sys.getsizeof(chunks)
+    for chunk in chunks:
+        total += sys.getsizeof(chunk) + sys.getsizeof(chunk.__dict__) + sys.getsizeof(chunk.page_content)
+        total += sys.getsizeof(chunk.metadata) + sum(sys.getsizeof(v) for v in chunk.metadata.values())
+    return total
+
+
+# ----------------------------------------------------------------------------
+# Stores of compact collections
+# ----------------------------------------------------------------------------
+
+_open_stores = {}
+_open_lock = threading.Lock()
+
+
+def store_path(persist_directory, collection_name):
+    return os.path.join(persist_directory, CHUNK_STORE_DIR, f"{collection_name}.npz")
+
+
+def open_store(persist_directory, collection_name):
+    """Load a collection's store once per process (reloaded when the file changes)"""
+    path = store_path(persist_directory, collection_name)
+    mtime = os.path.getmtime(path)
+    with _open_lock:
+        cached = _open_stores.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    store = ChunkStore.load(path)
+    with _open_lock:
+        _open_stores[path] = (mtime, store)
+    return store
+
+
+def hydrate(results, store):
+    """
+    Fill documents and metadata of ChromaDB results in from the store
+
+    Works on query results (nested lists) and get results (flat lists);
+    entries without a chunk_row are left as they are.
+
+    Args:
+        results: collection.query / collection.get result, including metadatas
+        store: The collection's ChunkStore
+
+    Returns:
+        The same results dict, updated in place
+    """
+    metadatas = results.get("metadatas")
+    if metadatas is None:
+        return results
+    nested = bool(metadatas) and isinstance(metadatas[0], list)
+    groups = metadatas if nested else [metadatas]
+    documents = []
+    for group_index, group in enumerate(groups):
+        texts = []
+        for i, metadata in enumerate(group):
+            row = (metadata or {}).get(CHUNK_ROW_KEY)
+            if row is None:
+                existing = results.get("documents")
+                texts.append((existing[group_index] if nested else existing)[i] if existing else None)
+                continue
+            texts.append(store.text(row))
+            group[i] = {**store.metadata(row), **metadata}
+        documents.append(texts)
+    results["documents"] = documents if nested else documents[0]
+    return results
@@ -0,0 +1,331 @@
+"""
+Collection Versions - Healthcare AI RAG System
+Zero-downtime rebuilds: versioned collections behind an atomically swapped alias
+
+Rebuilding used to delete the collection and refill it, so queries during
+a rebuild failed or saw a half-filled collection. Now a rebuild of
+"healthcare_ai_500_large" writes a new collection
+"healthcare_ai_500_large_v0003" while readers keep using the current one,
+then:
+
+1. validates that the new version (with its partitions) holds every chunk
+2. switches the alias in chroma_db/aliases.json to the new version (a
+   single atomic file replace; readers see the old or the new version,
+   never a mix)
+3. garbage-collects old versions, keeping the `keep` most recent previous
+   ones for in-flight queries and rollback
+
+Every query path resolves names through resolve(), which re-reads the
+alias file only when it changes. A name that is not an alias resolves to
+itself, so collections built before versioning keep working; the first
+versioned rebuild adopts the old collection as the previous version.
+
+Usage:
+    python rag_cli.py versions healthcare_ai_500_large             # list versions
+    python rag_cli.py versions healthcare_ai_500_large --rollback
+    python rag_cli.py versions healthcare_ai_500_large --gc --keep 0
+"""
+
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+
+from checkpoint import atomic_write
+
+
+ALIASES_FILE = "aliases.json"
+DEFAULT_KEEP = 1
+
+_cache = {}
+_cache_lock = threading.Lock()
+_write_lock = threading.Lock()
+
+
+def _aliases_path(client):
+    return os.path.join(client.get_settings().persist_directory, ALIASES_FILE)
+
+
+def read_aliases(client):
+    """
+    alias -> {"collection", "versions", "building", "updated_at"} (cached until the file changes)
+
+    "versions" lists published versions, oldest first; "building" the
+    reserved versions not yet published.
+    """
+    path = _aliases_path(client)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return {}
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        aliases = json.load(f)
+    with _cache_lock:
+        _cache[path] = (key, aliases)
+    return aliases
+
+
+def resolve(client, name):
+    """
+    Physical collection behind a name
+
+    Args:
+        client: ChromaDB client
+        name: Alias or collection name
+
+    Returns:
+        The collection the alias points to, or name itself if it is not an alias
+    """
+    entry = read_aliases(client).get(name)
+    return (entry or {}).get("collection") or name
+
+
+def version_name(alias, version):
+    return f"{alias}_v{version:04d}"
+
+
+def _version_number(alias, name):
+    """Version of a physical collection (0 for the unversioned legacy collection)"""
+    if name == alias:
+        return 0
+    match = re.fullmatch(re.escape(alias) + r"_v(\d{4,})", name)
+    return int(match.group(1)) if match else None
+
+
+def list_versions(client, alias):
+    """
+    Physical versions of an alias, oldest first
+
+    Returns:
+        List of (version number, collection name) for every existing
+        collection that is a version of the alias
+    """
+    names = [c if isinstance(c, str) else c.name for c in client.list_collections()]
+    versions = [(_version_number(alias, name), name) for name in names]
+    return sorted((number, name) for number, name in versions if number is not None)
+
+
+@contextlib.contextmanager
+def _locked(client):
+    """Serialise alias-file updates across threads and processes"""
+    path = _aliases_path(client) + ".lock"
+    with _write_lock, open(path, "a") as lock_file:
+        try:
+            import fcntl
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        except ImportError:
+            pass  # no flock on Windows; threads are still serialised
+        yield
+
+
+def _write_aliases(client, update):
+    """Read-modify-write the alias file under the lock; returns update's result"""
+    path = _aliases_path(client)
+    with _locked(client):
+        aliases = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                aliases = json.load(f)
+        result = update(aliases)
+        payload = json.dumps(aliases, indent=2).encode("utf-8")
+        atomic_write(path, lambda f: f.write(payload))
+    return result
+
+
+def count_chunks(client, name):
+    """Chunks in a collection plus its partitions"""
+    from partitions import load_partition_map
+
+    collection = client.get_collection(name)
+    return collection.count() + sum(client.get_collection(part).count()
+                                    for part in set(load_partition_map(collection).values()))
+
+
+def reserve_version(client, alias):
+    """
+    Name for a new version of an alias, recorded as being built
+
+    Numbers are never reused, so concurrent or crashed builds cannot
+    collide with each other or with a published version.
+    """
+    existing = [number for number, _ in list_versions(client, alias)]
+
+    def update(aliases):
+        entry = aliases.setdefault(alias, {"collection": None, "versions": []})
+        known = entry["versions"] + entry.get("building", [])
+        numbers = existing + [_version_number(alias, name) or 0 for name in known]
+        name = version_name(alias, max(numbers, default=0) + 1)
+        entry["building"] = entry.get("building", []) + [name]
+        return name
+
+    return _write_aliases(client, update)
+
+
+@contextlib.contextmanager
+def new_version(client, alias):
+    """
+    Reserve a version to build into; it is dropped if the build raises
+
+    Usage:
+        with new_version(client, "docs") as version:
+            ...create and fill collection `version`...
+        publish(client, "docs", version, expected_count)
+    """
+    name = reserve_version(client, alias)
+    try:
+        yield name
+    except BaseException:
+        with contextlib.suppress(Exception):
+            drop_version(client, name)
+        raise
+
+
+def swap_alias(client, alias, name):
+    """
+    Point an alias at a collection (atomic for readers)
+
+    Returns:
+        The collection the alias pointed to before (None if it was not an alias)
+    """
+    client.get_collection(name)  # must exist
+
+    def update(aliases):
+        entry = aliases.setdefault(alias, {"collection": None, "versions": []})
+        previous = entry["collection"]
+        if previous is None and name != alias and _exists(client, alias):
+            previous = alias  # adopt the unversioned collection as the previous version
+        history = [v for v in entry["versions"] if v not in (name, previous)]
+        entry["versions"] = history + [v for v in (previous,) if v and v != name] + [name]
+        entry["building"] = [v for v in entry.get("building", []) if v != name]
+        entry["collection"] = name
+        entry["updated_at"] = time.time()
+        return previous
+
+    return _write_aliases(client, update)
+
+
+def _exists(client, name):
+    try:
+        client.get_collection(name)
+        return True
+    except Exception:
+        return False
+
+
+def drop_version(client, name):
+    """Delete a collection version with its partitions and chunk store (whatever of it exists)"""
+    from chunk_store import store_path
+    from partitions import load_partition_map
+
+    if _exists(client, name):
+        collection = client.get_collection(name)
+        for part in set(load_partition_map(collection).values()):
+            if _exists(client, part):
+                client.delete_collection(part)
+        client.delete_collection(name)
+    path = store_path(client.get_settings().persist_directory, name)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def garbage_collect(client, alias, keep=DEFAULT_KEEP):
+    """
+    Delete old versions of an alias
+
+    Versions newer than the current one (a rebuild in progress) are never
+    touched (run one rebuild per alias at a time). Of the older ones, the `keep` most recently published are
+    kept; builds that never published (crashed or failed validation) are
+    always deleted.
+
+    Returns:
+        Names of the deleted collections
+    """
+    entry = read_aliases(client).get(alias) or {}
+    current = entry.get("collection")
+    current_number = _version_number(alias, current) if current else None
+    if current_number is None:
+        return []  # not an alias, or it points at an unrelated collection
+    older = [name for number, name in list_versions(client, alias) if number < current_number]
+    # In publish order, so after a rollback the version just replaced is kept
+    published = [name for name in entry["versions"] if name in older]
+    kept = set(published[len(published) - keep:]) if keep else set()
+    doomed = [name for name in older if name not in kept]
+
+    for name in doomed:
+        drop_version(client, name)
+
+    def update(aliases):
+        entry = aliases[alias]
+        entry["versions"] = [v for v in entry["versions"] if v not in doomed]
+        # Reservations older than the current version were abandoned
+        entry["building"] = [v for v in entry.get("building", [])
+                             if (_version_number(alias, v) or 0) > current_number]
+
+    stale = any((_version_number(alias, v) or 0) < current_number for v in entry.get("building", []))
+    if doomed or stale:
+        _write_aliases(client, update)
+    return doomed
+
+
+def rollback(client, alias):
+    """
+    Point an alias back at its previous surviving version
+
+    Returns:
+        The collection the alias now points to
+    """
+    current = resolve(client, alias)
+    existing = {name for _, name in list_versions(client, alias)}
+    history = read_aliases(client).get(alias, {}).get("versions", [])
+    previous = [name for name in history if name != current and name in existing]
+    if not previous:
+        raise ValueError(f"No previous version of {alias!r} to roll back to")
+    swap_alias(client, alias, previous[-1])
+    return previous[-1]
+
+
+def publish(client, alias, name, expected_count, keep=DEFAULT_KEEP):
+    """
+    Validate a freshly built version, switch the alias to it and collect old versions
+
+    A version whose chunk count does not match is deleted and the alias
+    is left alone.
+
+    Args:
+        client: ChromaDB client
+        alias: Name readers use
+        name: The new version's collection
+        expected_count: Chunks the build wrote
+        keep: Previous versions to keep
+
+    Returns:
+        Names of the garbage-collected collections
+    """
+    if resolve(client, alias) == name:
+        return []  # already published (e.g. a resumed run)
+    stored = count_chunks(client, name)
+    if stored != expected_count:
+        drop_version(client, name)
+        raise ValueError(f"Version {name} holds {stored} chunks, expected {expected_count}; "
+                         f"alias {alias!r} left on {resolve(client, alias)}")
+    previous = swap_alias(client, alias, name)
+    print(f"🔀 Alias {alias} -> {name} ({stored} chunks; was {previous or 'unset'})")
+    deleted = garbage_collect(client, alias, keep)
+    if deleted:
+        print(f"🧹 Removed old version(s): {', '.join(deleted)}")
+    return deleted
+
+
+def print_versions(client, alias):
+    current = resolve(client, alias)
+    print(f"\n🏷️  {alias} -> {current}")
+    for number, name in list_versions(client, alias):
+        marker = "*" if name == current else " "
+        print(f"  {marker} {name:<40} v{number:<4} {count_chunks(client, name):>8,} chunks")
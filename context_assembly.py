@@ -0,0 +1,147 @@
+"""
+Context Assembly - Healthcare AI RAG System
+Merge retrieved chunks into contiguous spans before they reach the prompt
+
+Chunks are cut with an overlap, so neighbouring chunks from the same source
+share text. When several of them are retrieved together, pasting them one
+after another repeats the shared characters and scrambles their order.
+Using the offsets recorded at ingest time (start_index, end_index,
+chunk_index), the chunks are stitched back into spans in document order.
+
+Offsets only make sense within one document, so chunks are grouped by the
+document's content_hash when ingest recorded one (local corpora,
+recrawls), else by source. Chunks with no usable identity (no source, or
+the "unknown" placeholder from partitions.index_metadata) are passed
+through unmerged, and an overlap is only stitched if the shared text
+actually matches.
+"""
+
+from langchain_core.documents import Document
+
+
+def _has_offsets(doc):
+    """Check whether a chunk carries the offsets written by create_chunks"""
+    metadata = doc.metadata or {}
+    return "start_index" in metadata and "chunk_index" in metadata
+
+
+# Source placeholders that say nothing about which document a chunk came from
+UNKNOWN_SOURCES = ("", "unknown")
+
+
+def _document_key(doc):
+    """Identity of the chunk's document, or None if it cannot be told apart from others"""
+    metadata = doc.metadata or {}
+    if metadata.get("content_hash"):
+        return ("content_hash", metadata["content_hash"])
+    source = metadata.get("source") or ""
+    if source in UNKNOWN_SOURCES:
+        return None
+    return ("source", source)
+
+
+def _continues(current, doc, start):
+    """Whether an overlapping chunk's text agrees with the span it would extend"""
+    overlap = current["end"] - start
+    if overlap <= 0 or current["exact"] is False:
+        return True
+    text = doc.page_content
+    if start + len(text) <= current["end"]:
+        return text in current["text"]
+    return current["text"].endswith(text[:overlap])
+
+
+def merge_adjacent_chunks(docs):
+    """
+    Merge adjacent or overlapping chunks from the same source
+
+    Documents keep the order of their best-ranked hit. Inside a document,
+    spans follow document order. Chunks without offsets or without a
+    document identity (see _document_key) are passed through untouched.
+
+    Args:
+        docs: List of retrieved Document chunks (ranked)
+
+    Returns:
+        List of Document spans
+    """
+    groups = {}
+    order = []
+
+    for rank, doc in enumerate(docs):
+        key = _document_key(doc) if _has_offsets(doc) else None
+        if key is None:
+            key = ("__unmerged__", rank)
+        if key not in groups:
+            groups[key] = []
+            order.append(key)
+        groups[key].append(doc)
+
+    spans = []
+    for key in order:
+        group = groups[key]
+        if key[0] == "__unmerged__":
+            spans.extend(group)
+            continue
+
+        group = sorted(group, key=lambda d: (d.metadata["start_index"], d.metadata["chunk_index"]))
+
+        current = None
+        for doc in group:
+            start = doc.metadata["start_index"]
+            end = start + len(doc.page_content)
+            seq = doc.metadata["chunk_index"]
+
+            if current is None:
+                current = _new_span(doc, start, end, seq)
+                continue
+
+            if start <= current["end"] and _continues(current, doc, start):
+                # Overlapping or touching: append only the unseen tail
+                if end > current["end"]:
+                    current["text"] += doc.page_content[current["end"] - start:]
+                    current["end"] = end
+                current["last"] = max(current["last"], seq)
+            elif start > current["end"] and seq == current["last"] + 1:
+                # Consecutive chunks separated only by stripped whitespace
+                current["text"] += "\n" + doc.page_content
+                current["end"] = end
+                current["last"] = seq
+                current["exact"] = False  # text no longer lines up with the offsets
+            else:
+                spans.append(_span_document(current))
+                current = _new_span(doc, start, end, seq)
+
+        spans.append(_span_document(current))
+
+    return spans
+
+
+def _new_span(doc, start, end, seq):
+    return {"text": doc.page_content, "start": start, "end": end,
+            "first": seq, "last": seq, "metadata": doc.metadata, "exact": True}
+
+
+def _span_document(span):
+    """Build a Document for a merged span"""
+    metadata = dict(span["metadata"])
+    metadata.update({
+        "start_index": span["start"],
+        "end_index": span["end"],
+        "chunk_index": span["first"],
+        "last_chunk_index": span["last"],
+    })
+    return Document(page_content=span["text"], metadata=metadata)
+
+
+def assemble_context(docs):
+    """
+    Format retrieved chunks into the prompt context string
+
+    Args:
+        docs: List of retrieved Document chunks
+
+    Returns:
+        Context string with overlapping chunks merged
+    """
+    return "\n\n".join(span.page_content for span in merge_adjacent_chunks(docs))
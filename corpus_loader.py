@@ -0,0 +1,198 @@
+"""
+Local Corpus Loader - Healthcare AI RAG System
+Stream documents from directories on disk into the chunking pipeline
+
+Files are read one at a time (each in a single read), hashed, decoded
+with encoding detection and yielded lazily as
+Document objects. A small thread pool reads ahead so disk latency overlaps
+with chunking and embedding, while only a bounded number of files is ever
+held in memory.
+"""
+
+import codecs
+import hashlib
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.documents import Document
+
+
+DEFAULT_EXTENSIONS = (".txt", ".md", ".html", ".htm")
+
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+def iter_corpus_files(root, extensions=DEFAULT_EXTENSIONS):
+    """
+    Walk a directory tree and yield matching file paths in sorted order
+
+    Args:
+        root: Directory (or single file) to walk
+        extensions: File extensions to include (lower-case, with dot)
+
+    Yields:
+        File paths
+    """
+    if os.path.isfile(root):
+        yield root
+        return
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(tuple(extensions)):
+                yield os.path.join(dirpath, filename)
+
+
+def read_file_bytes(path):
+    """
+    Read a file and hash its bytes
+
+    The file is read with one call into a single bytes object and hashed
+    from it, so it is read once and held in memory once (reading in
+    blocks and joining them would briefly hold it twice).
+
+    Args:
+        path: File path
+
+    Returns:
+        (raw bytes, sha256 hex digest)
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    return raw, hashlib.sha256(raw).hexdigest()
+
+
+def detect_encoding(raw):
+    """
+    Guess the text encoding of raw bytes
+
+    Checks for a byte-order mark, then strict UTF-8. Multi-byte encodings
+    (Shift-JIS, GB18030, ...) are recognised with charset_normalizer when it
+    is installed (it ships with requests). Anything else is treated as
+    Windows-1252, the usual encoding of legacy Western office documents,
+    with Latin-1 as the last resort since it accepts every byte.
+
+    Args:
+        raw: File bytes
+
+    Returns:
+        Codec name
+    """
+    for bom, encoding in BOMS:
+        if raw.startswith(bom):
+            return encoding
+
+    try:
+        raw.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+
+    try:
+        from charset_normalizer import from_bytes
+        from charset_normalizer.utils import is_multi_byte_encoding
+        best = from_bytes(raw).best()
+        if best is not None and is_multi_byte_encoding(best.encoding):
+            return best.encoding
+    except ImportError:
+        pass
+
+    try:
+        raw.decode("cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+def _extract_text(path, text):
+    """Strip markup from HTML files; return other files unchanged"""
+    if not path.lower().endswith((".html", ".htm")):
+        return text, None
+
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(text, "html.parser")
+    title = soup.title.get_text().strip() if soup.title else None
+    return soup.get_text(), title
+
+
+def load_file(path, root=None):
+    """
+    Load one file as a Document
+
+    Args:
+        path: File path
+        root: Corpus root, used to build a relative title
+
+    Returns:
+        Document with source, title, encoding, content_hash and size metadata
+    """
+    raw, content_hash = read_file_bytes(path)
+    encoding = detect_encoding(raw)
+    text = raw.decode(encoding, errors="replace")
+    text, html_title = _extract_text(path, text)
+
+    relative = os.path.relpath(path, root) if root and os.path.isdir(root) else os.path.basename(path)
+    return Document(
+        page_content=text,
+        metadata={
+            "source": os.path.abspath(path),
+            "title": html_title or relative,
+            "encoding": encoding,
+            "content_hash": content_hash,
+            "file_size": len(raw),
+        }
+    )
+
+
+def iter_local_documents(root, extensions=DEFAULT_EXTENSIONS, workers=4, skip_duplicates=True):
+    """
+    Lazily load every matching file under root
+
+    Up to `workers * 2` files are read ahead on a thread pool; results are
+    yielded in walk order.
+
+    Args:
+        root: Directory (or single file) to load
+        extensions: File extensions to include
+        workers: Reader threads
+        skip_duplicates: Skip files whose content hash was already seen
+
+    Yields:
+        Document objects
+    """
+    seen = set()
+    window = max(1, workers * 2)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = deque()
+        paths = iter_corpus_files(root, extensions)
+
+        def fill():
+            for path in paths:
+                pending.append((path, pool.submit(load_file, path, root)))
+                if len(pending) >= window:
+                    return
+
+        fill()
+        while pending:
+            path, future = pending.popleft()
+            fill()
+            try:
+                document = future.result()
+            except (OSError, ValueError) as e:
+                print(f"      ❌ Failed: {path}: {e}")
+                continue
+
+            content_hash = document.metadata["content_hash"]
+            if skip_duplicates and content_hash in seen:
+                continue
+            seen.add(content_hash)
+            yield document
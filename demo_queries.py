@@ -4,9 +4,9 @@ Run predefined queries to demonstrate retrieval capabilities
 """
 
 import chromadb
-from langchain_openai import OpenAIEmbeddings
+from collection_versions import resolve
+from embedding_providers import embedding_model_name, get_embeddings
 from dotenv import load_dotenv
-import os
 
 load_dotenv()
 
@@ -22,18 +22,15 @@ def run_demo_queries():
     # Connect to ChromaDB
     print("\n[1] Connecting to ChromaDB...")
     client = chromadb.PersistentClient(path="./chroma_db")
-    collection = client.get_collection("healthcare_ai_500_large")
+    collection = client.get_collection(resolve(client, "healthcare_ai_500_large"))
     
     print(f"✅ Connected to: healthcare_ai_500_large")
     print(f"   Total documents: {collection.count()}")
     
     # Initialize embeddings
     print("\n[2] Initializing embeddings model...")
-    embeddings = OpenAIEmbeddings(
-        model="text-embedding-3-large",
-        openai_api_key=os.getenv("OPENAI_API_KEY")
-    )
-    print(f"✅ Model: text-embedding-3-large")
+    embeddings = get_embeddings()
+    print(f"✅ Model: {embedding_model_name(embeddings)}")
     
     # Demo queries
     demo_queries = [
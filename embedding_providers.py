@@ -0,0 +1,148 @@
+"""
+Embedding Providers - Healthcare AI RAG System
+One place to choose how text is embedded
+
+Every entry point gets its embeddings from get_embeddings(), so the
+provider is a configuration choice rather than a code change:
+
+- "openai": OpenAIEmbeddings (default model text-embedding-3-large);
+  needs OPENAI_API_KEY
+- "hashing": HashingEmbeddings, a deterministic local embedder (signed
+  feature hashing of words and word pairs, vectorized with NumPy). No
+  network, no key, and identical vectors on every machine, so the whole
+  pipeline can be run and profiled on an air-gapped box, and our own
+  overhead measured apart from the API's.
+
+Configuration (arguments override the environment / .env):
+    EMBEDDING_PROVIDER=hashing      # or openai (default)
+    EMBEDDING_MODEL=text-embedding-3-small
+    EMBEDDING_DIM=256               # hashing dimensions
+
+A collection must be queried with the provider (and dimension) it was
+built with; RAGSystem records the model name in the collection metadata.
+
+Usage:
+    from embedding_providers import get_embeddings
+    embeddings = get_embeddings()                      # from the environment
+    embeddings = get_embeddings("hashing", dim=512)
+    vectors = embeddings.embed_documents(["prior authorization", "..."])
+"""
+
+import hashlib
+import os
+import re
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+DEFAULT_PROVIDER = "openai"
+DEFAULT_OPENAI_MODEL = "text-embedding-3-large"
+DEFAULT_HASHING_DIM = 256
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic local embeddings: signed feature hashing, L2-normalised
+
+    Each word and each pair of adjacent words is hashed (blake2b, so the
+    result does not depend on PYTHONHASHSEED) to one of dim buckets with
+    a +1/-1 sign. Hashes are memoised per feature and a whole batch is
+    accumulated with a single np.bincount.
+
+    Args:
+        dim: Number of dimensions
+        max_cached_features: Feature hashes kept in memory before the memo is reset
+    """
+
+    def __init__(self, dim=DEFAULT_HASHING_DIM, max_cached_features=1_000_000):
+        self.dim = dim
+        self.model = f"hashing-{dim}"
+        self.max_cached_features = max_cached_features
+        self._features = {}
+
+    def _feature(self, feature):
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        return h % self.dim, 1.0 if (h >> 32) & 1 else -1.0
+
+    def embed_array(self, texts):
+        """
+        Embed texts into a (len(texts), dim) float32 array
+        """
+        if len(self._features) > self.max_cached_features:
+            self._features = {}
+        features = self._features
+
+        rows, buckets, signs = [], [], []
+        for row, text in enumerate(texts):
+            words = WORD_RE.findall(text.lower())
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                hashed = features.get(feature)
+                if hashed is None:
+                    hashed = features[feature] = self._feature(feature)
+                rows.append(row)
+                buckets.append(hashed[0])
+                signs.append(hashed[1])
+
+        flat = np.asarray(rows, dtype=np.int64) * self.dim + np.asarray(buckets, dtype=np.int64)
+        matrix = np.bincount(flat, weights=signs, minlength=len(texts) * self.dim)
+        matrix = matrix.reshape(len(texts), self.dim).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1.0)
+
+    def embed_documents(self, texts: List[str]) -> List[np.ndarray]:
+        """One float32 vector per text (rows of embed_array)"""
+        return list(self.embed_array(texts))
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed_array([text])[0]
+
+
+def _openai(model=None, **_):
+    from openai_pool import get_pool
+
+    if not os.getenv("OPENAI_API_KEY"):
+        raise ValueError("OPENAI_API_KEY not found in .env file "
+                         "(set EMBEDDING_PROVIDER=hashing to embed offline)")
+    return get_pool().embeddings(model or os.getenv("EMBEDDING_MODEL") or DEFAULT_OPENAI_MODEL)
+
+
+def _hashing(dim=None, **_):
+    return HashingEmbeddings(dim=int(dim or os.getenv("EMBEDDING_DIM") or DEFAULT_HASHING_DIM))
+
+
+PROVIDERS = {
+    "openai": _openai,
+    "hashing": _hashing,
+}
+
+
+def provider_name(provider=None):
+    """The configured provider: the argument, else EMBEDDING_PROVIDER, else "openai" """
+    name = (provider or os.getenv("EMBEDDING_PROVIDER") or DEFAULT_PROVIDER).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown embedding provider {name!r}; choose from {', '.join(PROVIDERS)}")
+    return name
+
+
+def get_embeddings(provider=None, model=None, dim=None):
+    """
+    Create the configured embeddings object
+
+    Args:
+        provider: "openai" or "hashing" (default: EMBEDDING_PROVIDER, else "openai")
+        model: OpenAI model name (default: EMBEDDING_MODEL, else text-embedding-3-large)
+        dim: Hashing dimensions (default: EMBEDDING_DIM, else 256)
+
+    Returns:
+        LangChain Embeddings object
+    """
+    return PROVIDERS[provider_name(provider)](model=model, dim=dim)
+
+
+def embedding_model_name(embeddings):
+    """Model name for metadata and cache keys, e.g. text-embedding-3-large or hashing-256"""
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
@@ -0,0 +1,349 @@
+"""
+Configuration Experiments - Healthcare AI RAG System
+Grid search over chunking, embedding dimension and k with cached artifacts
+
+Comparing chunk sizes or models used to mean re-running rag_pipeline.main
+and re-embedding everything for every variant. This runner sweeps
+
+    chunk_size x chunk_overlap x embedding dimension x k
+
+and only pays for what is new:
+- source documents are fetched once and cached
+- each distinct (chunk_size, chunk_overlap) is chunked once and cached
+- each chunking is embedded once, at the model's full dimension; smaller
+  dimensions are derived by truncating and re-normalising the vectors,
+  which is how text-embedding-3 models shorten embeddings
+- question embeddings are cached the same way
+- every k is scored from a single top-k_max retrieval
+
+Relevance is labeled as passages of the source documents (see
+ir_metrics.load_question_set), so the same question set scores every
+chunking. A chunk counts as relevant when it overlaps a labeled passage.
+
+Retrieval is exact search over the in-memory embeddings, so the quality
+numbers are free of index approximation. Cost is estimated from
+characters (about 4 per token).
+
+Usage:
+    python experiments.py --questions questions.jsonl \\
+        --chunk-size 300 500 1000 --chunk-overlap 50 100 --dims 256 1024 3072 --k 3 5 10
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+
+from checkpoint import atomic_write
+from ir_metrics import compute_metrics, embed_questions, gain_matrix, load_question_set
+
+
+DEFAULT_CACHE_DIR = "./experiment_cache"
+
+CHARS_PER_TOKEN = 4
+
+# USD per 1M tokens
+EMBEDDING_PRICES = {
+    "text-embedding-3-large": 0.13,
+    "text-embedding-3-small": 0.02,
+}
+GENERATION_INPUT_PRICE = 0.15   # gpt-4o-mini
+
+
+def _digest(*parts):
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(b"\0" + str(part).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+class ExperimentCache:
+    """
+    On-disk cache of documents, chunkings and chunk embeddings
+
+    Keys are content hashes, so a changed document or chunking never
+    reuses stale artifacts.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, kind, key, ext):
+        return os.path.join(self.cache_dir, f"{kind}_{key}.{ext}")
+
+    def _cached(self, path, load, build, save):
+        if os.path.exists(path):
+            self.hits += 1
+            return load(path)
+        self.misses += 1
+        value = build()
+        atomic_write(path, lambda f: save(f, value))
+        return value
+
+    def _pickled(self, path, build):
+        def load(p):
+            with open(p, "rb") as f:
+                return pickle.load(f)
+        return self._cached(path, load, build, lambda f, v: pickle.dump(v, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def documents(self, key, load_documents):
+        """Documents for a source list (key identifies the sources)"""
+        return self._pickled(self._path("documents", _digest(key), "pkl"), load_documents)
+
+    def chunks(self, documents, chunk_size, chunk_overlap):
+        """Chunks of documents for one chunking configuration"""
+        from rag_pipeline import iter_split, make_text_splitter
+
+        key = _digest(self.fingerprint(documents), chunk_size, chunk_overlap)
+        splitter = make_text_splitter(chunk_size, chunk_overlap)
+        return self._pickled(self._path("chunks", key, "pkl"),
+                             lambda: list(iter_split(splitter, documents)))
+
+    def embeddings(self, chunks, embeddings, model_name):
+        """Full-dimension float32 embeddings of a chunking"""
+        from rag_pipeline import embed_array
+
+        key = _digest(model_name, self.fingerprint(chunks))
+        return self._cached(self._path("embeddings", key, "npy"), np.load,
+                            lambda: embed_array(embeddings, [c.page_content for c in chunks]),
+                            lambda f, v: np.save(f, v))
+
+    @staticmethod
+    def fingerprint(documents):
+        h = hashlib.sha1()
+        for document in documents:
+            h.update(str(document.metadata.get("source")).encode("utf-8") + b"\0")
+            h.update(document.page_content.encode("utf-8") + b"\0")
+        return h.hexdigest()
+
+
+def truncate_dims(vectors, dim):
+    """
+    Shorten embeddings to their first `dim` components and re-normalise
+
+    Args:
+        vectors: (n, full_dim) float32 array
+        dim: Target dimension (<= full_dim)
+
+    Returns:
+        (n, dim) float32 array with unit-length rows
+    """
+    if dim > vectors.shape[1]:
+        raise ValueError(f"Cannot expand {vectors.shape[1]}-dim embeddings to {dim}")
+    short = np.ascontiguousarray(vectors[:, :dim])
+    return short / np.maximum(np.linalg.norm(short, axis=1, keepdims=True), 1e-12)
+
+
+def resolve_spans(questions, documents):
+    """
+    Turn each question's relevant_text labels into character spans
+
+    Returns:
+        Per question, a list of (source, start, end) spans
+    """
+    resolved = []
+    for question in questions:
+        spans = [(s["source"], int(s["start"]), int(s["end"])) for s in question.get("spans", [])]
+        for text in question.get("texts", []):
+            for document in documents:
+                start = document.page_content.find(text)
+                if start >= 0:
+                    spans.append((document.metadata.get("source"), start, start + len(text)))
+                    break
+        resolved.append(spans)
+    return resolved
+
+
+def span_relevance(spans, chunks):
+    """
+    Relevant chunk indices of a chunking, from character spans
+
+    Args:
+        spans: Per question, list of (source, start, end)
+        chunks: Chunks with source, start_index and end_index metadata
+
+    Returns:
+        Per question, {chunk_index: 1.0} for every chunk overlapping a span
+    """
+    by_source = {}
+    for i, chunk in enumerate(chunks):
+        by_source.setdefault(chunk.metadata.get("source"), []).append(i)
+    bounds = {
+        source: (
+            np.array(indices),
+            np.array([chunks[i].metadata["start_index"] for i in indices]),
+            np.array([chunks[i].metadata["end_index"] for i in indices]),
+        )
+        for source, indices in by_source.items()
+    }
+
+    relevance = []
+    for question_spans in spans:
+        relevant = {}
+        for source, start, end in question_spans:
+            if source not in bounds:
+                continue
+            indices, starts, ends = bounds[source]
+            for i in indices[(starts < end) & (ends > start)]:
+                relevant[str(i)] = 1.0
+        relevance.append(relevant)
+    return relevance
+
+
+def run_grid(documents, questions, embeddings, chunk_sizes=(500,), chunk_overlaps=(100,),
+             dims=(None,), ks=(5,), model_name="text-embedding-3-large", cache=None):
+    """
+    Evaluate every configuration of the grid
+
+    Args:
+        documents: Source documents
+        questions: Question set with span/text labels (ir_metrics.load_question_set)
+        embeddings: Embeddings object for chunks and questions
+        chunk_sizes, chunk_overlaps: Chunking grid (overlap >= size is skipped)
+        dims: Embedding dimensions (None = the model's full dimension; larger
+            ones are skipped)
+        ks: Cut-offs; all are scored from one retrieval
+        model_name: Embedding model (cache key and price lookup)
+        cache: ExperimentCache (default: ./experiment_cache)
+
+    Returns:
+        List of result rows, one per (chunk_size, chunk_overlap, dim, k)
+    """
+    cache = cache or ExperimentCache()
+    spans = resolve_spans(questions, documents)
+    unlabeled = sum(1 for s in spans if not s)
+    if unlabeled:
+        print(f"   ⚠️  {unlabeled} question(s) have no passage found in the sources")
+
+    question_vectors = embed_questions(embeddings, [q["question"] for q in questions], model_name,
+                                       cache_dir=cache.cache_dir)
+    embed_price = EMBEDDING_PRICES.get(model_name, 0.0)
+    k_max = max(ks)
+
+    # Truncation can only shorten: dims above the model's (e.g. 1024 with the
+    # 256-dim hashing embedder) are skipped
+    full_dim = question_vectors.shape[1]
+    too_large = [dim for dim in dims if dim and dim > full_dim]
+    if too_large:
+        print(f"   ⚠️  Skipping dims {', '.join(map(str, too_large))}: {model_name} has {full_dim}")
+    dims = [dim for dim in dims if not dim or dim <= full_dim] or [None]
+
+    rows = []
+    for chunk_size, chunk_overlap in itertools.product(chunk_sizes, chunk_overlaps):
+        if chunk_overlap >= chunk_size:
+            continue
+
+        start = time.perf_counter()
+        chunks = cache.chunks(documents, chunk_size, chunk_overlap)
+        chunk_vectors = cache.embeddings(chunks, embeddings, model_name)
+        prepare_s = time.perf_counter() - start
+
+        lengths = np.array([len(c.page_content) for c in chunks])
+        relevance = span_relevance(spans, chunks)
+        ingest_cost = lengths.sum() / CHARS_PER_TOKEN / 1e6 * embed_price
+
+        for dim in dims:
+            dim = dim or chunk_vectors.shape[1]
+            index = truncate_dims(chunk_vectors, dim)
+            queries = truncate_dims(question_vectors, dim)
+
+            # Exact top k_max for every question in one matrix product
+            start = time.perf_counter()
+            scores = queries @ index.T
+            top = np.argpartition(-scores, min(k_max, len(chunks)) - 1, axis=1)[:, :k_max]
+            top = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+            search_ms = (time.perf_counter() - start) * 1000 / max(len(questions), 1)
+
+            retrieved = [[str(i) for i in row] for row in top]
+            gains, ideal, n_relevant = gain_matrix(retrieved, relevance)
+            metrics = compute_metrics(gains, ideal, n_relevant, ks)
+            context_chars = np.cumsum(lengths[top], axis=1)
+
+            for k in ks:
+                prompt_tokens = context_chars[:, min(k, k_max) - 1].mean() / CHARS_PER_TOKEN
+                rows.append({
+                    "chunk_size": chunk_size,
+                    "chunk_overlap": chunk_overlap,
+                    "dim": dim,
+                    "k": k,
+                    "chunks": len(chunks),
+                    "recall": float(metrics["recall"][k].mean()),
+                    "mrr": float(metrics["mrr"][k].mean()),
+                    "ndcg": float(metrics["ndcg"][k].mean()),
+                    "search_ms": search_ms,
+                    "prepare_s": prepare_s,
+                    "index_mb": index.nbytes / 1e6,
+                    "prompt_tokens": float(prompt_tokens),
+                    "ingest_cost": float(ingest_cost),
+                    "cost_per_1k_questions": float(prompt_tokens * 1000 / 1e6 * GENERATION_INPUT_PRICE),
+                })
+    return rows
+
+
+def print_grid(rows):
+    print(f"\n{'Size':>5} {'Ovl':>4} {'Dim':>5} {'k':>3} {'Chunks':>7} {'Recall':>7} {'MRR':>6} "
+          f"{'nDCG':>6} {'ms/q':>6} {'Index MB':>9} {'Prompt tok':>11} {'$/1k q':>7} {'Ingest $':>9}")
+    print("─"*98)
+    for r in rows:
+        print(f"{r['chunk_size']:>5} {r['chunk_overlap']:>4} {r['dim']:>5} {r['k']:>3} {r['chunks']:>7} "
+              f"{r['recall']:>7.3f} {r['mrr']:>6.3f} {r['ndcg']:>6.3f} {r['search_ms']:>6.3f} "
+              f"{r['index_mb']:>9.1f} {r['prompt_tokens']:>11.0f} {r['cost_per_1k_questions']:>7.3f} "
+              f"{r['ingest_cost']:>9.4f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grid search over chunking, embedding dimension and k")
+    parser.add_argument("--questions", required=True, help="JSONL question set with passage labels")
+    parser.add_argument("--dir", help="Local corpus instead of the source URLs")
+    parser.add_argument("--chunk-size", type=int, nargs="+", default=[300, 500, 1000])
+    parser.add_argument("--chunk-overlap", type=int, nargs="+", default=[50, 100])
+    parser.add_argument("--dims", type=int, nargs="+", default=[256, 1024, 3072])
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5, 10])
+    parser.add_argument("--provider", choices=["openai", "hashing"],
+                        help="Embedding provider (default: EMBEDDING_PROVIDER, else openai)")
+    parser.add_argument("--model", help="OpenAI embedding model (default: text-embedding-3-large)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--save", help="Write the result rows to this JSON file")
+    args = parser.parse_args(argv)
+
+    from rag_pipeline import SOURCE_URLS, RAGSystem
+
+    print("="*70)
+    print(" CONFIGURATION GRID SEARCH")
+    print("="*70)
+
+    rag = RAGSystem(embedding_model=args.model, embedding_provider=args.provider)
+    cache = ExperimentCache(args.cache_dir)
+    if args.dir:
+        # Local files are cheap to re-read and may have changed; only fetched pages are cached
+        documents = list(rag.load_documents_from_directory(args.dir))
+    else:
+        documents = cache.documents(("urls", *SOURCE_URLS),
+                                    lambda: rag.load_documents_from_urls(SOURCE_URLS))
+    questions = load_question_set(args.questions)
+    print(f"   Documents: {len(documents)} | Questions: {len(questions)}")
+
+    start = time.perf_counter()
+    rows = run_grid(documents, questions, rag.embeddings, args.chunk_size, args.chunk_overlap,
+                    args.dims, args.k, model_name=rag.embedding_model_name, cache=cache)
+    print_grid(rows)
+    print(f"\n⏱️  {len(rows)} configurations in {time.perf_counter() - start:.1f}s "
+          f"(cache hits: {cache.hits}, misses: {cache.misses})")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"💾 Results saved to: {args.save}")
+    return rows
+
+
+if __name__ == "__main__":
+    main()
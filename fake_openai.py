@@ -0,0 +1,201 @@
+"""
+Fake OpenAI - Healthcare AI RAG System
+A local stand-in for the OpenAI API, with rate limits
+
+Serves /v1/embeddings (HashingEmbeddings vectors, so retrieval still
+makes sense) and /v1/chat/completions (a canned answer quoting the
+question), with usage in every response. Optional request and token
+limits are enforced over a sliding window (60 s by default) and answered
+with 429 and Retry-After, like the real API, so rate limiting and
+back-off can be exercised without a key or network.
+
+Usage:
+    python fake_openai.py --port 8089 --rpm 60 --latency-ms 200
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake python rag_cli.py ask "..."
+
+    server = FakeOpenAI(rpm=120).start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    ...
+    server.stats       # requests, 429s and tokens per endpoint
+    server.close()
+"""
+
+import argparse
+import base64
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from embedding_providers import HashingEmbeddings
+
+
+CHARS_PER_TOKEN = 4
+
+
+def _tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class FakeOpenAI:
+    """
+    Local OpenAI-compatible endpoint
+
+    Args:
+        rpm: Requests per window before 429s (None: unlimited)
+        tpm: Tokens per window before 429s (None: unlimited)
+        window: Window length in seconds (shorter windows make tests fast)
+        latency_ms: Added to every successful response
+        dim: Embedding dimensions
+        host, port: Where to listen (port 0 picks a free one)
+    """
+
+    def __init__(self, rpm=None, tpm=None, latency_ms=0.0, dim=256, host="127.0.0.1", port=0,
+                 window=60.0):
+        self.window_seconds = window
+        self.rpm = rpm
+        self.tpm = tpm
+        self.latency = latency_ms / 1000
+        self.embedder = HashingEmbeddings(dim)
+        self.lock = threading.Lock()
+        self.window = deque()  # (time, tokens) of accepted requests
+        self.stats = {"requests": 0, "rate_limited": 0, "tokens": 0, "embeddings": 0, "chat": 0}
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.base_url = f"http://{host}:{self.server.server_port}/v1"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # Limits -----------------------------------------------------------------
+
+    def _admit(self, tokens):
+        """0 if the request is within the limits, else seconds until it would be"""
+        with self.lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            while self.window and self.window[0][0] <= now - self.window_seconds:
+                self.window.popleft()
+            used = sum(t for _, t in self.window)
+            over_requests = self.rpm is not None and len(self.window) >= self.rpm
+            over_tokens = self.tpm is not None and self.window and used + tokens > self.tpm
+            if over_requests or over_tokens:
+                self.stats["rate_limited"] += 1
+                return max(self.window[0][0] + self.window_seconds - now, 0.01)
+            self.window.append((now, tokens))
+            self.stats["tokens"] += tokens
+            return 0.0
+
+    # Endpoints --------------------------------------------------------------
+
+    def _embeddings(self, body):
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        if inputs and isinstance(inputs[0], int):
+            inputs = [inputs]
+        texts = [text if isinstance(text, str) else " ".join(map(str, text)) for text in inputs]
+        tokens = sum(len(t) if isinstance(t, list) else _tokens(t) for t in inputs)
+        vectors = self.embedder.embed_array(texts)
+        if body.get("encoding_format") == "base64":
+            data = [base64.b64encode(v.astype("<f4").tobytes()).decode("ascii") for v in vectors]
+        else:
+            data = [v.tolist() for v in vectors]
+        return tokens, {
+            "object": "list",
+            "model": body.get("model", "fake"),
+            "data": [{"object": "embedding", "index": i, "embedding": e} for i, e in enumerate(data)],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def _chat(self, body):
+        messages = body.get("messages", [])
+        prompt = sum(_tokens(m["content"] if isinstance(m.get("content"), str) else json.dumps(m.get("content")))
+                     for m in messages)
+        question = messages[-1]["content"] if messages else ""
+        question = question if isinstance(question, str) else json.dumps(question)
+        answer = f"Fake answer to: {question.strip().splitlines()[-1][:200] if question.strip() else ''}"
+        completion = _tokens(answer)
+        return prompt + (body.get("max_tokens") or completion), {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": answer}}],
+            "usage": {"prompt_tokens": prompt, "completion_tokens": completion,
+                      "total_tokens": prompt + completion},
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, status, payload, headers=()):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in headers:
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path.endswith("/embeddings"):
+                    endpoint = fake._embeddings
+                    kind = "embeddings"
+                elif self.path.endswith("/chat/completions"):
+                    endpoint = fake._chat
+                    kind = "chat"
+                else:
+                    self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+                tokens, payload = endpoint(body)
+                retry_after = fake._admit(tokens)
+                if retry_after:
+                    self._send(429, {"error": {"message": "Rate limit reached", "type": "requests",
+                                               "code": "rate_limit_exceeded"}},
+                               [("Retry-After", f"{retry_after:.3f}"),
+                                ("retry-after-ms", str(int(retry_after * 1000)))])
+                    return
+                with fake.lock:
+                    fake.stats[kind] += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                self._send(200, payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local fake OpenAI endpoint with rate limits")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--rpm", type=int, default=None)
+    parser.add_argument("--tpm", type=int, default=None)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--window", type=float, default=60.0, help="Limit window in seconds")
+    args = parser.parse_args(argv)
+
+    server = FakeOpenAI(args.rpm, args.tpm, args.latency_ms, args.dim, args.host, args.port, args.window)
+    print(f"🧪 Fake OpenAI on {server.base_url} (RPM {args.rpm or '∞'}, TPM {args.tpm or '∞'})")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
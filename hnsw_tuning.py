@@ -0,0 +1,292 @@
+"""
+HNSW Index Tuning - Healthcare AI RAG System
+Collection HNSW settings and a recall/latency sweep to choose them
+
+ChromaDB builds an HNSW graph per collection. Its settings are stored as
+collection metadata when the collection is created:
+- space: distance function ("l2", "cosine" or "ip")
+- M: graph neighbours per node (memory and recall go up with it)
+- construction_ef: candidate list size while building (build time vs quality)
+- search_ef: candidate list size while querying (latency vs recall);
+  unlike the others it can be changed on an existing collection
+
+sweep_hnsw builds an index for every (space, M, construction_ef) in a grid,
+queries it at each search_ef, and reports recall@k against exact
+brute-force search, build time, on-disk index size and query latency.
+
+Usage:
+    python hnsw_tuning.py --collection healthcare_ai_500_large
+    python hnsw_tuning.py --synthetic 20000 --dim 256 --M 8 16 32 --search-ef 10 50 100
+"""
+
+import argparse
+import itertools
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+HNSW_SPACES = ("l2", "cosine", "ip")
+
+# RAGSystem / CLI option name -> ChromaDB collection metadata key
+HNSW_KEYS = {
+    "space": "hnsw:space",
+    "M": "hnsw:M",
+    "construction_ef": "hnsw:construction_ef",
+    "search_ef": "hnsw:search_ef",
+}
+
+
+def hnsw_metadata(space=None, M=None, construction_ef=None, search_ef=None):
+    """
+    Collection metadata entries for HNSW settings (unset values keep Chroma's defaults)
+
+    Args:
+        space: "l2", "cosine" or "ip"
+        M: Neighbours per graph node
+        construction_ef: Candidate list size while building
+        search_ef: Candidate list size while querying
+
+    Returns:
+        Dict to merge into the collection metadata
+    """
+    if space is not None and space not in HNSW_SPACES:
+        raise ValueError(f"space must be one of {HNSW_SPACES}, got {space!r}")
+    values = {"space": space, "M": M, "construction_ef": construction_ef, "search_ef": search_ef}
+    return {HNSW_KEYS[name]: value for name, value in values.items() if value is not None}
+
+
+def parse_hnsw_options(options):
+    """
+    Parse ["space=cosine", "M=32", ...] command-line options
+
+    Returns:
+        Keyword arguments for hnsw_metadata
+    """
+    parsed = {}
+    for option in options or []:
+        name, _, value = option.partition("=")
+        if name not in HNSW_KEYS:
+            raise ValueError(f"Unknown HNSW option {name!r} (expected one of {list(HNSW_KEYS)})")
+        parsed[name] = value if name == "space" else int(value)
+    return parsed
+
+
+def set_search_ef(collection, search_ef):
+    """
+    Change the query-time candidate list size of an existing collection
+
+    The setting is persisted immediately, but an index already loaded in
+    this process keeps its old value; it applies to clients opened later
+    (e.g. after a query server reload or restart).
+    """
+    collection.modify(configuration={"hnsw": {"ef_search": search_ef}})
+
+
+def _reopen(path, collection_name):
+    """Open a collection through a fresh client so its index is reloaded from disk"""
+    import chromadb
+    from chromadb.api.shared_system_client import SharedSystemClient
+
+    SharedSystemClient.clear_system_cache()
+    return chromadb.PersistentClient(path=path).get_collection(collection_name)
+
+
+def exact_top_k(vectors, queries, k, space="l2", block=1024):
+    """
+    Brute-force nearest neighbours (the ground truth for recall)
+
+    Args:
+        vectors: (n, dim) stored vectors
+        queries: (q, dim) query vectors
+        k: Neighbours per query
+        space: Distance function, as in HNSW
+        block: Queries scored per matrix product
+
+    Returns:
+        (q, k) array of row indices into vectors, nearest first
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    if space == "cosine":
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    norms = (vectors ** 2).sum(axis=1)
+
+    k = min(k, len(vectors))
+    out = np.empty((len(queries), k), dtype=np.int64)
+    for start in range(0, len(queries), block):
+        q = queries[start:start + block]
+        if space == "l2":
+            # |v|^2 - 2 q.v  ranks the same as the full squared distance
+            scores = norms[None, :] - 2 * (q @ vectors.T)
+        else:
+            scores = -(q @ vectors.T)
+        top = np.argpartition(scores, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)
+        out[start:start + len(q)] = np.take_along_axis(top, order, axis=1)
+    return out
+
+
+def recall_at_k(found, truth):
+    """
+    Mean fraction of the exact top k that the index returned
+
+    Args:
+        found: (q, k) row indices returned by the index (-1 for missing)
+        truth: (q, k) exact row indices
+
+    Returns:
+        Recall in [0, 1]
+    """
+    found = np.asarray(found)
+    truth = np.asarray(truth)
+    hits = (found[:, :, None] == truth[:, None, :]).any(axis=2).sum(axis=1)
+    return float(hits.mean() / truth.shape[1])
+
+
+def _dir_size(path):
+    return sum(
+        os.path.getsize(os.path.join(dirpath, name))
+        for dirpath, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def sweep_hnsw(vectors, queries, spaces=("l2",), Ms=(16,), construction_efs=(100,),
+               search_efs=(10, 50, 100), k=10, batch_size=1000):
+    """
+    Build and query an index for every point of a parameter grid
+
+    Each (space, M, construction_ef) index is built once in a temporary
+    directory; for each search_ef the setting is changed and the index is
+    reopened from disk.
+
+    Args:
+        vectors: (n, dim) vectors to index
+        queries: (q, dim) query vectors
+        spaces, Ms, construction_efs, search_efs: Parameter grid
+        k: Neighbours per query for recall@k
+        batch_size: Vectors per add() call while building
+
+    Returns:
+        List of result dicts, one per grid point
+    """
+    import chromadb
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    ids = [str(i) for i in range(len(vectors))]
+    truths = {space: exact_top_k(vectors, queries, k, space) for space in spaces}
+
+    rows = []
+    for space, M, construction_ef in itertools.product(spaces, Ms, construction_efs):
+        with tempfile.TemporaryDirectory() as path:
+            client = chromadb.PersistentClient(path=path)
+            metadata = hnsw_metadata(space, M, construction_ef, search_efs[0])
+
+            start = time.perf_counter()
+            collection = client.create_collection("sweep", metadata=metadata)
+            for i in range(0, len(vectors), batch_size):
+                collection.add(ids=ids[i:i + batch_size], embeddings=vectors[i:i + batch_size])
+            build_s = time.perf_counter() - start
+            index_mb = _dir_size(path) / 1e6
+
+            for search_ef in search_efs:
+                set_search_ef(collection, search_ef)
+                collection = _reopen(path, "sweep")
+                collection.query(query_embeddings=queries[:1], n_results=k)  # warm
+
+                latencies = []
+                found = []
+                for query in queries:
+                    t0 = time.perf_counter()
+                    result = collection.query(query_embeddings=[query], n_results=k, include=[])
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                    row = [int(i) for i in result["ids"][0]]
+                    found.append(row + [-1] * (k - len(row)))
+                latencies = np.array(latencies)
+
+                rows.append({
+                    "space": space,
+                    "M": M,
+                    "construction_ef": construction_ef,
+                    "search_ef": search_ef,
+                    "recall": recall_at_k(found, truths[space]),
+                    "build_s": build_s,
+                    "index_mb": index_mb,
+                    "p50_ms": float(np.percentile(latencies, 50)),
+                    "p95_ms": float(np.percentile(latencies, 95)),
+                })
+    return rows
+
+
+def print_sweep(rows, k):
+    print(f"\n{'Space':<7} {'M':>4} {'Build ef':>9} {'Search ef':>10} {f'Recall@{k}':>10} "
+          f"{'Build s':>8} {'Index MB':>9} {'p50 ms':>7} {'p95 ms':>7}")
+    print("─"*79)
+    for r in rows:
+        print(f"{r['space']:<7} {r['M']:>4} {r['construction_ef']:>9} {r['search_ef']:>10} "
+              f"{r['recall']:>10.3f} {r['build_s']:>8.2f} {r['index_mb']:>9.1f} "
+              f"{r['p50_ms']:>7.2f} {r['p95_ms']:>7.2f}")
+
+
+def load_collection_vectors(collection_name, n_queries, path="./chroma_db", seed=0):
+    """
+    Stored vectors of a collection, with held-out queries sampled from them
+
+    Queries are stored vectors plus small noise, so the sweep reflects the
+    real embedding distribution without needing an API call.
+    """
+    import chromadb
+    from collection_versions import resolve
+
+    client = chromadb.PersistentClient(path=path)
+    stored = client.get_collection(resolve(client, collection_name)).get(include=["embeddings"])
+    vectors = np.asarray(stored["embeddings"], dtype=np.float32)
+
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+    noise = rng.standard_normal((len(picks), vectors.shape[1])).astype(np.float32)
+    scale = 0.1 * np.linalg.norm(vectors[picks], axis=1, keepdims=True) / np.sqrt(vectors.shape[1])
+    return vectors, vectors[picks] + noise * scale
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HNSW recall/latency sweep")
+    parser.add_argument("--collection", help="Sweep over the vectors of this collection")
+    parser.add_argument("--synthetic", type=int, default=20000,
+                        help="Number of random vectors when no collection is given")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--space", nargs="+", default=["l2"], choices=HNSW_SPACES)
+    parser.add_argument("--M", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[100])
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[10, 50, 100])
+    args = parser.parse_args(argv)
+
+    print("\n" + "="*70)
+    print(" 🕸️  HNSW PARAMETER SWEEP")
+    print("="*70)
+
+    if args.collection:
+        vectors, queries = load_collection_vectors(args.collection, args.queries)
+        print(f"   Collection: {args.collection}")
+    else:
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((args.synthetic, args.dim)).astype(np.float32)
+        queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+        print("   Synthetic vectors")
+    print(f"   Vectors: {len(vectors):,} x {vectors.shape[1]} | Queries: {len(queries)} | k: {args.k}")
+
+    rows = sweep_hnsw(vectors, queries, args.space, args.M, args.construction_ef,
+                      args.search_ef, k=args.k)
+    print_sweep(rows, args.k)
+    return rows
+
+
+if __name__ == "__main__":
+    main()
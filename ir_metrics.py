@@ -0,0 +1,451 @@
+"""
+Retrieval Metrics - Healthcare AI RAG System
+Precision@k, recall@k, MRR and nDCG over labeled question sets
+
+rag_evaluation.py checks a handful of questions by keyword matching. This
+module scores retrieval against labeled chunk IDs instead, at scale:
+
+1. Load a question set from JSONL, one question per line:
+       {"id": "q1", "question": "...", "relevant_ids": ["doc_12", "doc_13"]}
+   Graded relevance is optional:
+       {"id": "q2", "question": "...", "relevance": {"doc_4": 3, "doc_9": 1}}
+   Labels that survive re-chunking (used by experiments.py) are passages
+   of the source documents, as character spans or exact text:
+       {"id": "q3", "question": "...",
+        "relevant_spans": [{"source": "https://...", "start": 1200, "end": 1650}],
+        "relevant_text": ["Prior authorization remains ..."]}
+2. Embed the questions in batches (cached on disk per question set and
+   embedding model) and retrieve the top k_max for all of them with
+   multi-vector queries.
+3. Turn the retrieved IDs into a (questions x k_max) gain matrix and
+   compute every metric at every k with array operations.
+
+Adaptive k (retrieval_modes.choose_k) can be compared with fixed k on the
+same questions: quality at the k actually used, prompt tokens and latency.
+
+Usage:
+    python ir_metrics.py questions.jsonl --collection healthcare_ai_500_large --k 1 3 5 10
+    python ir_metrics.py questions.jsonl --adaptive --k 3 5 10 --token-budget 1500
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+
+DEFAULT_KS = (1, 3, 5, 10)
+DEFAULT_CACHE_DIR = "./eval_cache"
+
+
+# ----------------------------------------------------------------------------
+# Question sets
+# ----------------------------------------------------------------------------
+
+def load_question_set(path):
+    """
+    Load a JSONL question set
+
+    Args:
+        path: JSONL file; each line has "question" and "relevant_ids"
+            (binary relevance), "relevance" ({chunk_id: grade}), or
+            "relevant_spans" / "relevant_text" (passages of the sources)
+
+    Returns:
+        List of dicts with id, question, relevance ({chunk_id: grade}),
+        spans and texts
+    """
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if "relevance" in record:
+                relevance = {str(k): float(v) for k, v in record["relevance"].items() if v > 0}
+            elif "relevant_ids" in record:
+                relevance = {str(chunk_id): 1.0 for chunk_id in record["relevant_ids"]}
+            elif "relevant_spans" in record or "relevant_text" in record:
+                relevance = {}
+            else:
+                raise ValueError(f"{path}:{line_no}: needs 'relevant_ids', 'relevance', "
+                                 f"'relevant_spans' or 'relevant_text'")
+            questions.append({
+                "id": record.get("id", line_no),
+                "question": record["question"],
+                "relevance": relevance,
+                "spans": record.get("relevant_spans", []),
+                "texts": record.get("relevant_text", []),
+            })
+    return questions
+
+
+# ----------------------------------------------------------------------------
+# Metrics
+# ----------------------------------------------------------------------------
+
+def gain_matrix(retrieved_ids, relevance):
+    """
+    Look up the relevance grade of every retrieved chunk
+
+    All IDs are mapped to integers once, and (question, chunk) pairs are
+    matched with a single sorted search instead of per-question loops.
+
+    Args:
+        retrieved_ids: Per question, the ranked list of retrieved chunk IDs
+        relevance: Per question, {chunk_id: grade}
+
+    Returns:
+        (gains, ideal, n_relevant): (q, k_max) grades of the retrieved ranks,
+        (q, k_max) grades of the best possible ranking, and (q,) counts of
+        relevant chunks
+    """
+    n = len(retrieved_ids)
+    k_max = max((len(ids) for ids in retrieved_ids), default=0)
+
+    vocab = {}
+    code = lambda chunk_id: vocab.setdefault(chunk_id, len(vocab))
+
+    retrieved = np.full((n, k_max), -1, dtype=np.int64)
+    for q, ids in enumerate(retrieved_ids):
+        retrieved[q, :len(ids)] = [code(chunk_id) for chunk_id in ids]
+
+    pair_q = np.fromiter((q for q, rel in enumerate(relevance) for _ in rel), dtype=np.int64)
+    pair_id = np.fromiter((code(c) for rel in relevance for c in rel), dtype=np.int64)
+    pair_grade = np.fromiter((g for rel in relevance for g in rel.values()), dtype=np.float64)
+
+    # Encode (question, chunk) as one integer key and match by binary search
+    width = max(len(vocab), 1)
+    pair_keys = pair_q * width + pair_id
+    order = np.argsort(pair_keys)
+    sorted_keys, sorted_grades = pair_keys[order], pair_grade[order]
+
+    keys = np.arange(n)[:, None] * width + retrieved
+    gains = np.zeros((n, k_max))
+    if len(sorted_keys):
+        pos = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+        found = (retrieved >= 0) & (sorted_keys[pos] == keys)
+        gains[found] = sorted_grades[pos[found]]
+
+    # Ideal ranking: each question's grades sorted descending, padded with zeros
+    counts = np.bincount(pair_q, minlength=n)
+    ideal = np.zeros((n, k_max))
+    by_grade = np.lexsort((-pair_grade, pair_q))
+    ranked_q = pair_q[by_grade]
+    rank = np.arange(len(ranked_q)) - (np.cumsum(counts) - counts)[ranked_q]
+    keep = rank < k_max
+    ideal[ranked_q[keep], rank[keep]] = pair_grade[by_grade][keep]
+
+    return gains, ideal, counts
+
+
+def metrics_at(gains, ideal, n_relevant, k):
+    """
+    Precision, recall, MRR and nDCG at a cut-off that may differ per question
+
+    Args:
+        gains: (q, k_max) relevance grades of the retrieved ranks
+        ideal: (q, k_max) grades of the ideal ranking
+        n_relevant: (q,) number of relevant chunks per question
+        k: Cut-off, a single int or a (q,) array (e.g. adaptive k)
+
+    Returns:
+        {metric: (q,) per-question scores}
+    """
+    n, k_max = gains.shape
+    k = np.broadcast_to(np.asarray(k, dtype=np.int64), (n,))
+    if k_max == 0:
+        zeros = np.zeros(n)
+        return {"precision": zeros, "recall": zeros, "mrr": zeros, "ndcg": zeros}
+
+    hits = gains > 0
+    discounts = 1.0 / np.log2(np.arange(2, k_max + 2))
+    rows = np.arange(n)
+    col = np.minimum(k, k_max) - 1
+    valid = col >= 0
+    col = np.maximum(col, 0)
+
+    hit_at = np.cumsum(hits, axis=1)[rows, col]
+    dcg_at = np.cumsum((2 ** gains - 1) * discounts, axis=1)[rows, col]
+    idcg_at = np.cumsum((2 ** ideal - 1) * discounts, axis=1)[rows, col]
+    first_hit = np.where(hits.any(axis=1), hits.argmax(axis=1) + 1, np.inf)
+    n_relevant = np.asarray(n_relevant, dtype=np.float64)
+
+    zeros = np.zeros(n)
+    return {
+        "precision": np.divide(hit_at, k, out=zeros.copy(), where=valid),
+        "recall": np.divide(hit_at, n_relevant, out=zeros.copy(), where=valid & (n_relevant > 0)),
+        "mrr": np.where(valid & (first_hit <= k), 1.0 / first_hit, 0.0),
+        "ndcg": np.divide(dcg_at, idcg_at, out=zeros.copy(), where=valid & (idcg_at > 0)),
+    }
+
+
+def compute_metrics(gains, ideal, n_relevant, ks=DEFAULT_KS):
+    """
+    Precision@k, recall@k, MRR@k and nDCG@k for every question and k
+
+    Args:
+        gains: (q, k_max) relevance grades of the retrieved ranks
+        ideal: (q, k_max) grades of the ideal ranking
+        n_relevant: (q,) number of relevant chunks per question
+        ks: Cut-offs
+
+    Returns:
+        {metric: {k: (q,) per-question scores}}
+    """
+    metrics = {"precision": {}, "recall": {}, "mrr": {}, "ndcg": {}}
+    for k in ks:
+        for name, values in metrics_at(gains, ideal, n_relevant, k).items():
+            metrics[name][k] = values
+    return metrics
+
+
+def summarize(metrics):
+    """Mean of every metric at every k"""
+    return {name: {k: float(values.mean()) if len(values) else 0.0 for k, values in by_k.items()}
+            for name, by_k in metrics.items()}
+
+
+# ----------------------------------------------------------------------------
+# Retrieval
+# ----------------------------------------------------------------------------
+
+def _cache_path(cache_dir, model_name, texts):
+    digest = hashlib.sha1(model_name.encode("utf-8"))
+    for text in texts:
+        digest.update(b"\0" + text.encode("utf-8"))
+    return os.path.join(cache_dir, f"questions_{digest.hexdigest()[:16]}.npy")
+
+
+def embed_questions(embeddings, texts, model_name="text-embedding-3-large", cache_dir=DEFAULT_CACHE_DIR,
+                    batch_size=1000):
+    """
+    Embed question texts as a float32 array, reusing a cached copy if present
+
+    Args:
+        embeddings: LangChain embeddings object
+        texts: Question texts
+        model_name: Part of the cache key, so models never share a cache
+        cache_dir: Directory for cached arrays (None disables caching)
+        batch_size: Texts per embedding call
+
+    Returns:
+        (len(texts), dim) float32 array
+    """
+    path = _cache_path(cache_dir, model_name, texts) if cache_dir else None
+    if path and os.path.exists(path):
+        return np.load(path)
+
+    from rag_pipeline import embed_array
+    vectors = embed_array(embeddings, texts, batch_size=batch_size)
+
+    if path:
+        from checkpoint import atomic_write
+        os.makedirs(cache_dir, exist_ok=True)
+        atomic_write(path, lambda f: np.save(f, vectors))
+    return vectors
+
+
+def retrieve_results(client, collection_name, query_embeddings, k, batch_size=256, where=None,
+                     include=("distances",)):
+    """
+    Top-k results for many queries, one multi-vector query per batch
+
+    Returns:
+        List of single-query results in ChromaDB's nested-list format
+    """
+    from partitions import search_batch
+
+    results = []
+    for start in range(0, len(query_embeddings), batch_size):
+        results.extend(search_batch(client, collection_name, query_embeddings[start:start + batch_size],
+                                    n_results=k, where=where, include=list(include)))
+    return results
+
+
+def retrieve_batch(client, collection_name, query_embeddings, k, batch_size=256, where=None):
+    """
+    Top-k chunk IDs for many queries, one multi-vector query per batch
+
+    Returns:
+        List of ranked ID lists, one per query
+    """
+    results = retrieve_results(client, collection_name, query_embeddings, k, batch_size, where)
+    return [result["ids"][0] for result in results]
+
+
+def evaluate_question_set(questions, client, collection_name, embeddings, ks=DEFAULT_KS,
+                          model_name="text-embedding-3-large", cache_dir=DEFAULT_CACHE_DIR,
+                          where=None, verbose=True):
+    """
+    Retrieve for every question and score the results
+
+    Args:
+        questions: Output of load_question_set
+        client: ChromaDB client
+        collection_name: Collection to evaluate
+        embeddings: Embeddings used for the questions
+        ks: Cut-offs
+        model_name: Embedding model name (cache key)
+        cache_dir: Question embedding cache (None disables)
+        where: Optional metadata filter
+
+    Returns:
+        Dict with the mean metrics, per-question metrics and timings
+    """
+    k_max = max(ks)
+    timings = {}
+
+    start = time.perf_counter()
+    vectors = embed_questions(embeddings, [q["question"] for q in questions], model_name, cache_dir)
+    timings["embed_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    retrieved = retrieve_batch(client, collection_name, vectors, k_max, where=where)
+    timings["retrieve_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    gains, ideal, n_relevant = gain_matrix(retrieved, [q["relevance"] for q in questions])
+    per_question = compute_metrics(gains, ideal, n_relevant, ks)
+    timings["score_s"] = time.perf_counter() - start
+
+    summary = summarize(per_question)
+    if verbose:
+        print_summary(summary, len(questions), timings)
+    return {"summary": summary, "per_question": per_question, "retrieved": retrieved, "timings": timings}
+
+
+def print_summary(summary, n_questions, timings=None):
+    ks = sorted(next(iter(summary.values())).keys())
+    print(f"\n📊 Retrieval metrics over {n_questions:,} questions")
+    print(f"\n{'Metric':<10}" + "".join(f"{'@' + str(k):>9}" for k in ks))
+    print("─"*(10 + 9 * len(ks)))
+    for name, label in (("precision", "Precision"), ("recall", "Recall"), ("mrr", "MRR"), ("ndcg", "nDCG")):
+        print(f"{label:<10}" + "".join(f"{summary[name][k]:>9.3f}" for k in ks))
+    if timings:
+        print(f"\n⏱️  Embed {timings['embed_s']:.2f}s | Retrieve {timings['retrieve_s']:.2f}s | "
+              f"Score {timings['score_s'] * 1000:.1f} ms")
+
+
+def compare_adaptive(questions, client, collection_name, embeddings, fixed_ks=(3, 5, 10), max_k=10,
+                     fetch_k=20, min_similarity=0.0, gap_ratio=0.3, token_budget=None,
+                     model_name="text-embedding-3-large", cache_dir=DEFAULT_CACHE_DIR, where=None,
+                     verbose=True):
+    """
+    Adaptive k vs fixed k: quality, prompt tokens and retrieval latency
+
+    Each fixed k retrieves exactly k chunks; adaptive retrieves a pool of
+    fetch_k and keeps a per-question k (see retrieval_modes.choose_k).
+    Quality is scored at the k actually passed on, so precision rewards
+    dropping weak chunks and recall penalises cutting relevant ones.
+
+    Returns:
+        Dict with one row per mode and the chosen-k statistics
+    """
+    from retrieval_modes import CHARS_PER_TOKEN, AdaptiveKStats, adaptive_cut, collection_space
+
+    vectors = embed_questions(embeddings, [q["question"] for q in questions], model_name, cache_dir)
+    relevance = [q["relevance"] for q in questions]
+    n = max(len(questions), 1)
+
+    def row(mode, results, ks, seconds):
+        retrieved = [r["ids"][0] for r in results]
+        gains, ideal, n_relevant = gain_matrix(retrieved, relevance)
+        metrics = metrics_at(gains, ideal, n_relevant, ks)
+        tokens = [sum(len(text or "") for text in r["documents"][0]) / CHARS_PER_TOKEN for r in results]
+        return {
+            "mode": mode,
+            "mean_k": float(np.mean(ks)),
+            **{name: float(values.mean()) for name, values in metrics.items()},
+            "prompt_tokens": float(np.mean(tokens)),
+            "ms_per_question": seconds * 1000 / n,
+        }
+
+    include = ("documents", "distances")
+    rows = []
+    for k in fixed_ks:
+        start = time.perf_counter()
+        results = retrieve_results(client, collection_name, vectors, k, where=where, include=include)
+        rows.append(row(f"fixed k={k}", results, k, time.perf_counter() - start))
+
+    stats = AdaptiveKStats()
+    start = time.perf_counter()
+    pools = retrieve_results(client, collection_name, vectors, max(max_k, fetch_k), where=where, include=include)
+    results = adaptive_cut(pools, collection_space(client, collection_name), max_k=max_k,
+                           min_similarity=min_similarity, gap_ratio=gap_ratio,
+                           token_budget=token_budget, stats=stats)
+    seconds = time.perf_counter() - start
+    rows.append(row(f"adaptive ≤{max_k}", results, [r["chosen_k"] for r in results], seconds))
+
+    comparison = {"rows": rows, "adaptive_k": stats.snapshot()}
+    if verbose:
+        print_comparison(comparison, len(questions))
+    return comparison
+
+
+def print_comparison(comparison, n_questions):
+    print(f"\n📊 Fixed vs adaptive k over {n_questions:,} questions")
+    print(f"\n{'Mode':<14} {'Mean k':>7} {'Precision':>10} {'Recall':>7} {'MRR':>6} {'nDCG':>6} "
+          f"{'Prompt tok':>11} {'ms/q':>7}")
+    print("─"*74)
+    for r in comparison["rows"]:
+        print(f"{r['mode']:<14} {r['mean_k']:>7.2f} {r['precision']:>10.3f} {r['recall']:>7.3f} "
+              f"{r['mrr']:>6.3f} {r['ndcg']:>6.3f} {r['prompt_tokens']:>11.0f} {r['ms_per_question']:>7.2f}")
+    stats = comparison["adaptive_k"]
+    if stats.get("queries"):
+        histogram = ", ".join(f"{k}: {c}" for k, c in stats["k_histogram"].items())
+        reasons = ", ".join(f"{name} {count}" for name, count in stats["stop_reasons"].items())
+        print(f"\n🎚️  Chosen k: p50 {stats['p50_k']} | p90 {stats['p90_k']} | histogram {{{histogram}}}")
+        print(f"   Stopped by: {reasons}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precision/recall/MRR/nDCG over a labeled question set")
+    parser.add_argument("questions", help="JSONL question set")
+    parser.add_argument("--collection", default="healthcare_ai_500_large")
+    parser.add_argument("--k", type=int, nargs="+", default=list(DEFAULT_KS))
+    parser.add_argument("--provider", choices=["openai", "hashing"],
+                        help="Embedding provider (default: EMBEDDING_PROVIDER, else openai)")
+    parser.add_argument("--model", help="OpenAI embedding model (default: text-embedding-3-large)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Compare adaptive k (up to max --k) with each fixed --k")
+    parser.add_argument("--fetch-k", type=int, default=20, help="Adaptive candidate pool size")
+    parser.add_argument("--min-similarity", type=float, default=0.0)
+    parser.add_argument("--gap-ratio", type=float, default=0.3)
+    parser.add_argument("--token-budget", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    import chromadb
+    from dotenv import load_dotenv
+    from embedding_providers import embedding_model_name, get_embeddings
+
+    load_dotenv()
+    questions = load_question_set(args.questions)
+    print("="*70)
+    print(" RETRIEVAL METRICS EVALUATION")
+    print("="*70)
+    print(f"   Questions: {len(questions):,} | Collection: {args.collection}")
+
+    embeddings = get_embeddings(args.provider, model=args.model)
+    model_name = embedding_model_name(embeddings)
+    client = chromadb.PersistentClient(path="./chroma_db")
+    cache_dir = None if args.no_cache else args.cache_dir
+    if args.adaptive:
+        return compare_adaptive(questions, client, args.collection, embeddings, fixed_ks=args.k,
+                                max_k=max(args.k), fetch_k=args.fetch_k,
+                                min_similarity=args.min_similarity, gap_ratio=args.gap_ratio,
+                                token_budget=args.token_budget, model_name=model_name,
+                                cache_dir=cache_dir)
+    return evaluate_question_set(questions, client, args.collection, embeddings, args.k,
+                                 model_name=model_name,
+                                 cache_dir=cache_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Micro-Batching - Healthcare AI RAG System
+Coalesce concurrent queries into one embedding call and one multi-vector search
+
+Under concurrent load every request would otherwise make its own
+embed_query round trip and its own single-vector collection.query. The
+MicroBatcher queues requests, waits up to `max_wait_ms` (or until
+`max_batch` requests are waiting), embeds all of them with a single
+embed_documents call, runs one multi-vector search per filter group and
+hands each caller its own result.
+
+Usage:
+    batcher = MicroBatcher(embeddings, client, "healthcare_ai_500_large",
+                           max_batch=16, max_wait_ms=5)
+    results = batcher.search("How are payers using AI?", n_results=5)
+    print(batcher.metrics.snapshot())
+"""
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from partitions import search_batch
+
+
+class _Request:
+    __slots__ = ("text", "n_results", "where", "enqueued", "done", "result", "error")
+
+    def __init__(self, text, n_results, where):
+        self.text = text
+        self.n_results = n_results
+        self.where = where
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchMetrics:
+    """Batch fill and queueing delay added by the batcher"""
+
+    def __init__(self, max_batch, window=4096):
+        self.max_batch = max_batch
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.sizes = deque(maxlen=window)
+        self.queue_delays = deque(maxlen=window)
+
+    def record(self, batch, dispatched):
+        with self.lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.sizes.append(len(batch))
+            self.queue_delays.extend(dispatched - r.enqueued for r in batch)
+
+    def snapshot(self):
+        with self.lock:
+            sizes = sorted(self.sizes)
+            delays = sorted(self.queue_delays)
+
+        def pick(values, q):
+            return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+        mean_size = sum(sizes) / len(sizes) if sizes else 0.0
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "mean_batch_size": round(mean_size, 2),
+            "batch_fill": round(mean_size / self.max_batch, 3),
+            "queue_delay_p50_ms": round(pick(delays, 0.50) * 1000, 2),
+            "queue_delay_p99_ms": round(pick(delays, 0.99) * 1000, 2),
+        }
+
+
+class MicroBatcher:
+    """
+    Collects concurrent search requests into batches
+
+    Args:
+        embeddings: LangChain embeddings (embed_documents is used for the batch)
+        client: ChromaDB client
+        collection_name: Collection to search (partitions are routed as usual)
+        max_batch: Dispatch as soon as this many requests are waiting
+        max_wait_ms: Longest a request waits for others to join its batch
+        workers: Batches that may be in flight at once
+    """
+
+    def __init__(self, embeddings, client, collection_name, max_batch=16, max_wait_ms=5.0, workers=2):
+        self.embeddings = embeddings
+        self.client = client
+        self.collection_name = collection_name
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.metrics = BatchMetrics(max_batch)
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()  # no request is queued behind the shutdown sentinels
+        self._threads = [
+            threading.Thread(target=self._run, daemon=True, name=f"micro-batch-{i}")
+            for i in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def search(self, query_text, n_results=5, where=None, timeout=None):
+        """
+        Queue a query and block until its batch has been searched
+
+        Args:
+            query_text: Question text
+            n_results: Number of results
+            where: Optional metadata filter
+            timeout: Seconds to wait before raising TimeoutError
+
+        Returns:
+            Single-query results in ChromaDB's nested-list format
+
+        Raises:
+            RuntimeError: If the batcher is closed (or closes before serving it)
+        """
+        request = _Request(query_text, n_results, where)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError(f"Query not served within {timeout}s")
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def close(self):
+        """Stop the dispatcher threads after the queued requests are served"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for _ in self._threads:
+                self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        # Anything still queued would wait forever: fail it
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request.error = RuntimeError("MicroBatcher is closed")
+                request.done.set()
+
+    def _collect(self):
+        """Block for the first request, then gather more until full or the window closes"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first.enqueued + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self.metrics.record(batch, time.perf_counter())
+            try:
+                self._serve(batch)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            finally:
+                for request in batch:
+                    request.done.set()
+
+    def _serve(self, batch):
+        vectors = np.asarray(self.embeddings.embed_documents([r.text for r in batch]), dtype=np.float32)
+
+        # One multi-vector query per distinct filter; k is the largest asked for
+        groups = {}
+        for request, vector in zip(batch, vectors):
+            groups.setdefault(json.dumps(request.where, sort_keys=True), []).append((request, vector))
+
+        for members in groups.values():
+            n_results = max(r.n_results for r, _ in members)
+            results = search_batch(
+                self.client,
+                self.collection_name,
+                [vector for _, vector in members],
+                n_results=n_results,
+                where=members[0][0].where
+            )
+            for (request, _), result in zip(members, results):
+                request.result = {key: [values[0][:request.n_results]] for key, values in result.items()}
@@ -0,0 +1,240 @@
+"""
+Multi-Query Retrieval - Healthcare AI RAG System
+Search several phrasings of a question at once and fuse the rankings
+
+A vague question ("What are the main challenges for health systems in
+2026?") retrieves whatever matches its exact wording and misses chunks
+that say "workforce shortages" or "cybersecurity threats". Multi-query
+retrieval searches a few variants of the question instead:
+
+1. expand: the question itself plus deterministic variants (its keywords,
+   keywords with domain synonyms swapped in, keywords with every synonym
+   added), or rewrites from a chat model (one extra LLM round trip;
+   falls back to the templates if it fails)
+2. embed every variant of every question in ONE embedding call
+3. search all variant vectors in one multi-vector query per collection
+   (partitions.search_batch), fetch_k candidates each
+4. fuse the rankings with reciprocal rank fusion: a chunk scores
+   sum(1 / (rrf_k + rank)) over the variants that found it, so chunks
+   several phrasings agree on rise to the top
+
+Embedding dominates query latency for a remote model, and steps 2-3 cost
+one round trip and one search call whatever the number of variants, so
+wall-clock latency stays close to a single search.
+
+Usage:
+    python rag_cli.py ask "What are the main challenges for health systems in 2026?" --search-type multi_query
+    python benchmarks.py multi-query --variants 4     # recall and latency vs single search
+
+    from multi_query import multi_query_search
+    results = multi_query_search(client, "healthcare_ai_500_large", embeddings, [question], k=5)
+"""
+
+import re
+
+import numpy as np
+
+from partitions import search_batch
+
+
+DEFAULT_VARIANTS = 4
+DEFAULT_RRF_K = 60
+
+STOPWORDS = {
+    "a", "about", "an", "and", "are", "as", "at", "be", "by", "can", "could", "did", "do", "does",
+    "for", "from", "has", "have", "how", "in", "into", "is", "it", "its", "me", "of", "on", "or",
+    "should", "tell", "that", "the", "their", "there", "these", "they", "this", "to", "was", "we",
+    "were", "what", "when", "where", "which", "who", "why", "will", "with", "would", "you", "your",
+}
+
+# Terms used interchangeably in healthcare AI sources; the first synonym
+# is the one swapped in, all of them are added to the expanded variant
+DOMAIN_SYNONYMS = {
+    "health systems": ["hospitals", "providers"],
+    "hospitals": ["health systems", "providers"],
+    "providers": ["health systems", "clinicians"],
+    "payers": ["insurers", "health plans"],
+    "insurers": ["payers", "health plans"],
+    "health plans": ["payers", "insurers"],
+    "ai": ["artificial intelligence", "machine learning"],
+    "artificial intelligence": ["ai", "machine learning"],
+    "challenges": ["concerns", "pressures", "risks"],
+    "problems": ["challenges", "concerns", "risks"],
+    "risks": ["concerns", "threats"],
+    "staff": ["workforce", "clinicians"],
+    "workforce": ["staff", "shortages"],
+    "costs": ["spending", "margins"],
+    "rules": ["regulation", "guidance"],
+    "regulation": ["rules", "oversight"],
+    "prior authorization": ["utilization management", "coverage decisions"],
+    "utilization management": ["prior authorization", "coverage review"],
+    "chatgpt": ["large language models", "generative ai"],
+    "generative ai": ["large language models", "chatgpt"],
+}
+
+REWRITE_PROMPT = """Rewrite the question below as {n} different search queries for a healthcare AI knowledge base.
+Use different wording and synonyms, and name the specific topics the question implies.
+Return one query per line, without numbering.
+
+Question: {question}"""
+
+WORD_RE = re.compile(r"[a-z0-9][a-z0-9'\-]*")
+
+
+def keywords(question):
+    """The question's content words, lower-cased, in order"""
+    words = WORD_RE.findall(question.lower())
+    return " ".join(w for w in (w.removesuffix("'s") for w in words) if w not in STOPWORDS)
+
+
+def _synonym_pattern(synonyms):
+    terms = sorted(synonyms, key=len, reverse=True)  # longest first: "health systems" before "health"
+    return re.compile(r"\b(" + "|".join(map(re.escape, terms)) + r")\b")
+
+
+def template_variants(question, n_variants=DEFAULT_VARIANTS, synonyms=None):
+    """
+    Deterministic variants of a question
+
+    Args:
+        question: Question text
+        n_variants: Variants to return, the question itself included
+        synonyms: Term -> synonyms map (default: DOMAIN_SYNONYMS)
+
+    Returns:
+        Up to n_variants distinct strings, the question first
+    """
+    synonyms = DOMAIN_SYNONYMS if synonyms is None else synonyms
+    terms = keywords(question)
+    candidates = [question, terms]
+    if synonyms and terms:
+        pattern = _synonym_pattern(synonyms)
+        matched = pattern.findall(terms)
+        if matched:
+            candidates.append(pattern.sub(lambda m: synonyms[m.group(1)][0], terms))
+            added = [s for term in dict.fromkeys(matched) for s in synonyms[term]]
+            candidates.append(" ".join([terms, *dict.fromkeys(added)]))
+
+    variants, seen = [], set()
+    for candidate in candidates:
+        key = candidate.strip().lower()
+        if key and key not in seen:
+            seen.add(key)
+            variants.append(candidate.strip())
+    return variants[:max(n_variants, 1)]
+
+
+def _parse_rewrites(text):
+    lines = (re.sub(r"^\s*(?:\d+[.)]|[-*•])\s*", "", line).strip().strip('"') for line in text.splitlines())
+    return [line for line in lines if line]
+
+
+def expand_queries(questions, n_variants=DEFAULT_VARIANTS, llm=None, synonyms=None):
+    """
+    Variants of every question, the question itself first
+
+    With an llm, the other variants are its rewrites (all questions in
+    one concurrent batch); a question whose rewrite fails gets the
+    template variants instead.
+
+    Args:
+        questions: Question strings
+        n_variants: Variants per question, the question itself included
+        llm: Optional chat model for rewrites
+        synonyms: Term -> synonyms map for the templates
+
+    Returns:
+        One list of variants per question
+    """
+    questions = list(questions)
+    if llm is None or n_variants <= 1:
+        return [template_variants(q, n_variants, synonyms) for q in questions]
+
+    prompts = [REWRITE_PROMPT.format(n=n_variants - 1, question=q) for q in questions]
+    responses = llm.batch(prompts, return_exceptions=True)
+    expanded = []
+    for question, response in zip(questions, responses):
+        rewrites = [] if isinstance(response, Exception) else _parse_rewrites(getattr(response, "content", response))
+        if not rewrites:
+            expanded.append(template_variants(question, n_variants, synonyms))
+            continue
+        variants = [question] + [r for r in dict.fromkeys(rewrites) if r.lower() != question.lower()]
+        expanded.append(variants[:n_variants])
+    return expanded
+
+
+def reciprocal_rank_fusion(results, k=5, rrf_k=DEFAULT_RRF_K):
+    """
+    Fuse ranked result lists with reciprocal rank fusion
+
+    Each chunk scores sum(1 / (rrf_k + rank)) over the lists it appears
+    in (rank from 1). Ties keep the order of first appearance. Documents
+    and metadata come from the chunk's first occurrence; its distance is
+    the best one seen.
+
+    Args:
+        results: Single-query results in ChromaDB's nested-list format
+        k: Number of fused results
+        rrf_k: Damping constant (60 in the original paper)
+
+    Returns:
+        Single-query result in ChromaDB's nested-list format, plus
+        "rrf_scores"
+    """
+    scores, first, best_distance = {}, {}, {}
+    for r, result in enumerate(results):
+        ids = result["ids"][0]
+        distances = (result.get("distances") or [[None] * len(ids)])[0]
+        for rank, (id_, distance) in enumerate(zip(ids, distances), 1):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (rrf_k + rank)
+            first.setdefault(id_, (r, rank - 1))
+            if distance is not None and (best_distance.get(id_) is None or distance < best_distance[id_]):
+                best_distance[id_] = distance
+
+    order = sorted(scores, key=lambda id_: (-scores[id_], first[id_]))[:k]
+    keys = [key for key in (results[0] if results else {}) if key not in ("ids", "distances")]
+    fused = {"ids": [order]}
+    for key in keys:
+        fused[key] = [[results[first[id_][0]][key][0][first[id_][1]] for id_ in order]]
+    if results and "distances" in results[0]:
+        fused["distances"] = [[best_distance.get(id_) for id_ in order]]
+    fused["rrf_scores"] = [[scores[id_] for id_ in order]]
+    return fused
+
+
+def multi_query_search(client, collection_name, embeddings, questions, k=5, fetch_k=20, where=None,
+                       n_variants=DEFAULT_VARIANTS, llm=None, rrf_k=DEFAULT_RRF_K, synonyms=None):
+    """
+    Multi-query retrieval for many questions: one embedding call, one search call
+
+    Args:
+        client: ChromaDB client
+        collection_name: Collection name or alias (partitions are searched too)
+        embeddings: LangChain embeddings object
+        questions: Question strings
+        k: Fused results per question
+        fetch_k: Candidates retrieved per variant
+        where: Optional metadata filter pushed into every search
+        n_variants: Variants per question, the question itself included
+        llm: Optional chat model for rewrites (see expand_queries)
+        rrf_k: Reciprocal rank fusion constant
+        synonyms: Term -> synonyms map for the templates
+
+    Returns:
+        One fused result per question (see reciprocal_rank_fusion), each
+        with the "variants" that were searched
+    """
+    expanded = expand_queries(questions, n_variants, llm, synonyms)
+    flat = [variant for variants in expanded for variant in variants]
+    if not flat:
+        return []
+    vectors = np.asarray(embeddings.embed_documents(flat), dtype=np.float32)
+    pools = search_batch(client, collection_name, vectors, n_results=max(k, fetch_k), where=where)
+
+    fused, start = [], 0
+    for variants in expanded:
+        result = reciprocal_rank_fusion(pools[start:start + len(variants)], k=k, rrf_k=rrf_k)
+        result["variants"] = variants
+        fused.append(result)
+        start += len(variants)
+    return fused
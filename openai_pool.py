@@ -0,0 +1,485 @@
+"""
+OpenAI Pool - Healthcare AI RAG System
+One process-wide client pool and rate limiter for all OpenAI traffic
+
+Embeddings (ingest, queries) and chat calls (Q&A, evaluation, the query
+server) used to create their own clients, each retrying 429s on its own.
+Now every OpenAI object comes from get_pool(), and all of them share:
+
+- one httpx connection pool (sync, and async per event loop)
+- token buckets for requests per minute and tokens per minute, refilled
+  continuously (bursts capped at 10 s of quota, since the API enforces
+  per-minute limits over shorter periods); a request waits until both
+  have room. Tokens are estimated from the request body and corrected
+  from the response's usage once it arrives
+- priority lanes: waiters are served strictly in lane order, then first
+  come first served, so an interactive query overtakes queued bulk
+  ingestion instead of waiting behind it
+- one back-off: a 429 pauses every lane for the server's Retry-After
+  and the request is retried (up to max_429_retries)
+- queueing metrics per lane: requests, tokens, waits (p50/p95/max),
+  queue depth and 429s
+
+Embedding and bulk Q&A code runs inside `with lane("bulk"):`; everything
+else is "interactive". The lane is a context variable, so it follows
+asyncio tasks and LangChain's executors.
+
+Configuration (.env):
+    OPENAI_RPM=500              # requests per minute (default 500)
+    OPENAI_TPM=1000000          # tokens per minute (default 1,000,000)
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1   # e.g. fake_openai.py
+
+Usage:
+    from openai_pool import get_pool, lane
+    llm = get_pool().chat_model("gpt-4o-mini", temperature=0)
+    embeddings = get_pool().embeddings("text-embedding-3-large")
+    with lane("bulk"):
+        embeddings.embed_documents(texts)
+    get_pool().print_metrics()
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+import weakref
+from collections import deque
+
+import httpx
+import numpy as np
+
+
+LANES = ("interactive", "bulk")
+DEFAULT_RPM = 500
+DEFAULT_TPM = 1_000_000
+# The API enforces per-minute limits over shorter periods, so bursts are capped
+DEFAULT_BURST_SECONDS = 10.0
+CHARS_PER_TOKEN = 4
+
+_lane = contextvars.ContextVar("openai_lane", default="interactive")
+
+
+@contextlib.contextmanager
+def lane(name):
+    """Run the enclosed OpenAI calls in a priority lane ("interactive" or "bulk")"""
+    if name not in LANES:
+        raise ValueError(f"Unknown lane {name!r}; choose from {', '.join(LANES)}")
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane():
+    return _lane.get()
+
+
+class TokenBucket:
+    """
+    Continuously refilled bucket: `per_minute` units per minute, bursting up to
+    `burst_seconds` worth
+
+    A request larger than the capacity is let through once the bucket is
+    full and leaves it in debt, so oversize requests cannot wait forever.
+    """
+
+    def __init__(self, per_minute, burst_seconds=DEFAULT_BURST_SECONDS, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = max(self.rate * burst_seconds, 1.0)
+        self.level = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount can be taken"""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(missing, 0.0) / self.rate
+
+    def take(self, amount):
+        self.level -= amount
+
+    def adjust(self, amount):
+        """Charge (or refund) the difference between estimated and actual use"""
+        self.level = min(self.capacity, self.level - amount)
+
+
+class LaneStats:
+    """Queueing metrics of one lane"""
+
+    def __init__(self, window=2048):
+        self.requests = 0
+        self.tokens = 0
+        self.rate_limited = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.waits = deque(maxlen=window)
+
+    def snapshot(self):
+        waits = np.array(self.waits) * 1000 if self.waits else np.zeros(1)
+        return {
+            "requests": self.requests,
+            "tokens": self.tokens,
+            "rate_limited": self.rate_limited,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "wait_p50_ms": float(np.percentile(waits, 50)),
+            "wait_p95_ms": float(np.percentile(waits, 95)),
+            "wait_max_ms": float(waits.max()),
+        }
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute buckets with priority lanes
+
+    Args:
+        rpm: Requests per minute
+        tpm: Tokens per minute
+        burst_seconds: Largest burst, in seconds of quota
+        clock: Monotonic time source
+    """
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, burst_seconds=DEFAULT_BURST_SECONDS,
+                 clock=time.monotonic):
+        self.clock = clock
+        self.requests = TokenBucket(rpm, burst_seconds, clock)
+        self.tokens = TokenBucket(tpm, burst_seconds, clock)
+        self.paused_until = 0.0
+        self.stats = {name: LaneStats() for name in LANES}
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+
+    def _enqueue(self, lane_name):
+        ticket = (LANES.index(lane_name), next(self._seq))
+        heapq.heappush(self._queue, ticket)
+        stats = self.stats[lane_name]
+        stats.queued += 1
+        stats.max_queued = max(stats.max_queued, stats.queued)
+        return ticket
+
+    def _dequeue(self, ticket, lane_name):
+        if ticket in self._queue:
+            self._queue.remove(ticket)
+            heapq.heapify(self._queue)
+        self.stats[lane_name].queued -= 1
+        self._cond.notify_all()
+
+    def _try_take(self, ticket, tokens, lane_name):
+        """Seconds to wait before the ticket may go (0 when taken), None if not at the head"""
+        if self._queue[0] != ticket:
+            return None
+        now = self.clock()
+        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now),
+                   self.paused_until - now)
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        stats = self.stats[lane_name]
+        stats.requests += 1
+        stats.tokens += tokens
+        return 0.0
+
+    def acquire(self, tokens, lane_name=None):
+        """
+        Block until a request of `tokens` estimated tokens may be sent
+
+        Returns:
+            Seconds waited
+        """
+        lane_name = lane_name or current_lane()
+        start = self.clock()
+        with self._cond:
+            ticket = self._enqueue(lane_name)
+            try:
+                while True:
+                    wait = self._try_take(ticket, tokens, lane_name)
+                    if wait == 0:
+                        break
+                    self._cond.wait(wait)
+            finally:
+                self._dequeue(ticket, lane_name)
+        waited = self.clock() - start
+        self.stats[lane_name].waits.append(waited)
+        return waited
+
+    async def acquire_async(self, tokens, lane_name=None, poll=0.05):
+        """acquire() for the event loop (waits with asyncio.sleep)"""
+        lane_name = lane_name or current_lane()
+        start = self.clock()
+        with self._cond:
+            ticket = self._enqueue(lane_name)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_take(ticket, tokens, lane_name)
+                if wait == 0:
+                    break
+                await asyncio.sleep(min(wait, poll) if wait is not None else poll)
+        finally:
+            with self._cond:
+                self._dequeue(ticket, lane_name)
+        waited = self.clock() - start
+        self.stats[lane_name].waits.append(waited)
+        return waited
+
+    def settle(self, estimated, actual, lane_name=None):
+        """Correct the token bucket once a response reports its usage"""
+        with self._cond:
+            self.tokens.adjust(actual - estimated)
+            self.stats[lane_name or current_lane()].tokens += actual - estimated
+
+    def pause(self, seconds, lane_name=None):
+        """Hold every lane back after a 429"""
+        with self._cond:
+            self.paused_until = max(self.paused_until, self.clock() + seconds)
+            self.stats[lane_name or current_lane()].rate_limited += 1
+            self._cond.notify_all()
+
+    def metrics(self):
+        with self._cond:
+            return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+
+# ----------------------------------------------------------------------------
+# Transport
+# ----------------------------------------------------------------------------
+
+def estimate_tokens(request):
+    """
+    Tokens an OpenAI request will be charged for, from its JSON body
+
+    Embedding inputs that are token ID lists (as LangChain sends them)
+    count exactly; text counts as one token per four characters. Chat
+    requests add max_tokens, as the API does when it checks the limit.
+    """
+    try:
+        body = json.loads(request.content or b"{}")
+    except (ValueError, httpx.RequestNotRead):
+        return 1
+    count = 0
+    inputs = body.get("input")
+    if inputs is not None:
+        for item in inputs if isinstance(inputs, list) else [inputs]:
+            if isinstance(item, list):
+                count += len(item)
+            elif isinstance(item, str):
+                count += len(item) // CHARS_PER_TOKEN + 1
+            else:
+                count += 1
+    for message in body.get("messages", []):
+        content = message.get("content")
+        text = content if isinstance(content, str) else json.dumps(content)
+        count += len(text) // CHARS_PER_TOKEN + 4
+    count += body.get("max_tokens") or body.get("max_completion_tokens") or 0
+    return max(count, 1)
+
+
+def _used_tokens(response):
+    """total_tokens from a JSON response's usage, if it has one"""
+    try:
+        return json.loads(response.content).get("usage", {}).get("total_tokens")
+    except (ValueError, AttributeError):
+        return None
+
+
+def _retry_after(response, default=1.0):
+    for header in ("retry-after-ms", "retry-after"):
+        value = response.headers.get(header)
+        if value:
+            try:
+                return float(value) / (1000 if header.endswith("ms") else 1)
+            except ValueError:
+                pass
+    return default
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """httpx transport that passes every request through the pool's limiter"""
+
+    def __init__(self, limiter, max_429_retries=5, **transport_kwargs):
+        self.limiter = limiter
+        self.max_429_retries = max_429_retries
+        self.transport = httpx.HTTPTransport(**transport_kwargs)
+
+    def handle_request(self, request):
+        tokens = estimate_tokens(request)
+        for attempt in range(self.max_429_retries + 1):
+            self.limiter.acquire(tokens)
+            response = self.transport.handle_request(request)
+            if response.status_code != 429 or attempt == self.max_429_retries:
+                break
+            response.read()
+            response.close()
+            self.limiter.pause(_retry_after(response))
+        # JSON responses are small and read here for their usage; streams are left alone
+        if response.status_code < 400 and "json" in response.headers.get("content-type", ""):
+            response.read()
+            used = _used_tokens(response)
+            if used is not None:
+                self.limiter.settle(tokens, used)
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    Async counterpart of RateLimitedTransport (same limiter and lanes)
+
+    Async connections belong to the event loop that opened them, and every
+    asyncio.run() (e.g. each ask_many call) starts a new loop. So each loop
+    gets its own connection pool, created on first use and dropped with the
+    loop; the limiter, the only shared state, is loop-independent.
+    """
+
+    def __init__(self, limiter, max_429_retries=5, **transport_kwargs):
+        self.limiter = limiter
+        self.max_429_retries = max_429_retries
+        self.transport_kwargs = transport_kwargs
+        self._transports = weakref.WeakKeyDictionary()  # event loop -> AsyncHTTPTransport
+        self._lock = threading.Lock()
+
+    def _transport(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = self._transports[loop] = httpx.AsyncHTTPTransport(**self.transport_kwargs)
+            return transport
+
+    async def handle_async_request(self, request):
+        tokens = estimate_tokens(request)
+        transport = self._transport()
+        for attempt in range(self.max_429_retries + 1):
+            await self.limiter.acquire_async(tokens)
+            response = await transport.handle_async_request(request)
+            if response.status_code != 429 or attempt == self.max_429_retries:
+                break
+            await response.aread()
+            await response.aclose()
+            self.limiter.pause(_retry_after(response))
+        if response.status_code < 400 and "json" in response.headers.get("content-type", ""):
+            await response.aread()
+            used = _used_tokens(response)
+            if used is not None:
+                self.limiter.settle(tokens, used)
+        return response
+
+    async def aclose(self):
+        # Other loops' connections cannot be awaited from here; they go with their loop
+        with self._lock:
+            transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+# ----------------------------------------------------------------------------
+# Pool
+# ----------------------------------------------------------------------------
+
+class OpenAIPool:
+    """
+    Shared HTTP clients, limiter and LangChain model factories
+
+    Args:
+        rpm, tpm: Rate limits (default: OPENAI_RPM / OPENAI_TPM, else 500 / 1,000,000)
+        base_url: API base URL (default: OPENAI_BASE_URL, else OpenAI's)
+        burst_seconds: Largest burst, in seconds of quota
+        max_connections: Connection pool size
+        max_429_retries: Retries of a rate-limited request, after the pause
+    """
+
+    def __init__(self, rpm=None, tpm=None, base_url=None, burst_seconds=DEFAULT_BURST_SECONDS,
+                 max_connections=32, max_429_retries=5):
+        self.rpm = int(rpm or os.getenv("OPENAI_RPM") or DEFAULT_RPM)
+        self.tpm = int(tpm or os.getenv("OPENAI_TPM") or DEFAULT_TPM)
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+        self.limiter = RateLimiter(self.rpm, self.tpm, burst_seconds)
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        timeout = httpx.Timeout(600.0, connect=10.0)
+        self.http_client = httpx.Client(
+            transport=RateLimitedTransport(self.limiter, max_429_retries, limits=limits),
+            timeout=timeout
+        )
+        self.http_async_client = httpx.AsyncClient(
+            transport=AsyncRateLimitedTransport(self.limiter, max_429_retries, limits=limits),
+            timeout=timeout
+        )
+
+    def _client_kwargs(self):
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY not found in .env file")
+        kwargs = {
+            "openai_api_key": api_key,
+            "http_client": self.http_client,
+            "http_async_client": self.http_async_client,
+        }
+        if self.base_url:
+            kwargs["openai_api_base"] = self.base_url
+        return kwargs
+
+    def chat_model(self, model="gpt-4o-mini", temperature=0, **kwargs):
+        """ChatOpenAI on the shared clients"""
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(model=model, temperature=temperature, **self._client_kwargs(), **kwargs)
+
+    def embeddings(self, model, **kwargs):
+        """
+        OpenAIEmbeddings on the shared clients
+
+        Against another endpoint (base_url) text is sent as is rather than
+        pre-tokenized with tiktoken.
+        """
+        from langchain_openai import OpenAIEmbeddings
+
+        kwargs.setdefault("check_embedding_ctx_length", self.base_url is None)
+        return OpenAIEmbeddings(model=model, **self._client_kwargs(), **kwargs)
+
+    def metrics(self):
+        """Per-lane queueing metrics (see LaneStats.snapshot)"""
+        return self.limiter.metrics()
+
+    def print_metrics(self):
+        print(f"\n📶 OpenAI pool ({self.rpm:,} RPM / {self.tpm:,} TPM)")
+        print(f"   {'Lane':<12} {'Requests':>8} {'Tokens':>10} {'429s':>5} {'Queued':>6} {'Max q':>6} "
+              f"{'Wait p50':>9} {'p95 ms':>7}")
+        for name, m in self.metrics().items():
+            print(f"   {name:<12} {m['requests']:>8,} {m['tokens']:>10,} {m['rate_limited']:>5} "
+                  f"{m['queued']:>6} {m['max_queued']:>6} {m['wait_p50_ms']:>9.1f} {m['wait_p95_ms']:>7.1f}")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The process-wide pool (created on first use from the environment)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = OpenAIPool()
+        return _pool
+
+
+def configure(**kwargs):
+    """Replace the process-wide pool, e.g. configure(rpm=60, base_url=...)"""
+    global _pool
+    with _pool_lock:
+        _pool = OpenAIPool(**kwargs)
+        return _pool
@@ -0,0 +1,284 @@
+"""
+Parent-Child Index - Healthcare AI RAG System
+Retrieve small, return large: search child chunks, answer with their parents
+
+Small chunks match questions precisely, but the answer often needs the
+surrounding paragraph. Each source is cut into large parent spans (no
+overlap, so every character is stored once), and each parent into small
+overlapping child chunks:
+
+- children are embedded and stored in a ChromaDB collection, each with
+  the ID of its parent
+- parents are stored once, as plain text, in a small SQLite store next to
+  the ChromaDB files (they are never embedded)
+
+Each store() builds a new collection version and publishes it behind the
+index name (collection_versions), so queries keep using the previous
+children and parents until the rebuild is complete. Parents are keyed by
+the version they belong to and dropped with it.
+
+A query searches fetch_k children, keeps the best-scoring child per
+parent, and returns the top k distinct parents. Parents carry
+start_index / chunk_index like ordinary chunks, so context_assembly
+merges neighbouring parents as usual.
+
+Usage:
+    index = ParentChildIndex(rag.embeddings, "healthcare_ai_pc")
+    index.store(documents)
+    parents = index.search("How is AI used in utilization management?", k=3)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from collection_versions import new_version, publish, resolve
+from partitions import index_metadata, ingest_stamp, search
+
+
+PARENT_STORE = "parent_store.sqlite3"
+
+
+class ParentStore:
+    """Parent spans keyed by (collection, parent ID), stored once as text"""
+
+    def __init__(self, path="./chroma_db"):
+        os.makedirs(path, exist_ok=True)
+        self.db_path = os.path.join(path, PARENT_STORE)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS parents ("
+                " collection TEXT NOT NULL, parent_id TEXT NOT NULL,"
+                " text TEXT NOT NULL, metadata TEXT NOT NULL,"
+                " PRIMARY KEY (collection, parent_id))"
+            )
+
+    def _conn(self):
+        # sqlite3 connections may not be shared across threads
+        if getattr(self._local, "conn", None) is None:
+            self._local.conn = sqlite3.connect(self.db_path)
+        return self._local.conn
+
+    def replace(self, collection_name, parents):
+        """Replace all parents of a collection"""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM parents WHERE collection = ?", (collection_name,))
+            conn.executemany(
+                "INSERT INTO parents VALUES (?, ?, ?, ?)",
+                [(collection_name, p.metadata["parent_id"], p.page_content, json.dumps(p.metadata))
+                 for p in parents]
+            )
+
+    def get(self, collection_name, parent_ids):
+        """
+        Fetch parents by ID
+
+        Returns:
+            Documents in the order of parent_ids (missing IDs are skipped)
+        """
+        if not parent_ids:
+            return []
+        placeholders = ",".join("?" * len(parent_ids))
+        rows = self._conn().execute(
+            f"SELECT parent_id, text, metadata FROM parents "
+            f"WHERE collection = ? AND parent_id IN ({placeholders})",
+            (collection_name, *parent_ids)
+        ).fetchall()
+        found = {pid: Document(id=pid, page_content=text, metadata=json.loads(metadata))
+                 for pid, text, metadata in rows}
+        return [found[pid] for pid in parent_ids if pid in found]
+
+    def collections(self):
+        """Collections that have parents stored"""
+        return [name for (name,) in self._conn().execute("SELECT DISTINCT collection FROM parents")]
+
+    def drop(self, collection_name):
+        """Delete all parents of a collection"""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM parents WHERE collection = ?", (collection_name,))
+
+    def size(self, collection_name):
+        """(number of parents, total characters) for a collection"""
+        return self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(text)), 0) FROM parents WHERE collection = ?",
+            (collection_name,)
+        ).fetchone()
+
+
+def split_parent_child(documents, parent_size=2000, child_size=300, child_overlap=50):
+    """
+    Cut documents into parents and children
+
+    Args:
+        documents: Source Documents
+        parent_size: Parent span size in characters (parents do not overlap)
+        child_size: Child chunk size in characters
+        child_overlap: Overlap between neighbouring children
+
+    Returns:
+        (parents, children): parents carry parent_id, start_index, end_index
+        and chunk_index; children carry the same plus their parent_id, with
+        offsets relative to the source document
+    """
+    from rag_pipeline import iter_split, make_text_splitter
+
+    parent_splitter = make_text_splitter(parent_size, 0)
+    child_splitter = make_text_splitter(child_size, child_overlap)
+
+    parents = []
+    children = []
+    for doc_index, document in enumerate(documents):
+        child_index = 0
+        for parent in iter_split(parent_splitter, [document]):
+            parent_id = f"p{doc_index}_{parent.metadata['chunk_index']}"
+            parent.metadata["parent_id"] = parent_id
+            parents.append(parent)
+
+            for child in iter_split(child_splitter, [parent]):
+                offset = parent.metadata["start_index"]
+                child.metadata.update({
+                    "parent_id": parent_id,
+                    "start_index": offset + child.metadata["start_index"],
+                    "end_index": offset + child.metadata["end_index"],
+                    "chunk_index": child_index,
+                })
+                child_index += 1
+                children.append(child)
+    return parents, children
+
+
+class ParentChildIndex:
+    """
+    Child chunks in ChromaDB, parent spans in the ParentStore
+
+    Args:
+        embeddings: Embeddings object for children and queries
+        collection_name: Collection for the children
+        path: ChromaDB directory (the parent store lives alongside)
+        parent_size, child_size, child_overlap: See split_parent_child
+    """
+
+    def __init__(self, embeddings, collection_name="healthcare_ai_parent_child", path="./chroma_db",
+                 parent_size=2000, child_size=300, child_overlap=50, client=None):
+        import chromadb
+
+        self.embeddings = embeddings
+        self.collection_name = collection_name
+        self.parent_size = parent_size
+        self.child_size = child_size
+        self.child_overlap = child_overlap
+        self.client = client or chromadb.PersistentClient(path=path)
+        self.parents = ParentStore(path)
+
+    def store(self, documents, batch_size=500):
+        """
+        Split, embed the children and store both levels as a new version
+
+        The index name is an alias: it moves to the new version once all
+        children are stored, and old versions are garbage-collected.
+
+        Returns:
+            (number of parents, number of children)
+        """
+        from rag_pipeline import embed_array
+
+        parents, children = split_parent_child(documents, self.parent_size, self.child_size,
+                                               self.child_overlap)
+        print(f"\n💾 Storing parent-child index: {self.collection_name}")
+        print(f"   Parents: {len(parents)} x ~{self.parent_size} chars | "
+              f"Children: {len(children)} x ~{self.child_size} chars")
+
+        ingest_date = ingest_stamp()
+        for doc in parents + children:
+            index_metadata(doc.metadata, ingest_date)
+
+        try:
+            with new_version(self.client, self.collection_name) as version:
+                collection = self.client.create_collection(
+                    version,
+                    metadata={"parent_child": True, "parent_size": self.parent_size,
+                              "child_size": self.child_size}
+                )
+
+                texts = [child.page_content for child in children]
+                vectors = embed_array(self.embeddings, texts)
+                for start in range(0, len(children), batch_size):
+                    end = start + batch_size
+                    collection.add(
+                        ids=[f"child_{i}" for i in range(start, min(end, len(children)))],
+                        embeddings=vectors[start:end],
+                        documents=texts[start:end],
+                        metadatas=[child.metadata for child in children[start:end]]
+                    )
+                self.parents.replace(version, parents)
+            publish(self.client, self.collection_name, version, len(children))
+        finally:
+            self._drop_orphaned_parents()
+
+        print(f"✅ Stored {len(parents)} parents and {len(children)} children")
+        return len(parents), len(children)
+
+    def _drop_orphaned_parents(self):
+        # Versions dropped by garbage collection or a failed build
+        live = {collection.name for collection in self.client.list_collections()}
+        for name in self.parents.collections():
+            if name not in live:
+                self.parents.drop(name)
+
+    def search(self, query_text, k=5, fetch_k=20, where=None, query_embedding=None):
+        """
+        Return the k best distinct parents for a question
+
+        Args:
+            query_text: Question
+            k: Number of parents to return
+            fetch_k: Children searched; several children of one parent count once
+            where: Optional metadata filter on the children
+            query_embedding: Precomputed query vector (skips embedding)
+
+        Returns:
+            Parent Documents, best first, with distance (of their best
+            child) and matched_children in their metadata
+        """
+        if query_embedding is None:
+            query_embedding = self.embeddings.embed_query(query_text)
+        physical = resolve(self.client, self.collection_name)  # children and parents of one version
+        results = search(self.client, physical, query_embedding,
+                         n_results=max(fetch_k, k), where=where, include=["metadatas", "distances"])
+
+        best = {}
+        for metadata, distance in zip(results["metadatas"][0], results["distances"][0]):
+            parent_id = metadata["parent_id"]
+            if parent_id in best:
+                best[parent_id][1] += 1
+            else:
+                best[parent_id] = [distance, 1]
+        ranked = sorted(best, key=lambda pid: best[pid][0])[:k]
+
+        parents = self.parents.get(physical, ranked)
+        for parent in parents:
+            distance, matched = best[parent.id]
+            parent.metadata["distance"] = distance
+            parent.metadata["matched_children"] = matched
+        return parents
+
+    def as_retriever(self, k=5, fetch_k=20, where=None):
+        return ParentChildRetriever(index=self, k=k, fetch_k=fetch_k, where=where)
+
+
+class ParentChildRetriever(BaseRetriever):
+    """LangChain retriever returning parent spans (for create_rag_chain-style chains)"""
+
+    index: Any
+    k: int = 5
+    fetch_k: int = 20
+    where: Optional[dict] = None
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        return self.index.search(query, k=self.k, fetch_k=self.fetch_k, where=self.where)
@@ -0,0 +1,314 @@
+"""
+Metadata Filters and Partitions - Healthcare AI RAG System
+Push metadata filters into the vector search and route queries to partitions
+
+Every chunk is stored with source, source_domain, title and ingest_date
+metadata, so filters can be handed to ChromaDB as a `where` clause instead
+of post-filtering the top k. Large sources can optionally be split out into
+their own collections; the main collection keeps a routing table in its
+metadata and filtered queries only touch the partitions they need.
+"""
+
+import hashlib
+import heapq
+import itertools
+import json
+import re
+from datetime import date
+from urllib.parse import urlparse
+
+from collection_versions import resolve
+
+
+PARTITION_MAP_KEY = "partitions"
+# Set on collections whose chunk text lives in a chunk store (see chunk_store.py)
+CHUNK_STORE_KEY = "chunk_store"
+
+
+def source_domain(source):
+    """
+    Short domain label for a source URL (e.g. "deloitte.com")
+
+    Args:
+        source: Source URL or free-form source label
+
+    Returns:
+        Domain without "www.", or the source itself if it is not a URL
+    """
+    netloc = urlparse(source).netloc if "://" in source else ""
+    netloc = netloc.lower()
+    if netloc.startswith("www."):
+        netloc = netloc[4:]
+    return netloc or source
+
+
+def ingest_stamp(day=None):
+    """Ingest date as an integer YYYYMMDD, so it can be range-filtered"""
+    day = day or date.today()
+    return int(day.strftime("%Y%m%d"))
+
+
+def index_metadata(metadata, ingest_date):
+    """
+    Fill in the filterable metadata fields for one chunk
+
+    Args:
+        metadata: Chunk metadata dict (updated in place)
+        ingest_date: Integer YYYYMMDD stamp
+
+    Returns:
+        The same metadata dict
+    """
+    source = metadata.get("source") or "unknown"
+    metadata["source"] = source
+    metadata["source_domain"] = source_domain(source)
+    metadata["title"] = metadata.get("title") or ""
+    metadata["ingest_date"] = ingest_date
+    return metadata
+
+
+def build_where(source=None, domain=None, title=None, ingested_after=None, ingested_before=None):
+    """
+    Build a ChromaDB `where` clause from simple filters
+
+    Args:
+        source: Source URL or list of URLs
+        domain: Source domain or list of domains (e.g. "norc.org")
+        title: Exact document title
+        ingested_after: Integer YYYYMMDD, inclusive lower bound
+        ingested_before: Integer YYYYMMDD, inclusive upper bound
+
+    Returns:
+        Where dict, or None when no filter is given
+    """
+    clauses = []
+    for field, value in (("source", source), ("source_domain", domain)):
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            clauses.append({field: {"$in": list(value)}})
+        else:
+            clauses.append({field: {"$eq": value}})
+    if title is not None:
+        clauses.append({"title": {"$eq": title}})
+    if ingested_after is not None:
+        clauses.append({"ingest_date": {"$gte": ingested_after}})
+    if ingested_before is not None:
+        clauses.append({"ingest_date": {"$lte": ingested_before}})
+
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def partition_name(collection_name, source):
+    """ChromaDB-safe collection name for a source partition"""
+    slug = re.sub(r"[^a-zA-Z0-9]+", "-", source_domain(source)).strip("-")[:40] or "source"
+    digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:8]
+    return f"{collection_name}__{slug}-{digest}"
+
+
+def load_partition_map(collection):
+    """Read the source -> partition collection map stored on the main collection"""
+    raw = (collection.metadata or {}).get(PARTITION_MAP_KEY)
+    return json.loads(raw) if raw else {}
+
+
+def chunk_id(source, content_hash, index):
+    """
+    Stable ID of one chunk of one version of a source
+
+    Both the source and its content hash are part of the ID, so two sources
+    with the same content never share rows.
+    """
+    prefix = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+    return f"{prefix}_{content_hash[:12]}_{index}"
+
+
+def chunk_ids(source, content_hash, count):
+    """IDs of a source version's chunks 0..count-1 (see chunk_id)"""
+    return [chunk_id(source, content_hash, i) for i in range(count)]
+
+
+def write_target(client, collection_name, source=None, metadata=None):
+    """
+    Collection an incremental write of a source's chunks goes to
+
+    Resolves the alias, creates the collection if missing and follows the
+    partition map, so updates land where route() will search for them.
+
+    Args:
+        client: ChromaDB client
+        collection_name: Collection name or alias
+        source: Source being written (None: the main collection)
+        metadata: Collection metadata if it has to be created
+
+    Returns:
+        The main collection, or the source's partition
+
+    Raises:
+        ValueError: for a compact collection, whose chunk text lives in a
+            chunk store that only a rebuild (store_compact) writes
+    """
+    name = resolve(client, collection_name)
+    main = client.get_or_create_collection(name=name, metadata=metadata)
+    if (main.metadata or {}).get(CHUNK_STORE_KEY):
+        raise ValueError(f"{name} is a compact collection; rebuild it with store_compact")
+    partition = load_partition_map(main).get(source) if source is not None else None
+    return client.get_collection(partition) if partition else main
+
+
+def _filter_values(where, field):
+    """Values a where clause pins `field` to, or None if it does not pin it"""
+    if not where:
+        return None
+    if "$and" in where:
+        for clause in where["$and"]:
+            values = _filter_values(clause, field)
+            if values is not None:
+                return values
+        return None
+    if field not in where:
+        return None
+    condition = where[field]
+    if not isinstance(condition, dict):
+        return {condition}
+    if "$eq" in condition:
+        return {condition["$eq"]}
+    if "$in" in condition:
+        return set(condition["$in"])
+    return None
+
+
+def route(collection_name, partition_map, where=None):
+    """
+    Pick the collections a query has to search
+
+    Args:
+        collection_name: Main collection name
+        partition_map: source -> partition collection name
+        where: Optional where clause
+
+    Returns:
+        List of collection names
+    """
+    if not partition_map:
+        return [collection_name]
+
+    sources = _filter_values(where, "source")
+    if sources is None:
+        domains = _filter_values(where, "source_domain")
+        if domains is not None:
+            partitioned = {s for s in partition_map if source_domain(s) in domains}
+            names = sorted({partition_map[s] for s in partitioned})
+            # Unpartitioned sources from these domains may still live in the main collection
+            return names + [collection_name]
+        return [collection_name] + sorted(set(partition_map.values()))
+
+    names = sorted({partition_map[s] for s in sources if s in partition_map})
+    if any(s not in partition_map for s in sources):
+        names.append(collection_name)
+    return names
+
+
+def merge_results(results, n_results):
+    """
+    Merge several single-query ChromaDB results into one top-n by distance
+
+    Each input is already sorted by distance, so a heap merge is enough.
+
+    Args:
+        results: List of collection.query results (one query each)
+        n_results: Number of results to keep
+
+    Returns:
+        Merged result in ChromaDB's nested-list format
+    """
+    if len(results) == 1:
+        return results[0]
+
+    keys = [key for key in ("ids", "documents", "metadatas", "distances", "embeddings")
+            if all(r.get(key) is not None for r in results)]
+
+    streams = [
+        [(distance, i, j) for j, distance in enumerate(r["distances"][0])]
+        for i, r in enumerate(results)
+    ]
+    picked = list(itertools.islice(heapq.merge(*streams), n_results))
+
+    return {key: [[results[i][key][0][j] for _, i, j in picked]] for key in keys}
+
+
+def search(client, collection_name, query_embedding, n_results=5, where=None, include=None):
+    """
+    Similarity search with pushed-down filters and partition routing
+
+    Args:
+        client: ChromaDB client
+        collection_name: Main collection name
+        query_embedding: Query vector
+        n_results: Number of results to return
+        where: Optional ChromaDB where clause (see build_where)
+        include: Fields to return (default: documents, metadatas, distances)
+
+    Returns:
+        Query results in ChromaDB's nested-list format
+    """
+    return search_batch(client, collection_name, [query_embedding], n_results, where, include)[0]
+
+
+def search_batch(client, collection_name, query_embeddings, n_results=5, where=None, include=None):
+    """
+    Run several query vectors through one multi-vector query per collection
+
+    Args:
+        client: ChromaDB client
+        collection_name: Main collection name or alias (see collection_versions.py)
+        query_embeddings: List (or 2-D array) of query vectors
+        n_results: Number of results per query
+        where: Optional ChromaDB where clause shared by all queries
+        include: Fields to return (default: documents, metadatas, distances)
+
+    Returns:
+        One single-query result (ChromaDB's nested-list format) per query vector;
+        for compact collections (see chunk_store.py) documents and metadata
+        are filled in from the chunk store
+    """
+    include = include or ["documents", "metadatas", "distances"]
+    collection_name = resolve(client, collection_name)
+    main = client.get_collection(collection_name)
+    names = route(collection_name, load_partition_map(main), where)
+    compact = bool((main.metadata or {}).get(CHUNK_STORE_KEY))
+    if compact and "documents" in include and "metadatas" not in include:
+        include = [*include, "metadatas"]
+
+    results = []
+    for name in names:
+        collection = main if name == collection_name else client.get_collection(name)
+        if collection.count() == 0:
+            continue
+        kwargs = {"where": where} if where else {}
+        results.append(collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            include=include,
+            **kwargs
+        ))
+
+    if not results:
+        return [{key: [[]] for key in ["ids"] + list(include)} for _ in range(len(query_embeddings))]
+
+    keys = ["ids"] + [key for key in include if key in results[0]]
+    merged = [
+        merge_results([{key: [r[key][q]] for key in keys if r.get(key) is not None} for r in results],
+                      n_results)
+        for q in range(len(query_embeddings))
+    ]
+    if compact and "documents" in include:
+        from chunk_store import hydrate, open_store
+        store = open_store(client.get_settings().persist_directory, collection_name)
+        for result in merged:
+            hydrate(result, store)
+    return merged
@@ -0,0 +1,483 @@
+"""
+Query Server - Healthcare AI RAG System
+Long-running HTTP server that keeps ChromaDB, embeddings and the RAG chain warm
+
+The interactive scripts (query_system.py, retrieval_qa_custom.py) open their
+own client, embeddings and chain per process and answer one question at a
+time. This server loads them once and serves many clients concurrently.
+
+Endpoints (JSON in, JSON out):
+    POST /search   {"query": "...", "k": 5, "source": ..., "domain": ...}
+    POST /ask      {"question": "...", "k": 5, "search_type": "mmr", ...}
+    GET  /health   collection, chunk count, uptime
+    GET  /metrics  request counts, errors and latency percentiles per endpoint
+                   (plus batch fill and queueing delay when batching is on,
+                   and chosen-k statistics once adaptive /ask requests ran)
+    POST /reload   re-resolve the collection and rebuild chains
+
+The collection is also watched: when it is rebuilt (new collection id) or
+its chunk count changes, the server reloads in the background. A reload
+builds the new state first and then swaps it in, so in-flight requests
+finish on the old state and no request ever sees a half-loaded server.
+SIGHUP triggers a reload; SIGTERM / Ctrl+C shut down after in-flight
+requests complete.
+
+Usage:
+    python query_server.py --port 8765
+    python query_server.py --socket /tmp/rag.sock
+    python query_server.py --batch-window-ms 5 --max-batch 16
+    curl -s localhost:8765/search -d '{"query": "How are payers using AI?"}'
+"""
+
+import argparse
+import json
+import os
+import signal
+import socketserver
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import chromadb
+from dotenv import load_dotenv
+
+from collection_versions import resolve
+from micro_batch import MicroBatcher
+from partitions import PARTITION_MAP_KEY, build_where, search
+
+load_dotenv()
+
+
+DEFAULT_COLLECTION = "healthcare_ai_500_large"
+
+# Latency samples kept per endpoint for percentiles
+METRICS_WINDOW = 2048
+
+
+class ServerMetrics:
+    """Thread-safe request counters and latency percentiles per endpoint"""
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.errors = {}
+        self.latencies = {}
+        self.in_flight = 0
+
+    def start(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def record(self, endpoint, seconds, error=False):
+        with self.lock:
+            self.in_flight -= 1
+            self.counts[endpoint] = self.counts.get(endpoint, 0) + 1
+            if error:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            self.latencies.setdefault(endpoint, deque(maxlen=self.window)).append(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            endpoints = {}
+            for endpoint, samples in self.latencies.items():
+                ordered = sorted(samples)
+                pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+                endpoints[endpoint] = {
+                    "requests": self.counts[endpoint],
+                    "errors": self.errors.get(endpoint, 0),
+                    "p50_ms": round(pick(0.50), 2),
+                    "p95_ms": round(pick(0.95), 2),
+                    "p99_ms": round(pick(0.99), 2),
+                }
+            return {"in_flight": self.in_flight, "endpoints": endpoints}
+
+
+class WarmState:
+    """Everything a request needs, resolved once per (re)load"""
+
+    def __init__(self, collection, fingerprint):
+        self.collection = collection
+        self.fingerprint = fingerprint
+        self.loaded_at = time.time()
+        self.chains = {}
+        self.chains_lock = threading.Lock()
+
+
+class QueryServer:
+    """
+    Warm retrieval and Q&A state shared by all request threads
+
+    Args:
+        collection_name: Collection to serve
+        path: ChromaDB directory
+        embeddings: Embeddings object (default: the configured provider, see
+            embedding_providers.py)
+        llm: Chat model for /ask (default: the OpenAI pool's chat model, created lazily)
+        model_name: OpenAI chat model for /ask
+        watch_interval: Seconds between collection change checks (0 disables)
+        batch_window_ms: Coalesce concurrent /search requests for up to this
+            long into one embedding call and one search (None disables)
+        max_batch: Largest /search batch
+    """
+
+    def __init__(self, collection_name=DEFAULT_COLLECTION, path="./chroma_db",
+                 embeddings=None, llm=None, model_name="gpt-4o-mini", watch_interval=5.0,
+                 batch_window_ms=None, max_batch=16):
+        self.collection_name = collection_name
+        self.model_name = model_name
+        self.watch_interval = watch_interval
+        self.started_at = time.time()
+        self.metrics = ServerMetrics()
+        self.reloads = 0
+
+        if embeddings is None:
+            from embedding_providers import get_embeddings
+            embeddings = get_embeddings()
+        self.embeddings = embeddings
+        self.llm = llm
+        self.client = chromadb.PersistentClient(path=path)
+        self.batcher = None
+        if batch_window_ms:
+            self.batcher = MicroBatcher(embeddings, self.client, collection_name,
+                                        max_batch=max_batch, max_wait_ms=batch_window_ms)
+
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.state = None
+        self.reload()
+
+    # State ----------------------------------------------------------------
+
+    def _fingerprint(self, collection):
+        partitions = (collection.metadata or {}).get(PARTITION_MAP_KEY)
+        return (collection.id, collection.count(), partitions)
+
+    def reload(self, force=True):
+        """
+        Re-resolve the collection and swap in fresh state
+
+        Args:
+            force: Reload even if the collection looks unchanged
+
+        Returns:
+            True if the state was replaced
+        """
+        with self._reload_lock:
+            # An alias swap (see collection_versions.py) changes the collection id
+            collection = self.client.get_collection(resolve(self.client, self.collection_name))
+            fingerprint = self._fingerprint(collection)
+            if not force and self.state is not None and fingerprint == self.state.fingerprint:
+                return False
+
+            # Touch the index once so the first real query doesn't pay for loading it
+            sample = collection.peek(1)
+            if len(sample["ids"]) > 0:
+                collection.query(query_embeddings=[sample["embeddings"][0]], n_results=1)
+
+            self.state = WarmState(collection, fingerprint)
+            self.reloads += 1
+            print(f"🔄 Loaded '{self.collection_name}' ({fingerprint[1]} chunks)")
+            return True
+
+    def watch(self):
+        """Reload in the background whenever the collection changes"""
+        while not self._stop.wait(self.watch_interval):
+            try:
+                self.reload(force=False)
+            except Exception as e:
+                print(f"⚠️  Collection check failed: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self.batcher is not None:
+            self.batcher.close()
+
+    # Handlers -------------------------------------------------------------
+
+    def _where(self, payload):
+        if payload.get("where"):
+            return payload["where"]
+        if payload.get("source") or payload.get("domain"):
+            return build_where(source=payload.get("source"), domain=payload.get("domain"))
+        return None
+
+    def search(self, payload):
+        """
+        Similarity search (same routing and filters as query_system.query_chromadb)
+
+        Args:
+            payload: {"query": str, "k": int, "source"/"domain"/"where": optional filter}
+
+        Returns:
+            {"results": [{"id", "document", "metadata", "relevance"}, ...]}
+        """
+        query = payload.get("query")
+        if not query:
+            raise ValueError("'query' is required")
+
+        n_results = int(payload.get("k", 5))
+        where = self._where(payload)
+        if self.batcher is not None:
+            results = self.batcher.search(query, n_results=n_results, where=where)
+        else:
+            results = search(
+                self.client,
+                self.collection_name,
+                self.embeddings.embed_query(query),
+                n_results=n_results,
+                where=where
+            )
+        return {
+            "query": query,
+            "results": [
+                {"id": id_, "document": doc, "metadata": metadata, "relevance": 1 - distance}
+                for id_, doc, metadata, distance in zip(
+                    results["ids"][0], results["documents"][0],
+                    results["metadatas"][0], results["distances"][0]
+                )
+            ]
+        }
+
+    def _chain(self, payload):
+        """Build (once per state and settings) the RAG chain for an /ask request"""
+        from retrieval_qa_custom import create_rag_chain
+
+        options = {
+            "k": int(payload.get("k", 5)),
+            "search_type": payload.get("search_type", "similarity"),
+            "fetch_k": int(payload.get("fetch_k", 20)),
+            "lambda_mult": float(payload.get("lambda_mult", 0.5)),
+            "where": self._where(payload),
+        }
+        if options["search_type"] == "adaptive":
+            options["min_similarity"] = float(payload.get("min_similarity", 0.0))
+            options["gap_ratio"] = float(payload.get("gap_ratio", 0.3))
+            budget = payload.get("token_budget")
+            options["token_budget"] = int(budget) if budget is not None else None
+        if options["search_type"] == "multi_query":
+            options["variants"] = int(payload.get("variants", 4))
+            options["rewrite_queries"] = bool(payload.get("rewrite", False))
+        key = json.dumps(options, sort_keys=True)
+        state = self.state
+        with state.chains_lock:
+            if key not in state.chains:
+                if self.llm is None:
+                    from openai_pool import get_pool
+                    self.llm = get_pool().chat_model(self.model_name, temperature=0)
+                state.chains[key] = create_rag_chain(
+                    collection_name=self.collection_name,
+                    client=self.client,
+                    embeddings=self.embeddings,
+                    llm=self.llm,
+                    **options
+                )
+            return state.chains[key]
+
+    def ask(self, payload):
+        """
+        Answer a question with the RAG chain
+
+        Retrieves once and feeds those chunks to the chain's answer stage,
+        so the question is embedded and searched a single time.
+
+        Args:
+            payload: {"question": str} plus optional create_rag_chain settings
+
+        Returns:
+            {"answer": str, "sources": [{"id", "source", "preview"}, ...]}
+        """
+        question = payload.get("question")
+        if not question:
+            raise ValueError("'question' is required")
+
+        from retrieval_qa_custom import answer_stage, format_docs
+
+        rag_chain, retriever = self._chain(payload)
+        source_docs = retriever.invoke(question)
+        answer = answer_stage(rag_chain).invoke({"context": format_docs(source_docs), "question": question})
+        return {
+            "question": question,
+            "answer": answer,
+            "sources": [
+                {
+                    "source": doc.metadata.get("source"),
+                    "title": doc.metadata.get("title"),
+                    "preview": doc.page_content[:200],
+                }
+                for doc in source_docs
+            ]
+        }
+
+    def metrics_snapshot(self):
+        snapshot = {**self.metrics.snapshot(), "reloads": self.reloads}
+        if self.batcher is not None:
+            snapshot["batching"] = self.batcher.metrics.snapshot()
+        from retrieval_modes import adaptive_stats
+        if adaptive_stats.count:
+            snapshot["adaptive_k"] = adaptive_stats.snapshot()
+        return snapshot
+
+    def health(self):
+        state = self.state
+        return {
+            "status": "ok",
+            "collection": self.collection_name,
+            "chunks": state.fingerprint[1],
+            "loaded_at": state.loaded_at,
+            "reloads": self.reloads,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+        }
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """Routes HTTP requests to the shared QueryServer"""
+
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # Unix-socket clients have no (host, port) address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _payload(self):
+        """Request body as a dict; ValueError (a 400) if it is not a JSON object"""
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        payload = json.loads(self.rfile.read(length))
+        if not isinstance(payload, dict):
+            raise ValueError("request body must be a JSON object")
+        return payload
+
+    def _dispatch(self, routes):
+        app = self.server.app
+        endpoint = self.path.split("?")[0]
+        handler = routes.get(endpoint)
+        if handler is None:
+            self._send(404, {"error": f"unknown endpoint {endpoint}"})
+            return
+
+        app.metrics.start()
+        start = time.perf_counter()
+        error = False
+        try:
+            self._send(200, handler(app))
+        except (ValueError, KeyError) as e:
+            error = True
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            error = True
+            self._send(500, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            app.metrics.record(endpoint, time.perf_counter() - start, error)
+
+    def do_GET(self):
+        self._dispatch({
+            "/health": lambda app: app.health(),
+            "/metrics": lambda app: app.metrics_snapshot(),
+        })
+
+    def do_POST(self):
+        # The body is parsed inside the dispatch, so bad JSON is a 400 and is counted
+        self._dispatch({
+            "/search": lambda app: app.search(self._payload()),
+            "/ask": lambda app: app.ask(self._payload()),
+            "/reload": lambda app: {"reloaded": app.reload(force=True)},
+        })
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Threaded HTTP server on a Unix domain socket"""
+    daemon_threads = True
+
+
+def make_server(app, host="127.0.0.1", port=8765, socket_path=None):
+    """
+    Create the HTTP server (TCP on localhost, or a Unix socket)
+
+    Args:
+        app: QueryServer instance
+        host, port: TCP address (ignored when socket_path is given)
+        socket_path: Unix socket path
+
+    Returns:
+        socketserver instance with `.app` set
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, QueryRequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), QueryRequestHandler)
+        server.daemon_threads = True
+    server.app = app
+    return server
+
+
+def serve(collection_name=DEFAULT_COLLECTION, host="127.0.0.1", port=8765, socket_path=None,
+          watch_interval=5.0, model_name="gpt-4o-mini", batch_window_ms=None, max_batch=16):
+    """
+    Load everything once and serve until interrupted
+    """
+    print("="*70)
+    print(" Healthcare AI Knowledge Base - Query Server")
+    print("="*70)
+
+    app = QueryServer(collection_name, watch_interval=watch_interval, model_name=model_name,
+                      batch_window_ms=batch_window_ms, max_batch=max_batch)
+    server = make_server(app, host, port, socket_path)
+
+    if watch_interval:
+        threading.Thread(target=app.watch, daemon=True).start()
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda *_: threading.Thread(target=app.reload).start())
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+
+    address = socket_path or f"http://{host}:{port}"
+    print(f"\n✅ Serving '{collection_name}' on {address}")
+    print("   POST /search  POST /ask  GET /health  GET /metrics  POST /reload\n")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        app.stop()
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+        print("\n👋 Server stopped")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm query server for the RAG system")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="Serve on a Unix socket instead of TCP")
+    parser.add_argument("--watch-interval", type=float, default=5.0,
+                        help="Seconds between collection change checks (0 disables)")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--batch-window-ms", type=float, default=None,
+                        help="Micro-batch concurrent /search requests for up to this long")
+    parser.add_argument("--max-batch", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    serve(args.collection, args.host, args.port, args.socket, args.watch_interval, args.model,
+          args.batch_window_ms, args.max_batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,14 @@ Simple script to query your ChromaDB collection
 """
 
 import chromadb
-from langchain_openai import OpenAIEmbeddings
+from embedding_providers import get_embeddings, provider_name
 from dotenv import load_dotenv
-import os
+from partitions import search
 
 load_dotenv()
 
 
-def query_chromadb(query_text, collection_name="healthcare_ai_500_large", n_results=5):
+def query_chromadb(query_text, collection_name="healthcare_ai_500_large", n_results=5, where=None):
     """
     Query the ChromaDB collection
     
@@ -19,27 +19,27 @@ def query_chromadb(query_text, collection_name="healthcare_ai_500_large", n_resu
         query_text: Your question
         collection_name: Collection name (default: healthcare_ai_500_large)
         n_results: Number of results to return (default: 5)
+        where: Optional metadata filter, e.g. build_where(domain="deloitte.com")
     """
     print(f"\n🔍 Query: {query_text}")
     print("="*70)
     
     # Connect to ChromaDB
     client = chromadb.PersistentClient(path="./chroma_db")
-    collection = client.get_collection(collection_name)
     
     # Create embeddings
-    embeddings = OpenAIEmbeddings(
-        model="text-embedding-3-large",
-        openai_api_key=os.getenv("OPENAI_API_KEY")
-    )
+    embeddings = get_embeddings()
     
     # Embed query
     query_embedding = embeddings.embed_query(query_text)
     
-    # Query collection
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=n_results
+    # Query collection (filter is applied inside the search, partitions are routed)
+    results = search(
+        client,
+        collection_name,
+        query_embedding,
+        n_results=n_results,
+        where=where
     )
     
     # Display results
@@ -63,7 +63,7 @@ def main():
     print()
     print("Collection: healthcare_ai_500_large")
     print("Documents: 208 chunks")
-    print("Model: text-embedding-3-large (3072 dimensions)")
+    print(f"Embeddings: {provider_name()}")
     print()
     print("="*70)
     
@@ -0,0 +1,387 @@
+"""
+Healthcare AI RAG System - Command Line Interface
+One entry point for ingestion, search, Q&A, evaluation and benchmarks
+
+Heavy dependencies (chromadb, LangChain, OpenAI) are only imported by the
+subcommand that needs them, so `--help` and light subcommands start fast.
+
+Usage:
+    python rag_cli.py ingest                    # rebuild healthcare_ai_500_large
+    python rag_cli.py ingest --resume           # continue an interrupted rebuild
+    python rag_cli.py ingest --collection healthcare_ai_800 --chunk-size 800 --chunk-overlap 150
+    python rag_cli.py ingest --dir ./policies --collection policy_docs
+    python rag_cli.py ingest --dir ./policies --collection policy_docs --compact lzma
+    python rag_cli.py ingest --hnsw space=cosine M=32 search_ef=100
+    python rag_cli.py recrawl --once            # re-embed only source pages that changed
+    python rag_cli.py query "your question" --k 5 --domain norc.org
+    python rag_cli.py query                     # interactive search
+    python rag_cli.py ask "your question" --search-type mmr
+    python rag_cli.py ask "your question" --search-type adaptive --k 10 --token-budget 1500
+    python rag_cli.py ask "your question" --search-type multi_query --variants 4
+    python rag_cli.py ask                       # interactive Q&A
+    python rag_cli.py ask --questions-file qs.txt --concurrency 16 --output answers.jsonl
+    python rag_cli.py serve --port 8765         # warm HTTP query server
+    python rag_cli.py eval
+    python rag_cli.py eval --questions questions.jsonl --k 1 3 5 10
+    python rag_cli.py eval --questions questions.jsonl --k 3 5 10 --adaptive
+    python rag_cli.py experiment --questions questions.jsonl --chunk-size 300 500 1000
+    python rag_cli.py versions                  # versions behind the collection alias
+    python rag_cli.py versions --rollback       # switch back to the previous version
+    python rag_cli.py bench startup             # or any benchmarks.py benchmark
+    python rag_cli.py regress                   # exits non-zero on ranking/latency regressions
+    python rag_cli.py --embeddings hashing ingest --dir ./policies   # offline, no API key
+
+--embeddings / --embedding-dim (or EMBEDDING_PROVIDER / EMBEDDING_DIM in .env)
+choose the embedding provider for every subcommand; see embedding_providers.py.
+"""
+
+import argparse
+import importlib
+import os
+import sys
+
+
+DEFAULT_COLLECTION = "healthcare_ai_500_large"
+
+# Modules each subcommand needs; imported on first use only
+SUBCOMMAND_MODULES = {
+    "ingest": ["rag_pipeline"],
+    "recrawl": ["rag_pipeline", "recrawl"],
+    "query": ["query_system", "partitions"],
+    "ask": ["retrieval_qa_custom", "partitions"],
+    "serve": ["query_server"],
+    "eval": ["rag_evaluation"],
+    "eval-ir": ["ir_metrics"],
+    "experiment": ["experiments"],
+    "versions": ["collection_versions"],
+    "bench": ["benchmarks"],
+    "regress": ["test_regression"],
+}
+
+
+def load_subcommand(name):
+    """
+    Import the modules a subcommand needs
+
+    Args:
+        name: Subcommand name
+
+    Returns:
+        List of imported modules
+    """
+    return [importlib.import_module(module) for module in SUBCOMMAND_MODULES[name]]
+
+
+def _where(args):
+    """Build a metadata filter from --source/--domain, if given"""
+    if not (args.source or args.domain):
+        return None
+    from partitions import build_where
+    return build_where(source=args.source, domain=args.domain)
+
+
+def cmd_ingest(args):
+    rag_pipeline, = load_subcommand("ingest")
+
+    if args.dir:
+        rag = rag_pipeline.RAGSystem(
+            chunk_size=args.chunk_size,
+            chunk_overlap=args.chunk_overlap,
+            hnsw=rag_pipeline.parse_hnsw_options(args.hnsw)
+        )
+        collection = args.collection or "local_corpus"
+        if args.compact:
+            rag.store_compact(rag.load_documents_from_directory(args.dir, workers=args.workers),
+                              collection_name=collection, compression=args.compact)
+        else:
+            rag.ingest_directory(args.dir, collection_name=collection, workers=args.workers)
+    else:
+        argv = ["--resume"] if args.resume else []
+        argv += ["--chunk-size", str(args.chunk_size), "--chunk-overlap", str(args.chunk_overlap)]
+        if args.collection:
+            argv += ["--collection", args.collection]
+        if args.hnsw:
+            argv += ["--hnsw", *args.hnsw]
+        rag_pipeline.main(argv)
+
+
+def cmd_recrawl(args):
+    rag_pipeline, recrawl = load_subcommand("recrawl")
+
+    rag = rag_pipeline.RAGSystem(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    scheduler = recrawl.RecrawlScheduler(
+        rag,
+        args.urls or rag_pipeline.SOURCE_URLS,
+        collection_name=args.collection,
+        interval=args.interval,
+        max_interval=args.max_interval
+    )
+    if args.once or args.force:
+        scheduler.run_once(force=args.force)
+    else:
+        scheduler.run(poll=args.poll)
+
+
+def cmd_query(args):
+    query_system, _ = load_subcommand("query")
+
+    if not args.question:
+        query_system.main()
+        return
+    query_system.query_chromadb(
+        " ".join(args.question),
+        collection_name=args.collection,
+        n_results=args.k,
+        where=_where(args)
+    )
+
+
+def cmd_ask(args):
+    retrieval_qa_custom, _ = load_subcommand("ask")
+
+    if not (args.question or args.questions_file):
+        retrieval_qa_custom.main()
+        return
+    rag_chain, retriever = retrieval_qa_custom.create_rag_chain(
+        collection_name=args.collection,
+        model_name=args.model,
+        k=args.k,
+        search_type=args.search_type,
+        fetch_k=args.fetch_k,
+        lambda_mult=args.lambda_mult,
+        where=_where(args),
+        min_similarity=args.min_similarity,
+        gap_ratio=args.gap_ratio,
+        token_budget=args.token_budget,
+        variants=args.variants,
+        rewrite_queries=args.rewrite
+    )
+    if not args.questions_file:
+        retrieval_qa_custom.query_with_rag(" ".join(args.question), rag_chain, retriever)
+        return
+
+    import json
+    with open(args.questions_file, encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    results = retrieval_qa_custom.ask_many(questions, rag_chain, retriever,
+                                           max_concurrency=args.concurrency, timeout=args.timeout)
+    lines = [json.dumps({
+        "question": r["question"],
+        "answer": r["answer"],
+        "error": r["error"],
+        "sources": [doc.id for doc in r["source_documents"]],
+        "latency_ms": round(r["latency_ms"], 1),
+    }) + "\n" for r in results]
+    if not args.output:
+        sys.stdout.writelines(lines)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        print(f"💾 Saved {len(results)} answers to {args.output}")
+
+
+def cmd_serve(args):
+    query_server, = load_subcommand("serve")
+    query_server.serve(
+        collection_name=args.collection,
+        host=args.host,
+        port=args.port,
+        socket_path=args.socket,
+        watch_interval=args.watch_interval,
+        model_name=args.model,
+        batch_window_ms=args.batch_window_ms,
+        max_batch=args.max_batch
+    )
+
+
+def cmd_eval(args):
+    if args.questions:
+        ir_metrics, = load_subcommand("eval-ir")
+        argv = [args.questions, "--collection", args.collection, "--k", *map(str, args.k)]
+        if args.no_cache:
+            argv.append("--no-cache")
+        if args.adaptive:
+            argv.append("--adaptive")
+            if args.token_budget:
+                argv += ["--token-budget", str(args.token_budget)]
+        ir_metrics.main(argv)
+        return
+    rag_evaluation, = load_subcommand("eval")
+    rag_evaluation.run_evaluation()
+
+
+def cmd_versions(args):
+    collection_versions, = load_subcommand("versions")
+    import chromadb
+
+    client = chromadb.PersistentClient(path="./chroma_db")
+    if args.rollback:
+        try:
+            print(f"⏪ {args.collection} -> {collection_versions.rollback(client, args.collection)}")
+        except ValueError as e:
+            sys.exit(f"❌ {e}")
+    if args.gc:
+        deleted = collection_versions.garbage_collect(client, args.collection, keep=args.keep)
+        print(f"🧹 Removed {len(deleted)} old version(s){': ' + ', '.join(deleted) if deleted else ''}")
+    collection_versions.print_versions(client, args.collection)
+
+
+def cmd_experiment(args):
+    experiments, = load_subcommand("experiment")
+    experiments.main(args.experiment_args)
+
+
+def cmd_bench(args):
+    benchmarks, = load_subcommand("bench")
+    benchmarks.main(args.bench_args)
+
+
+def cmd_regress(args):
+    test_regression, = load_subcommand("regress")
+    sys.exit(test_regression.main(args.regress_args))
+
+
+def _add_filter_args(parser):
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION)
+    parser.add_argument("--k", type=int, default=5, help="Number of chunks to retrieve")
+    parser.add_argument("--source", help="Only search chunks from this source URL")
+    parser.add_argument("--domain", help="Only search chunks from this domain (e.g. norc.org)")
+
+
+def _add_embedding_args(parser):
+    parser.add_argument("--embeddings", choices=["openai", "hashing"],
+                        help="Embedding provider (default: EMBEDDING_PROVIDER, else openai)")
+    parser.add_argument("--embedding-dim", type=int, help="Dimensions of the hashing embedder")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="rag_cli.py",
+        description="Healthcare AI RAG System"
+    )
+    _add_embedding_args(parser)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest", help="Build a collection from the source URLs or a local corpus")
+    p.add_argument("--resume", action="store_true", help="Resume the last interrupted URL ingestion")
+    p.add_argument("--dir", help="Ingest a local directory instead of the source URLs")
+    p.add_argument("--collection",
+                   help="Collection (alias) to build (default: local_corpus with --dir, else healthcare_ai_500_large)")
+    p.add_argument("--workers", type=int, default=4, help="Reader threads for --dir")
+    p.add_argument("--chunk-size", type=int, default=500)
+    p.add_argument("--chunk-overlap", type=int, default=100)
+    p.add_argument("--compact", nargs="?", const="zlib", choices=["none", "zlib", "lzma"],
+                   help="With --dir: keep chunk text once per document in a chunk store")
+    p.add_argument("--hnsw", nargs="*", metavar="KEY=VALUE",
+                   help="HNSW settings, e.g. space=cosine M=32 construction_ef=200 search_ef=100")
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser("recrawl", help="Conditionally re-fetch source URLs; re-embed only changed pages")
+    p.add_argument("--urls", nargs="+", help="URLs to keep fresh (default: the source URLs)")
+    p.add_argument("--collection", default=DEFAULT_COLLECTION)
+    p.add_argument("--once", action="store_true", help="Check the due URLs once and exit")
+    p.add_argument("--force", action="store_true", help="Check every URL now (implies --once)")
+    p.add_argument("--interval", type=float, default=3600, help="Seconds between checks of a changed page")
+    p.add_argument("--max-interval", type=float, default=7 * 24 * 3600,
+                   help="Longest interval quiet pages back off to")
+    p.add_argument("--poll", type=float, default=60, help="Longest sleep between schedule checks")
+    p.add_argument("--chunk-size", type=int, default=500)
+    p.add_argument("--chunk-overlap", type=int, default=100)
+    p.set_defaults(func=cmd_recrawl)
+
+    p = sub.add_parser("query", help="Semantic search (interactive without a question)")
+    p.add_argument("question", nargs="*")
+    _add_filter_args(p)
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser("ask", help="Answer a question with the RAG chain (interactive without a question)")
+    p.add_argument("question", nargs="*")
+    _add_filter_args(p)
+    p.add_argument("--model", default="gpt-4o-mini")
+    p.add_argument("--search-type", choices=["similarity", "mmr", "adaptive", "multi_query"],
+                   default="similarity")
+    p.add_argument("--fetch-k", type=int, default=20)
+    p.add_argument("--lambda-mult", type=float, default=0.5)
+    p.add_argument("--min-similarity", type=float, default=0.0, help="Adaptive: similarity cut-off")
+    p.add_argument("--gap-ratio", type=float, default=0.3, help="Adaptive: score drop that ends the list")
+    p.add_argument("--token-budget", type=int, default=None, help="Adaptive: context token budget")
+    p.add_argument("--variants", type=int, default=4, help="Multi-query: phrasings searched per question")
+    p.add_argument("--rewrite", action="store_true", help="Multi-query: variants from the chat model")
+    p.add_argument("--questions-file", help="Answer every line of this file concurrently")
+    p.add_argument("--concurrency", type=int, default=8, help="Answers generated at the same time")
+    p.add_argument("--timeout", type=float, default=60.0, help="Seconds allowed per answer")
+    p.add_argument("--output", help="Write answers as JSON lines here (default: stdout)")
+    p.set_defaults(func=cmd_ask)
+
+    p = sub.add_parser("serve", help="Serve /search and /ask from one warm process")
+    p.add_argument("--collection", default=DEFAULT_COLLECTION)
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--socket", help="Serve on a Unix socket instead of TCP")
+    p.add_argument("--watch-interval", type=float, default=5.0,
+                   help="Seconds between collection change checks (0 disables)")
+    p.add_argument("--model", default="gpt-4o-mini")
+    p.add_argument("--batch-window-ms", type=float, default=None,
+                   help="Micro-batch concurrent /search requests for up to this long")
+    p.add_argument("--max-batch", type=int, default=16)
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser("eval", help="Run the RAG evaluation (or IR metrics with --questions)")
+    p.add_argument("--questions", help="JSONL question set with relevant chunk IDs")
+    p.add_argument("--collection", default=DEFAULT_COLLECTION)
+    p.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    p.add_argument("--no-cache", action="store_true", help="Re-embed the questions")
+    p.add_argument("--adaptive", action="store_true", help="Compare adaptive k with each fixed --k")
+    p.add_argument("--token-budget", type=int, default=None, help="Adaptive: context token budget")
+    p.set_defaults(func=cmd_eval)
+
+    p = sub.add_parser("versions", help="List, roll back or garbage-collect the versions behind a collection")
+    p.add_argument("collection", nargs="?", default=DEFAULT_COLLECTION)
+    p.add_argument("--rollback", action="store_true", help="Point the alias back at the previous version")
+    p.add_argument("--gc", action="store_true", help="Delete old versions")
+    p.add_argument("--keep", type=int, default=1, help="Previous versions --gc keeps")
+    p.set_defaults(func=cmd_versions)
+
+    p = sub.add_parser("experiment", help="Grid search over chunking, dimension and k (see experiments.py -h)")
+    p.add_argument("experiment_args", nargs=argparse.REMAINDER)
+    p.set_defaults(func=cmd_experiment)
+
+    p = sub.add_parser("bench", help="Run a benchmark (see benchmarks.py -h)")
+    p.add_argument("bench_args", nargs=argparse.REMAINDER)
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser("regress", help="Golden ranking snapshots and latency budgets (see test_regression.py -h)")
+    p.add_argument("regress_args", nargs=argparse.REMAINDER)
+    p.set_defaults(func=cmd_regress)
+
+    return parser
+
+
+# Subcommands that hand all their arguments to another module's main();
+# argparse.REMAINDER alone rejects arguments that start with "--"
+PASSTHROUGH = {"experiment": "experiment_args", "bench": "bench_args", "regress": "regress_args"}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser = build_parser()
+
+    # Embedding options apply to every subcommand (including pass-through
+    # ones), so they are taken out first and handed on through the environment
+    embedding_parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    _add_embedding_args(embedding_parser)
+    embedding_args, argv = embedding_parser.parse_known_args(argv)
+    if embedding_args.embeddings:
+        os.environ["EMBEDDING_PROVIDER"] = embedding_args.embeddings
+    if embedding_args.embedding_dim:
+        os.environ["EMBEDDING_DIM"] = str(embedding_args.embedding_dim)
+    if argv and argv[0] in PASSTHROUGH:
+        args = parser.parse_args(argv[:1])
+        setattr(args, PASSTHROUGH[argv[0]], argv[1:])
+    else:
+        args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,13 +4,16 @@ Tests retrieval quality, faithfulness, and correctness
 """
 
 import chromadb
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_community.vectorstores import Chroma
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough
 from dotenv import load_dotenv
-import os
+from collection_versions import resolve
+from context_assembly import assemble_context
+from embedding_providers import get_embeddings
+from openai_pool import get_pool
+from retrieval_qa_custom import ask_many
 from datetime import datetime
 
 load_dotenv()
@@ -64,8 +67,8 @@ EVAL_QUESTIONS = [
 # ============================================================================
 
 def format_docs(docs):
-    """Format retrieved documents into a single string"""
-    return "\n\n".join(doc.page_content for doc in docs)
+    """Format retrieved documents into a single string, merging overlapping chunks"""
+    return assemble_context(docs)
 
 
 def create_rag_chain(
@@ -77,10 +80,7 @@ def create_rag_chain(
     """Create RAG chain with custom prompt"""
     
     # Initialize embeddings
-    embeddings = OpenAIEmbeddings(
-        model="text-embedding-3-large",
-        openai_api_key=os.getenv("OPENAI_API_KEY")
-    )
+    embeddings = get_embeddings()
     
     # Connect to ChromaDB
     client = chromadb.PersistentClient(path="./chroma_db")
@@ -88,7 +88,7 @@ def create_rag_chain(
     # Create Chroma vectorstore
     vectorstore = Chroma(
         client=client,
-        collection_name=collection_name,
+        collection_name=resolve(client, collection_name),
         embedding_function=embeddings
     )
     
@@ -99,11 +99,7 @@ def create_rag_chain(
     )
     
     # Initialize LLM
-    llm = ChatOpenAI(
-        model=model_name,
-        temperature=temperature,
-        openai_api_key=os.getenv("OPENAI_API_KEY")
-    )
+    llm = get_pool().chat_model(model_name, temperature=temperature)
     
     # Create custom prompt
     template = """You are a healthcare AI expert assistant. Use the following pieces of context to answer the question at the end.
@@ -247,8 +243,17 @@ def evaluate_correctness(answer, expected_answer, expected_keywords):
 # MAIN EVALUATION RUNNER
 # ============================================================================
 
-def run_evaluation():
-    """Run full evaluation on test set"""
+def run_evaluation(max_concurrency=8, timeout=60.0):
+    """
+    Run full evaluation on test set
+    
+    Answers for all questions are generated up front, concurrently (see
+    retrieval_qa_custom.ask_many); scoring then runs question by question.
+    
+    Args:
+        max_concurrency: Answers generated at the same time
+        timeout: Seconds allowed per answer
+    """
     
     print("="*80)
     print(" RAG PIPELINE EVALUATION")
@@ -272,6 +277,11 @@ def run_evaluation():
         print(f"❌ Error initializing RAG chain: {e}")
         return
     
+    # Generate all answers concurrently; failures are recorded per question
+    print(f"⚙️  Generating {len(EVAL_QUESTIONS)} answers (concurrency {max_concurrency})...")
+    answers = ask_many([test['question'] for test in EVAL_QUESTIONS], rag_chain, retriever,
+                       max_concurrency=max_concurrency, timeout=timeout)
+    
     # Track results
     results = []
     retrieval_passes = 0
@@ -287,11 +297,11 @@ def run_evaluation():
         print(f"\n📋 Expected Answer: {test['expected_answer'][:150]}...")
         
         try:
-            # Get retrieved documents
-            retrieved_docs = retriever.invoke(test['question'])
-            
-            # Get answer from RAG
-            answer = rag_chain.invoke(test['question'])
+            generated = answers[i - 1]
+            if generated['error']:
+                raise RuntimeError(generated['error'])
+            retrieved_docs = generated['source_documents']
+            answer = generated['answer']
             
             print(f"\n💡 Generated Answer:\n{answer}")
             
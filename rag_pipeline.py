@@ -3,72 +3,241 @@ RAG System - Healthcare AI Documents
 Clean version for production use
 
 This module provides the complete pipeline for:
-1. Loading documents from web URLs
+1. Loading documents from web URLs or a local corpus on disk
 2. Splitting into chunks
-3. Creating embeddings with OpenAI
+3. Creating embeddings (OpenAI, or offline with the hashing embedder)
 4. Storing in ChromaDB vector database
 """
 
+import argparse
 import os
 from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.document_loaders import WebBaseLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from langchain_core.prompts import PromptTemplate
 import chromadb
+from retrieval_modes import adaptive_query, mmr_query
+from checkpoint import BATCH_COMMITTED, BATCH_EMBEDDED, IngestCheckpoint
+from collection_versions import new_version, publish, reserve_version, resolve
+from chunk_store import CHUNK_ROW_KEY, ChunkStore, store_path
+from corpus_loader import DEFAULT_EXTENSIONS, iter_local_documents
+from embedding_providers import embedding_model_name, get_embeddings
+from hnsw_tuning import hnsw_metadata, parse_hnsw_options
+from multi_query import multi_query_search
+from openai_pool import get_pool, lane
+from tenancy import CollectionRouter
+from partitions import (
+    CHUNK_STORE_KEY, PARTITION_MAP_KEY, chunk_id, index_metadata, ingest_stamp, partition_name, search,
+    write_target
+)
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import json
 import pickle
 import time
+import numpy as np
 
 # Load environment variables
 load_dotenv()
 
+# Healthcare AI URLs
+SOURCE_URLS = [
+    "https://www.beckerspayer.com/virtual-care/14-payer-ai-moves-in-2025/",
+    "https://www.deloitte.com/us/en/insights/industry/health-care/life-sciences-and-health-care-industry-outlooks/2026-global-health-care-outlook.html",
+    "https://www.norc.org/research/projects/use-ai-utilization-management.html"
+]
+
+
+def make_text_splitter(chunk_size, chunk_overlap):
+    """Text splitter shared by the serial path and the ingestion workers"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""],
+        add_start_index=True
+    )
+
+
+def iter_split(text_splitter, documents):
+    """
+    Split documents one at a time, numbering chunks within each source
+    
+    Args:
+        text_splitter: Splitter from make_text_splitter
+        documents: Iterable of Document objects
+        
+    Yields:
+        Chunk Documents with start_index, end_index and chunk_index
+    """
+    for document in documents:
+        doc_chunks = text_splitter.split_documents([document])
+        for seq, chunk in enumerate(doc_chunks):
+            chunk.metadata["chunk_index"] = seq
+            chunk.metadata["end_index"] = chunk.metadata["start_index"] + len(chunk.page_content)
+            yield chunk
+
+
+# Embeddings are kept as one contiguous float32 array (12 KB per 3072-dim
+# chunk) rather than lists of Python floats (~100 KB per chunk)
+EMBEDDING_DTYPE = np.float32
+
+
+def embed_array(embeddings, texts, batch_size=1000):
+    """
+    Embed texts into a single contiguous float32 array
+    
+    The embedding client returns lists of floats; each call's result is
+    copied into the preallocated array straight away, so at most one
+    call's lists are alive at a time. Calls go through the OpenAI pool's
+    bulk lane, so interactive queries are not stuck behind them.
+    
+    Args:
+        embeddings: LangChain embeddings object
+        texts: Texts to embed
+        batch_size: Texts per embed_documents call
+        
+    Returns:
+        (len(texts), dim) float32 array
+    """
+    out = None
+    with lane("bulk"):
+        for start in range(0, len(texts), batch_size):
+            vectors = np.asarray(embeddings.embed_documents(texts[start:start + batch_size]),
+                                 dtype=EMBEDDING_DTYPE)
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=EMBEDDING_DTYPE)
+            out[start:start + len(vectors)] = vectors
+    if out is None:
+        return np.empty((0, 0), dtype=EMBEDDING_DTYPE)
+    return out
+
+
+def search_array(query_embedding, embeddings, k=5):
+    """
+    Exact cosine search over an in-memory embedding array
+    
+    Args:
+        query_embedding: Query vector
+        embeddings: (n, dim) float32 array, e.g. from create_embeddings
+        k: Number of results
+        
+    Returns:
+        (indices, similarities) of the top k, best first
+    """
+    query = np.asarray(query_embedding, dtype=EMBEDDING_DTYPE)
+    norms = np.linalg.norm(embeddings, axis=1)
+    scores = (embeddings @ query) / np.maximum(norms * np.linalg.norm(query), 1e-12)
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k] if k else np.array([], dtype=np.int64)
+    top = top[np.argsort(-scores[top])]
+    return top, scores[top]
+
+
+# ----------------------------------------------------------------------------
+# Process-pool ingestion workers
+# ----------------------------------------------------------------------------
+
+_WORKER_SPLITTER = None
+
+
+def _init_ingest_worker(chunk_size, chunk_overlap):
+    """Build the text splitter once per worker process"""
+    global _WORKER_SPLITTER
+    _WORKER_SPLITTER = make_text_splitter(chunk_size, chunk_overlap)
+
+
+def _parse_and_chunk(job):
+    """
+    Worker: load (if needed) and split one document
+    
+    Only the document text, its metadata and the (start, end) span of each
+    chunk go back to the parent; chunk Documents are rebuilt there.
+    """
+    kind, payload, metadata = job
+    try:
+        if kind == "url":
+            from langchain_community.document_loaders import WebBaseLoader
+            loaded = [(doc.page_content, doc.metadata) for doc in WebBaseLoader(payload).load()]
+        else:
+            loaded = [(payload, metadata)]
+    except Exception as e:
+        return {"error": str(e)}
+    
+    records = []
+    for text, doc_metadata in loaded:
+        pieces = _WORKER_SPLITTER.create_documents([text])
+        spans = [
+            (piece.metadata["start_index"], piece.metadata["start_index"] + len(piece.page_content))
+            for piece in pieces
+        ]
+        records.append({"text": text, "metadata": doc_metadata, "spans": spans})
+    return {"records": records}
+
+
+def _chunks_from_spans(record):
+    """Rebuild chunk Documents from a worker record, matching create_chunks"""
+    text, doc_metadata = record["text"], record["metadata"]
+    return [
+        Document(
+            page_content=text[start:end],
+            metadata={**doc_metadata, "start_index": start, "chunk_index": seq, "end_index": end}
+        )
+        for seq, (start, end) in enumerate(record["spans"])
+    ]
+
 
 class RAGSystem:
     """
     Complete RAG system for healthcare AI documents
     """
     
-    def __init__(self, chunk_size=500, chunk_overlap=100, embedding_model="text-embedding-3-large"):
+    def __init__(self, chunk_size=500, chunk_overlap=100, embedding_model=None,
+                 hnsw=None, tenants=None, tenant_memory_mb=1024, embedding_provider=None):
         """
         Initialize RAG system
         
         Args:
             chunk_size: Size of text chunks (default: 500)
             chunk_overlap: Overlap between chunks (default: 100)
-            embedding_model: OpenAI embedding model (default: text-embedding-3-large)
+            embedding_model: OpenAI embedding model (default: EMBEDDING_MODEL, else
+                text-embedding-3-large)
+            hnsw: HNSW settings for new collections, e.g. {"space": "cosine", "M": 32,
+                "construction_ef": 200, "search_ef": 100} (default: ChromaDB's);
+                see hnsw_tuning.py to choose them
+            tenants: Optional tenant -> collection map (dict or JSON file) for
+                query_tenant; the busiest tenants are pre-warmed (see tenancy.py)
+            tenant_memory_mb: Memory cap for tenants held in memory
+            embedding_provider: "openai" or "hashing" (offline, no API key);
+                default: EMBEDDING_PROVIDER, else "openai" (see embedding_providers.py)
         """
         self.api_key = os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
-            raise ValueError("OPENAI_API_KEY not found in .env file")
         
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.embedding_model_name = embedding_model
+        self.hnsw = hnsw_metadata(**(hnsw or {}))
         
         # Initialize components
-        self.embeddings = OpenAIEmbeddings(
-            model=embedding_model,
-            openai_api_key=self.api_key
-        )
+        self.embeddings = get_embeddings(embedding_provider, model=embedding_model)
+        self.embedding_model_name = embedding_model_name(self.embeddings)
         
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        self.text_splitter = make_text_splitter(chunk_size, chunk_overlap)
         
-        self.llm = ChatOpenAI(
-            model="gpt-3.5-turbo",
-            temperature=0.7,
-            openai_api_key=self.api_key
-        )
+        # Only needed for generation; without a key the pipeline still runs offline
+        self.llm = get_pool().chat_model("gpt-3.5-turbo", temperature=0.7) if self.api_key else None
         
         print(f"✅ RAG System initialized")
-        print(f"   • Embedding model: {embedding_model}")
+        print(f"   • Embedding model: {self.embedding_model_name}")
         print(f"   • Chunk size: {chunk_size}")
         print(f"   • Chunk overlap: {chunk_overlap}")
+        if self.hnsw:
+            print(f"   • HNSW: {', '.join(f'{k[5:]}={v}' for k, v in self.hnsw.items())}")
+        
+        self.router = None
+        if tenants:
+            self.router = CollectionRouter(tenants, memory_cap_mb=tenant_memory_mb)
+            print(f"   • Tenants: {len(self.router.tenants)} (memory cap {tenant_memory_mb} MB)")
+            self.router.prewarm()
     
     
     def load_documents_from_urls(self, urls):
@@ -86,6 +255,9 @@ class RAGSystem:
         
         print(f"\n📄 Loading {len(urls)} document(s)...")
         
+        # Imported here: the web loader is only needed when fetching URLs
+        from langchain_community.document_loaders import WebBaseLoader
+        
         documents = []
         for i, url in enumerate(urls, 1):
             try:
@@ -104,6 +276,120 @@ class RAGSystem:
         return documents
     
     
+    def load_documents_from_directory(self, path, extensions=DEFAULT_EXTENSIONS, workers=4):
+        """
+        Lazily load a local corpus from disk
+        
+        Walks the directory, reads each file in a single read,
+        detects its encoding and records a sha256 content hash. Documents
+        are yielded one by one, so the corpus never sits in memory at once.
+        
+        Args:
+            path: Directory (or single file) to load
+            extensions: File extensions to include
+            workers: Parallel reader threads
+            
+        Yields:
+            Document objects
+        """
+        print(f"\n📂 Loading local corpus: {path}")
+        print(f"   Extensions: {', '.join(extensions)} | Readers: {workers}")
+        
+        count = 0
+        total_chars = 0
+        for document in iter_local_documents(path, extensions=extensions, workers=workers):
+            count += 1
+            total_chars += len(document.page_content)
+            yield document
+        
+        print(f"\n✅ Loaded {count:,} local document(s)")
+        print(f"   Total content: {total_chars:,} characters")
+    
+    
+    def ingest_directory(self, path, collection_name="healthcare_ai_docs", batch_size=500,
+                         extensions=DEFAULT_EXTENSIONS, workers=4):
+        """
+        Stream a local corpus through chunking, embedding and storage
+        
+        Chunks are embedded and upserted in batches as they are produced.
+        Chunk IDs are derived from the file's path and content hash
+        (partitions.chunk_id), so re-running over an unchanged corpus
+        rewrites the same rows and identical files never share rows. When
+        a file has changed, its new chunks are upserted first and the
+        chunks of its previous contents are then deleted (as recrawl.py
+        does), so an edited file never leaves stale chunks behind. Writes
+        follow the collection's partition map; compact collections are
+        rejected (see partitions.write_target).
+        
+        Args:
+            path: Directory (or single file) to ingest
+            collection_name: Collection (or alias) to add to, created if missing
+            batch_size: Chunks per embedding call and upsert
+            extensions: File extensions to include
+            workers: Parallel reader threads
+            
+        Returns:
+            ChromaDB collection object
+        
+        Raises:
+            ValueError: If the collection is compact
+        """
+        client = chromadb.PersistentClient(path="./chroma_db")
+        collection = write_target(client, collection_name, metadata=self._collection_metadata())
+        
+        ingest_date = ingest_stamp()
+        documents = self.load_documents_from_directory(path, extensions=extensions, workers=workers)
+        
+        stored = 0
+        batch = []
+        retired = set()
+        targets = {}
+        
+        def target(source):
+            if source not in targets:
+                targets[source] = write_target(client, collection_name, source)
+            return targets[source]
+        
+        def flush():
+            texts = [chunk.page_content for chunk in batch]
+            vectors = self.embed_texts(texts)
+            for c in batch:
+                index_metadata(c.metadata, ingest_date)
+            groups = {}  # collection name -> (collection, rows); partitioned sources go to their partition
+            for i, c in enumerate(batch):
+                part = target(c.metadata["source"])
+                groups.setdefault(part.name, (part, []))[1].append(i)
+            for part, indices in groups.values():
+                part.upsert(
+                    ids=[chunk_id(batch[i].metadata["source"], batch[i].metadata["content_hash"],
+                                  batch[i].metadata["chunk_index"]) for i in indices],
+                    embeddings=vectors[indices],
+                    documents=[texts[i] for i in indices],
+                    metadatas=[batch[i].metadata for i in indices]
+                )
+            # Retire each file's chunks from earlier contents once its new ones are in
+            for source, content_hash in dict.fromkeys((c.metadata["source"], c.metadata["content_hash"])
+                                                      for c in batch):
+                if source not in retired:
+                    retired.add(source)
+                    target(source).delete(where={"$and": [{"source": source},
+                                                          {"content_hash": {"$ne": content_hash}}]})
+            print(f"   Stored {stored + len(batch):,} chunks")
+        
+        for chunk in self.iter_chunks(documents):
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                flush()
+                stored += len(batch)
+                batch = []
+        if batch:
+            flush()
+            stored += len(batch)
+        
+        print(f"✅ Ingested {stored:,} chunks into {collection_name}")
+        return collection
+    
+    
     def add_document(self, content, metadata=None):
         """
         Add a custom document
@@ -122,6 +408,10 @@ class RAGSystem:
         """
         Split documents into chunks
         
+        Each chunk records its source offsets (start_index, end_index) and
+        its sequence number within the source (chunk_index), so overlapping
+        neighbours can be merged again at retrieval time.
+        
         Args:
             documents: List of Document objects
             
@@ -129,13 +419,83 @@ class RAGSystem:
             List of chunked documents
         """
         print(f"\n✂️  Splitting into chunks...")
-        chunks = self.text_splitter.split_documents(documents)
+        chunks = list(self.iter_chunks(documents))
+        
+        self._print_chunk_stats(chunks)
+        
+        return chunks
+    
+    
+    def iter_chunks(self, documents):
+        """
+        Lazily split documents into chunks, one document at a time
         
+        Args:
+            documents: Iterable of Document objects (may be a generator)
+            
+        Yields:
+            Chunk Documents with start_index, end_index and chunk_index
+        """
+        return iter_split(self.text_splitter, documents)
+    
+    
+    def _print_chunk_stats(self, chunks):
         chunk_sizes = [len(chunk.page_content) for chunk in chunks]
         print(f"✅ Created {len(chunks)} chunks")
         print(f"   • Smallest: {min(chunk_sizes)} characters")
         print(f"   • Largest: {max(chunk_sizes)} characters")
         print(f"   • Average: {sum(chunk_sizes)/len(chunk_sizes):.1f} characters")
+    
+    
+    def load_and_chunk(self, urls=None, documents=None, workers=None):
+        """
+        Load URLs and split them (plus any custom documents) into chunks
+        
+        With workers > 1, HTML fetching/parsing and splitting run in a
+        process pool. Workers send back text plus chunk spans rather than
+        pickled chunk Documents; the result is identical to the serial
+        load_documents_from_urls + create_chunks path.
+        
+        Args:
+            urls: List of URLs or single URL string
+            documents: Optional list of already-loaded Document objects
+            workers: Number of worker processes (default: serial)
+            
+        Returns:
+            List of chunked documents
+        """
+        if isinstance(urls, str):
+            urls = [urls]
+        urls = list(urls or [])
+        documents = list(documents or [])
+        
+        if not workers or workers <= 1:
+            loaded = self.load_documents_from_urls(urls) if urls else []
+            return self.create_chunks(loaded + documents)
+        
+        jobs = [("url", url, None) for url in urls]
+        jobs += [("text", doc.page_content, doc.metadata) for doc in documents]
+        
+        print(f"\n⚙️  Parsing and chunking {len(jobs)} document(s) on {workers} worker processes...")
+        start_time = time.time()
+        
+        chunks = []
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_ingest_worker,
+            initargs=(self.chunk_size, self.chunk_overlap)
+        ) as pool:
+            # Contiguous slices of the job list per task keep IPC overhead low
+            chunksize = max(1, len(jobs) // (workers * 4))
+            for job, result in zip(jobs, pool.map(_parse_and_chunk, jobs, chunksize=chunksize)):
+                if "error" in result:
+                    print(f"   ❌ Failed: {str(job[1])[:60]}: {result['error']}")
+                    continue
+                for record in result["records"]:
+                    chunks.extend(_chunks_from_spans(record))
+        
+        print(f"   Done in {time.time() - start_time:.1f}s")
+        self._print_chunk_stats(chunks)
         
         return chunks
     
@@ -149,7 +509,7 @@ class RAGSystem:
             save_backup: Save embeddings to pickle file (default: True)
             
         Returns:
-            List of embeddings
+            (len(chunks), dim) float32 array of embeddings
         """
         print(f"\n🔄 Creating embeddings...")
         print(f"   Model: {self.embedding_model_name}")
@@ -161,35 +521,128 @@ class RAGSystem:
         texts = [chunk.page_content for chunk in chunks]
         
         # Create embeddings
-        embeddings_list = self.embeddings.embed_documents(texts)
+        embeddings = self.embed_texts(texts)
         
         elapsed = time.time() - start_time
-        print(f"✅ Created {len(embeddings_list)} embeddings in {elapsed:.1f}s")
+        print(f"✅ Created {len(embeddings)} embeddings in {elapsed:.1f}s")
+        print(f"   Memory: {embeddings.nbytes / 1e6:.1f} MB ({embeddings.dtype})")
         
-        # Save backup
+        # Save backup (the array pickles as one raw buffer)
         if save_backup:
             data = {
                 'chunks': chunks,
-                'embeddings': embeddings_list,
+                'embeddings': embeddings,
                 'metadata': [chunk.metadata for chunk in chunks],
                 'embedding_model': self.embedding_model_name,
                 'chunk_size': self.chunk_size,
                 'chunk_overlap': self.chunk_overlap
             }
             with open('embeddings_backup.pkl', 'wb') as f:
-                pickle.dump(data, f)
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
             print(f"💾 Backup saved to: embeddings_backup.pkl")
         
-        return embeddings_list
+        return embeddings
+    
+    
+    def embed_texts(self, texts):
+        """
+        Embed texts as a contiguous float32 array (see embed_array)
+        """
+        return embed_array(self.embeddings, texts)
+    
+    
+    def search_embeddings(self, query_text, chunks, embeddings, k=5):
+        """
+        Exact search over chunks embedded in memory, without ChromaDB
+        
+        Args:
+            query_text: Query string
+            chunks: Document chunks
+            embeddings: Their embeddings, as returned by create_embeddings
+            k: Number of results
+            
+        Returns:
+            List of (chunk, similarity) pairs, best first
+        """
+        query_embedding = self.embeddings.embed_query(query_text)
+        indices, scores = search_array(query_embedding, embeddings, k)
+        return [(chunks[i], float(score)) for i, score in zip(indices, scores)]
+    
+    
+    def _collection_metadata(self):
+        return {
+            "description": f"Healthcare AI documents - {self.embedding_model_name}",
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            **self.hnsw
+        }
+    
+    
+    def _create_collections(self, client, collection_name, sources, partition_threshold=None,
+                            extra_metadata=None):
+        """
+        Create a collection and, with partition_threshold, its source partitions
+        
+        Args:
+            client: ChromaDB client
+            collection_name: Main collection name (a new version, see collection_versions.py)
+            sources: Source of every chunk, in row order
+            partition_threshold: Sources with at least this many chunks get
+                their own collection
+            extra_metadata: Additional collection metadata
+            
+        Returns:
+            (collections by name, chunk rows by collection name, partition map)
+        """
+        # Split large sources out into their own collections
+        partition_map = {}
+        if partition_threshold:
+            counts = Counter(sources)
+            partition_map = {
+                source: partition_name(collection_name, source)
+                for source, count in counts.items()
+                if count >= partition_threshold
+            }
+        
+        collection_metadata = {**self._collection_metadata(), **(extra_metadata or {})}
+        if partition_map:
+            collection_metadata[PARTITION_MAP_KEY] = json.dumps(partition_map)
+        
+        # Create new collection
+        targets = {collection_name: client.create_collection(
+            name=collection_name,
+            metadata=collection_metadata
+        )}
+        for name in sorted(set(partition_map.values())):
+            targets[name] = client.create_collection(
+                name=name,
+                metadata={**collection_metadata, "partition_of": collection_name}
+            )
+        
+        rows = {name: [] for name in targets}
+        for i, source in enumerate(sources):
+            rows[partition_map.get(source, collection_name)].append(i)
+        
+        return targets, rows, partition_map
     
     
-    def store_in_chromadb(self, chunks, collection_name="healthcare_ai_docs"):
+    def store_in_chromadb(self, chunks, collection_name="healthcare_ai_docs", partition_threshold=None):
         """
         Store chunks in ChromaDB
         
+        Every chunk is stored with source, source_domain, title and
+        ingest_date metadata so queries can filter on them.
+        
+        The chunks go into a new version of the collection while queries
+        keep using the current one; once its count is validated the
+        collection_name alias is switched to it and old versions are
+        garbage-collected (see collection_versions.py).
+        
         Args:
             chunks: List of Document chunks
-            collection_name: Name for the collection
+            collection_name: Name (alias) for the collection
+            partition_threshold: If set, sources with at least this many chunks
+                get their own collection and queries are routed to them
             
         Returns:
             ChromaDB collection object
@@ -200,22 +653,10 @@ class RAGSystem:
         # Connect to ChromaDB
         client = chromadb.PersistentClient(path="./chroma_db")
         
-        # Delete existing collection if it exists
-        try:
-            client.delete_collection(name=collection_name)
-            print(f"   Deleted existing collection")
-        except:
-            pass
-        
-        # Create new collection
-        collection = client.create_collection(
-            name=collection_name,
-            metadata={
-                "description": f"Healthcare AI documents - {self.embedding_model_name}",
-                "chunk_size": self.chunk_size,
-                "chunk_overlap": self.chunk_overlap
-            }
-        )
+        # Index filterable metadata
+        ingest_date = ingest_stamp()
+        for chunk in chunks:
+            index_metadata(chunk.metadata, ingest_date)
         
         # Prepare data
         ids = [f"doc_{i}" for i in range(len(chunks))]
@@ -223,73 +664,387 @@ class RAGSystem:
         metadatas = [chunk.metadata for chunk in chunks]
         
         # Create embeddings
-        embeddings_list = self.embeddings.embed_documents(texts)
-        
-        # Add to collection in batches
-        batch_size = 50
-        for i in range(0, len(chunks), batch_size):
-            end_idx = min(i + batch_size, len(chunks))
-            collection.add(
-                ids=ids[i:end_idx],
-                embeddings=embeddings_list[i:end_idx],
-                documents=texts[i:end_idx],
-                metadatas=metadatas[i:end_idx]
+        embeddings = self.embed_texts(texts)
+        
+        # Build a new version; readers stay on the current one until the swap
+        with new_version(client, collection_name) as version:
+            print(f"   Building version: {version}")
+            targets, rows, partition_map = self._create_collections(
+                client, version, [metadata["source"] for metadata in metadatas], partition_threshold
+            )
+            collection = targets[version]
+            
+            # Add to collection(s) in batches
+            batch_size = 50
+            for name, indices in rows.items():
+                if name != version:
+                    print(f"   Partition: {name} ({len(indices)} chunks)")
+                for i in range(0, len(indices), batch_size):
+                    batch = indices[i:i + batch_size]
+                    targets[name].add(
+                        ids=[ids[j] for j in batch],
+                        embeddings=embeddings[batch],
+                        documents=[texts[j] for j in batch],
+                        metadatas=[metadatas[j] for j in batch]
+                    )
+                    print(f"   Added batch {i//batch_size + 1}/{(len(indices)-1)//batch_size + 1}")
+        
+        publish(client, collection_name, version, len(chunks))
+        print(f"✅ Stored {len(chunks)} chunks in ChromaDB")
+        if partition_map:
+            print(f"   Partitions: {len(partition_map)} source(s) in their own collection")
+        print(f"   Location: ./chroma_db/")
+        
+        return collection
+    
+    
+    def store_compact(self, documents, collection_name="healthcare_ai_docs", compression="zlib",
+                      partition_threshold=None, batch_size=500):
+        """
+        Chunk and store documents with their text kept once, in a chunk store
+        
+        ChromaDB gets the embeddings and the filterable metadata (source,
+        source_domain, title, ingest_date) plus each chunk's row in the
+        store; the text and remaining metadata live in
+        ./chroma_db/chunk_store/<collection version>.npz and are filled back
+        in by partitions.search. See chunk_store.py. The collection is
+        rebuilt as a new version and swapped in, as in store_in_chromadb.
+        
+        Args:
+            documents: Source Documents (not chunks); may be a generator
+            collection_name: Name (alias) for the collection
+            compression: "none", "zlib" or "lzma" for the stored source text
+            partition_threshold: As in store_in_chromadb
+            batch_size: Chunks embedded and added per batch
+            
+        Returns:
+            ChunkStore
+        """
+        print(f"\n💾 Storing compact collection...")
+        print(f"   Collection: {collection_name} | Text compression: {compression}")
+        
+        ingest_date = ingest_stamp()
+        # Streamed: only the compressed text of each document is kept
+        documents = (
+            Document(page_content=doc.page_content, metadata=index_metadata(dict(doc.metadata), ingest_date))
+            for doc in documents
+        )
+        store = ChunkStore.from_documents(documents, self.text_splitter, compression)
+        filters = [
+            {key: metadata[key] for key in ("source", "source_domain", "title", "ingest_date")}
+            for metadata in store.doc_metadata
+        ]
+        
+        client = chromadb.PersistentClient(path="./chroma_db")
+        with new_version(client, collection_name) as version:
+            print(f"   Building version: {version}")
+            targets, rows, partition_map = self._create_collections(
+                client, version, [filters[d]["source"] for d in store.doc], partition_threshold,
+                extra_metadata={CHUNK_STORE_KEY: compression}
+            )
+            store.save(store_path("./chroma_db", version))
+            
+            for name, indices in rows.items():
+                if name != version:
+                    print(f"   Partition: {name} ({len(indices)} chunks)")
+                for i in range(0, len(indices), batch_size):
+                    batch = indices[i:i + batch_size]
+                    targets[name].add(
+                        ids=[f"doc_{j}" for j in batch],
+                        embeddings=self.embed_texts(store.texts(batch)),
+                        metadatas=[{**filters[store.doc[j]], CHUNK_ROW_KEY: j} for j in batch]
+                    )
+        
+        publish(client, collection_name, version, len(store))
+        sizes = store.nbytes()
+        print(f"✅ Stored {len(store)} chunks from {store.num_documents} document(s)")
+        print(f"   Text: {sizes['raw_text'] / 1e6:.2f} MB of source text in {sizes['text'] / 1e6:.2f} MB "
+              f"({sizes['per_chunk']:.0f} bytes per chunk with offsets and metadata)")
+        
+        return store
+    
+    
+    def run_ingestion(self, urls, documents=None, collection_name="healthcare_ai_docs",
+                      run_dir=None, batch_size=50):
+        """
+        Fetch, chunk, embed and store with a durable checkpoint
+        
+        Progress is recorded in a manifest under run_dir after every URL,
+        after chunking and after every batch is embedded and committed.
+        If the process dies, resume_ingestion(run_dir) continues from the
+        last committed batch without repeating any embedding call whose
+        result was saved.
+        
+        Args:
+            urls: List of URLs or single URL string
+            documents: Optional custom Document objects (added after the URLs)
+            collection_name: Name (alias) for the collection; replaced by a new
+                version once every batch is committed, as in store_in_chromadb
+            run_dir: Checkpoint directory (default: ./ingest_runs/<collection_name>)
+            batch_size: Chunks per embedding call and commit
+            
+        Returns:
+            ChromaDB collection object
+        """
+        if isinstance(urls, str):
+            urls = [urls]
+        run_dir = run_dir or os.path.join("./ingest_runs", collection_name)
+        
+        checkpoint = IngestCheckpoint.create(run_dir, {
+            "collection_name": collection_name,
+            "embedding_model": self.embedding_model_name,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "batch_size": batch_size,
+            "hnsw": self.hnsw,
+            "urls": list(urls or []),
+            "ingest_date": ingest_stamp(),
+        }, custom_documents=documents)
+        print(f"\n📝 Checkpointing run to: {run_dir}")
+        
+        return self._run_checkpointed(checkpoint)
+    
+    
+    def resume_ingestion(self, run_dir):
+        """
+        Continue an interrupted run_ingestion from its checkpoint
+        
+        Args:
+            run_dir: Checkpoint directory of the interrupted run
+            
+        Returns:
+            ChromaDB collection object
+        """
+        checkpoint = IngestCheckpoint.load(run_dir)
+        manifest = checkpoint.manifest
+        
+        # Runs checkpointed before HNSW settings were recorded used ChromaDB's defaults ({})
+        for key, value, default in (("embedding_model", self.embedding_model_name, None),
+                                    ("chunk_size", self.chunk_size, None),
+                                    ("chunk_overlap", self.chunk_overlap, None),
+                                    ("hnsw", self.hnsw, {})):
+            recorded = manifest.get(key, default)
+            if recorded != value:
+                raise ValueError(f"Run was started with {key}={recorded!r}, "
+                                 f"but this RAGSystem uses {value!r}")
+        
+        summary = checkpoint.summary()
+        print(f"\n♻️  Resuming run: {run_dir}")
+        print(f"   Stage: {summary['stage']}")
+        if summary["num_chunks"] is not None:
+            print(f"   Committed batches: {summary['committed']} | Embedded, not committed: {summary['embedded']}")
+        
+        return self._run_checkpointed(checkpoint)
+    
+    
+    def _run_checkpointed(self, checkpoint):
+        manifest = checkpoint.manifest
+        collection_name = manifest["collection_name"]
+        
+        if manifest["stage"] == "fetching":
+            # Fetch the URLs not yet recorded in the manifest
+            documents = checkpoint.load_pickle("documents", [])
+            for url in manifest["urls"]:
+                if url in manifest["fetched"]:
+                    continue
+                loaded = self.load_documents_from_urls([url])
+                documents.extend(loaded)
+                checkpoint.save_pickle("documents", documents)
+                manifest["fetched"][url] = "ok" if loaded else "failed"
+                checkpoint.save()
+            
+            documents += checkpoint.load_pickle("custom_documents", [])
+            chunks = self.create_chunks(documents)
+            for chunk in chunks:
+                index_metadata(chunk.metadata, manifest["ingest_date"])
+            checkpoint.save_pickle("chunks", chunks)
+            checkpoint.update(stage="storing", num_chunks=len(chunks))
+        else:
+            chunks = checkpoint.load_pickle("chunks")
+            print(f"   Loaded {len(chunks)} checkpointed chunks")
+        
+        client = chromadb.PersistentClient(path="./chroma_db")
+        if manifest["stage"] == "complete":
+            print(f"✅ Run already complete")
+            return client.get_collection(resolve(client, collection_name))
+        
+        print(f"\n💾 Storing in ChromaDB...")
+        print(f"   Collection: {collection_name}")
+        
+        # The run builds its own version; readers stay on the current one
+        if not manifest["collection_created"]:
+            version = reserve_version(client, collection_name)
+            client.create_collection(name=version, metadata=self._collection_metadata())
+            checkpoint.update(collection_created=True, collection_version=version)
+        # Runs checkpointed before versioning wrote to the collection itself
+        version = manifest.get("collection_version", collection_name)
+        print(f"   Version: {version}")
+        collection = client.get_collection(version)
+        
+        batch_size = manifest["batch_size"]
+        num_batches = (len(chunks) + batch_size - 1) // batch_size
+        for b in range(num_batches):
+            state = checkpoint.batch_state(b)
+            if state == BATCH_COMMITTED:
+                continue
+            
+            start = b * batch_size
+            batch = chunks[start:start + batch_size]
+            texts = [chunk.page_content for chunk in batch]
+            
+            if state == BATCH_EMBEDDED or checkpoint.has_batch_embeddings(b):
+                embeddings = checkpoint.load_batch_embeddings(b)
+            else:
+                embeddings = self.embed_texts(texts)
+                checkpoint.save_batch_embeddings(b, embeddings)
+            
+            # upsert: a crash between the write and the manifest update is harmless
+            collection.upsert(
+                ids=[f"doc_{i}" for i in range(start, start + len(batch))],
+                embeddings=embeddings,
+                documents=texts,
+                metadatas=[chunk.metadata for chunk in batch]
             )
-            print(f"   Added batch {i//batch_size + 1}/{(len(chunks)-1)//batch_size + 1}")
+            checkpoint.mark_committed(b)
+            print(f"   Committed batch {b + 1}/{num_batches}")
         
+        if version != collection_name:
+            publish(client, collection_name, version, len(chunks))
+        checkpoint.update(stage="complete")
         print(f"✅ Stored {len(chunks)} chunks in ChromaDB")
         print(f"   Location: ./chroma_db/")
         
         return collection
     
     
-    def query(self, collection_name, query_text, n_results=5):
+    def query(self, collection_name, query_text, n_results=5,
+              search_type="similarity", fetch_k=20, lambda_mult=0.5, where=None,
+              min_similarity=0.0, gap_ratio=0.3, token_budget=None, variants=4, rewrite=False):
         """
         Query the ChromaDB collection
         
         Args:
             collection_name: Name of the collection
             query_text: Query string
-            n_results: Number of results to return
+            n_results: Number of results to return (the upper bound for "adaptive")
+            search_type: "similarity", "mmr" (diversity-aware), "adaptive" or
+                "multi_query" (several phrasings fused, see multi_query.py)
+            fetch_k: Candidate pool size for MMR and adaptive (per variant for multi_query)
+            lambda_mult: MMR trade-off (1.0 = relevance only, 0.0 = diversity only)
+            where: Optional metadata filter, e.g. build_where(domain="norc.org");
+                applied inside the vector search and used to route partitions
+            min_similarity, gap_ratio, token_budget: Adaptive cut-offs
+                (see retrieval_modes.choose_k)
+            variants: Multi-query variants, the question included
+            rewrite: Multi-query variants from the chat model instead of templates
             
         Returns:
             Query results
         """
         client = chromadb.PersistentClient(path="./chroma_db")
-        collection = client.get_collection(collection_name)
+        
+        if search_type == "multi_query":
+            return multi_query_search(
+                client,
+                collection_name,
+                self.embeddings,
+                [query_text],
+                k=n_results,
+                fetch_k=fetch_k,
+                where=where,
+                n_variants=variants,
+                llm=self.llm if rewrite else None
+            )[0]
         
         # Embed query
         query_embedding = self.embeddings.embed_query(query_text)
         
-        # Query collection
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
-        )
+        if search_type == "mmr":
+            return mmr_query(
+                client,
+                collection_name,
+                query_embedding,
+                k=n_results,
+                fetch_k=fetch_k,
+                lambda_mult=lambda_mult,
+                where=where
+            )
+        
+        if search_type == "adaptive":
+            return adaptive_query(
+                client,
+                collection_name,
+                query_embedding,
+                max_k=n_results,
+                fetch_k=fetch_k,
+                where=where,
+                min_similarity=min_similarity,
+                gap_ratio=gap_ratio,
+                token_budget=token_budget
+            )
         
+        # Query collection (and any partitions the filter routes to)
+        results = search(
+            client,
+            collection_name,
+            query_embedding,
+            n_results=n_results,
+            where=where
+        )
+
         return results
 
 
-def main():
+    def query_tenant(self, tenant, query_text, n_results=5, where=None):
+        """
+        Query a tenant's collection through the collection router
+
+        Args:
+            tenant: Tenant name from the tenants map given at construction
+            query_text: Query string
+            n_results: Number of results to return
+            where: Optional metadata filter (always served by ChromaDB)
+
+        Returns:
+            Query results, with "residency" ("hit", "miss" or "chroma")
+        """
+        if self.router is None:
+            raise ValueError("No tenants configured; pass tenants= to RAGSystem")
+        query_embedding = self.embeddings.embed_query(query_text)
+        return self.router.search(tenant, query_embedding, n_results=n_results, where=where)
+
+
+def main(argv=None):
     """
     Example usage
+    
+    Ingestion is checkpointed under ./ingest_runs/; after a crash run
+    `python rag_pipeline.py --resume` to continue where it stopped.
     """
+    parser = argparse.ArgumentParser(description="Build the healthcare AI collection")
+    parser.add_argument("--resume", action="store_true",
+                        help="Resume the last interrupted ingestion run")
+    parser.add_argument("--hnsw", nargs="*", metavar="KEY=VALUE",
+                        help="HNSW settings, e.g. space=cosine M=32 construction_ef=200 search_ef=100")
+    parser.add_argument("--collection", default="healthcare_ai_500_large", help="Collection (alias) to build")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    args = parser.parse_args(argv)
+    
     # Healthcare AI URLs
-    urls = [
-        "https://www.beckerspayer.com/virtual-care/14-payer-ai-moves-in-2025/",
-        "https://www.deloitte.com/us/en/insights/industry/health-care/life-sciences-and-health-care-industry-outlooks/2026-global-health-care-outlook.html",
-        "https://www.norc.org/research/projects/use-ai-utilization-management.html"
-    ]
+    urls = list(SOURCE_URLS)
     
     print("="*70)
     print(" RAG System - Healthcare AI Documents")
     print("="*70)
     
     # Initialize system
-    rag = RAGSystem(chunk_size=500, chunk_overlap=100)
+    rag = RAGSystem(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap,
+                    hnsw=parse_hnsw_options(args.hnsw))
     
-    # Load documents
-    documents = rag.load_documents_from_urls(urls)
+    if args.resume:
+        rag.resume_ingestion(os.path.join("./ingest_runs", args.collection))
+        return
     
     # Add custom document (Fierce Healthcare)
     fierce_content = """
@@ -310,19 +1065,21 @@ def main():
             "title": "Elevance Health AI Strategy"
         }
     )
-    documents.append(fierce_doc)
-    
-    # Create chunks
-    chunks = rag.create_chunks(documents)
     
-    # Store in ChromaDB
-    collection = rag.store_in_chromadb(chunks, collection_name="healthcare_ai_500_large")
+    # Load, chunk and store in ChromaDB (checkpointed)
+    collection = rag.run_ingestion(
+        urls,
+        documents=[fierce_doc],
+        collection_name=args.collection
+    )
     
     print("\n" + "="*70)
     print("✅ RAG System Ready!")
     print("="*70)
     print(f"\nTo query:")
-    print(f"  results = rag.query('healthcare_ai_500_large', 'your question', n_results=5)")
+    print(f"  results = rag.query('{args.collection}', 'your question', n_results=5)")
+    print(f"\nTo refresh only the pages that changed:")
+    print(f"  python rag_cli.py recrawl --once")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,277 @@
+"""
+Recrawl Scheduler - Healthcare AI RAG System
+Keep a collection fresh by re-fetching only what changed
+
+Rebuilding the collection re-fetches and re-embeds every URL. The
+RecrawlScheduler instead remembers, per URL, the ETag, Last-Modified and
+a hash of the extracted text, and on each pass:
+
+1. sends a conditional GET (If-None-Match / If-Modified-Since); a 304
+   costs one round trip and nothing else
+2. on a 200, extracts the text (as WebBaseLoader does) and compares its
+   hash; markup-only changes (ads, timestamps, new ETag) stop here
+3. for changed text only: re-chunks and re-embeds the page, upserts the
+   new chunks, then retires the page's old chunks, so the page is never
+   missing from the collection
+
+Each URL has its own interval: it doubles (up to max_interval) while the
+page stays the same and resets when it changes or first succeeds.
+Failures back off the same way and keep the existing chunks; 410 Gone
+retires them. State is saved after every URL to
+chroma_db/recrawl/<collection>.json, so an interrupted pass loses nothing.
+
+The first pass has no validators yet, so it embeds every page once.
+Compact collections (chunk_store.py) are rebuilt with store_compact
+instead.
+
+Usage:
+    python rag_cli.py recrawl --once                # one pass over the due URLs
+    python rag_cli.py recrawl --interval 3600       # keep running on the schedule
+    python rag_cli.py recrawl --once --force        # check every URL now
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import chromadb
+
+from checkpoint import atomic_write
+from partitions import chunk_ids, index_metadata, ingest_stamp, write_target
+
+
+RECRAWL_DIR = "recrawl"
+DEFAULT_INTERVAL = 3600
+DEFAULT_MAX_INTERVAL = 7 * 24 * 3600
+USER_AGENT = "healthcare-ai-rag-recrawl/1.0"
+
+
+def text_hash(text):
+    """sha256 of extracted text, ignoring whitespace-only differences"""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def extract_document(url, html):
+    """
+    Page text and metadata, extracted the way WebBaseLoader does
+
+    Returns:
+        Document with source, title, description and language metadata
+    """
+    from bs4 import BeautifulSoup
+    from langchain_core.documents import Document
+
+    soup = BeautifulSoup(html, "html.parser")
+    metadata = {"source": url}
+    if title := soup.find("title"):
+        metadata["title"] = title.get_text()
+    if description := soup.find("meta", attrs={"name": "description"}):
+        metadata["description"] = description.get("content", "No description found.")
+    if page := soup.find("html"):
+        metadata["language"] = page.get("lang", "No language found.")
+    return Document(page_content=soup.get_text(), metadata=metadata)
+
+
+class RecrawlScheduler:
+    """
+    Conditional, change-detecting recrawls of source URLs into a collection
+
+    Args:
+        rag: RAGSystem providing the splitter, embeddings and collection metadata
+        urls: URLs to keep fresh
+        collection_name: Collection (or alias) the chunks live in
+        path: ChromaDB directory
+        interval: Seconds between checks of a URL that just changed
+        max_interval: Upper bound the interval backs off to
+        timeout: Seconds allowed per request
+        clock: Time source (overridable in tests)
+    """
+
+    def __init__(self, rag, urls, collection_name="healthcare_ai_500_large", path="./chroma_db",
+                 interval=DEFAULT_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL, timeout=30.0,
+                 clock=time.time):
+        import requests
+
+        self.rag = rag
+        self.urls = list(urls)
+        self.collection_name = collection_name
+        self.client = chromadb.PersistentClient(path=path)
+        self.interval = interval
+        self.max_interval = max(max_interval, interval)
+        self.timeout = timeout
+        self.clock = clock
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        self.state_path = os.path.join(path, RECRAWL_DIR, f"{collection_name}.json")
+        self.state = self._load_state()
+
+    # State ------------------------------------------------------------------
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        payload = json.dumps(self.state, indent=2).encode("utf-8")
+        atomic_write(self.state_path, lambda f: f.write(payload))
+
+    def _entry(self, url):
+        return self.state.setdefault(url, {"interval": self.interval, "next_due": 0, "failures": 0})
+
+    def due(self, now=None):
+        """URLs whose next check is due"""
+        now = self.clock() if now is None else now
+        return [url for url in self.urls if self._entry(url)["next_due"] <= now]
+
+    def next_due(self):
+        """Time of the earliest upcoming check"""
+        return min((self._entry(url)["next_due"] for url in self.urls), default=self.clock())
+
+    # Collection -------------------------------------------------------------
+
+    def _target(self, url):
+        """Collection (or partition) holding a URL's chunks in the current version"""
+        return write_target(self.client, self.collection_name, url, self.rag._collection_metadata())
+
+    def _replace_chunks(self, document, content_hash):
+        """Upsert a page's new chunks, then delete the ones from earlier versions"""
+        url = document.metadata["source"]
+        ingest_date = ingest_stamp()
+        chunks = list(self.rag.iter_chunks([document]))
+        for chunk in chunks:
+            index_metadata(chunk.metadata, ingest_date)
+            chunk.metadata["content_hash"] = content_hash
+        ids = chunk_ids(url, content_hash, len(chunks))
+
+        collection = self._target(url)
+        texts = [chunk.page_content for chunk in chunks]
+        if chunks:
+            collection.upsert(
+                ids=ids,
+                embeddings=self.rag.embed_texts(texts),
+                documents=texts,
+                metadatas=[chunk.metadata for chunk in chunks]
+            )
+        retired = self._retire(url, keep=set(ids), collection=collection)
+        return len(chunks), retired
+
+    def _retire(self, url, keep=(), collection=None):
+        """Delete a URL's chunks except keep; returns how many were deleted"""
+        collection = collection or self._target(url)
+        stale = [id_ for id_ in collection.get(where={"source": url}, include=[])["ids"] if id_ not in keep]
+        if stale:
+            collection.delete(ids=stale)
+        return len(stale)
+
+    # Checks -----------------------------------------------------------------
+
+    def check(self, url, now=None):
+        """
+        Check one URL and update the collection if its text changed
+
+        Args:
+            url: URL to check
+            now: Check time (default: clock())
+
+        Returns:
+            Dict with url, outcome ("not_modified", "unchanged", "changed",
+            "gone" or "failed"), status, chunks_added and chunks_retired
+        """
+        import requests
+
+        now = self.clock() if now is None else now
+        entry = self._entry(url)
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        report = {"url": url, "status": None, "chunks_added": 0, "chunks_retired": 0}
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            report["status"] = response.status_code
+            if response.status_code == 304:
+                report["outcome"] = "not_modified"
+            elif response.status_code == 410:
+                report["chunks_retired"] = self._retire(url)
+                report["outcome"] = "gone"
+            else:
+                response.raise_for_status()
+                response.encoding = response.apparent_encoding
+                document = extract_document(url, response.text)
+                content_hash = text_hash(document.page_content)
+                if content_hash == entry.get("content_hash"):
+                    report["outcome"] = "unchanged"
+                else:
+                    report["chunks_added"], report["chunks_retired"] = self._replace_chunks(document, content_hash)
+                    report["outcome"] = "changed"
+                    entry["content_hash"] = content_hash
+                    entry["changed_at"] = now
+                entry["etag"] = response.headers.get("ETag")
+                entry["last_modified"] = response.headers.get("Last-Modified")
+        except requests.RequestException as e:
+            report["outcome"] = "failed"
+            report["error"] = str(e)
+
+        # Quiet pages are checked less and less often; a change resets the interval
+        if report["outcome"] == "changed":
+            entry["interval"] = self.interval
+        else:
+            entry["interval"] = min(entry["interval"] * 2, self.max_interval)
+        entry["failures"] = entry["failures"] + 1 if report["outcome"] == "failed" else 0
+        entry["checked_at"] = now
+        entry["next_due"] = now + entry["interval"]
+        entry["outcome"] = report["outcome"]
+        self._save_state()
+        return report
+
+    def run_once(self, force=False):
+        """
+        Check every due URL (every URL with force)
+
+        Returns:
+            List of per-URL reports (see check)
+        """
+        now = self.clock()
+        urls = self.urls if force else self.due(now)
+        print(f"\n🔁 Recrawling {len(urls)}/{len(self.urls)} due URL(s) into {self.collection_name}")
+
+        reports = []
+        for url in urls:
+            report = self.check(url, now)
+            reports.append(report)
+            detail = {
+                "not_modified": "not modified",
+                "unchanged": "text unchanged",
+                "changed": f"+{report['chunks_added']} chunks, -{report['chunks_retired']} retired",
+                "gone": f"gone, -{report['chunks_retired']} retired",
+                "failed": report.get("error", ""),
+            }[report["outcome"]]
+            icon = {"changed": "🔄", "gone": "🗑️ ", "failed": "❌"}.get(report["outcome"], "✅")
+            print(f"   {icon} {url[:60]}: {detail}")
+
+        changed = sum(r["outcome"] == "changed" for r in reports)
+        print(f"✅ {changed} changed | next check in {max(self.next_due() - self.clock(), 0):.0f}s")
+        return reports
+
+    def run(self, poll=60.0, stop=None):
+        """
+        Recrawl on the schedule until stop (a threading.Event) is set
+
+        Args:
+            poll: Longest sleep between looking for due URLs
+            stop: Optional threading.Event ending the loop
+        """
+        while stop is None or not stop.is_set():
+            if self.due():
+                self.run_once()
+            wait = min(max(self.next_due() - self.clock(), 1.0), poll)
+            if stop is None:
+                time.sleep(wait)
+            else:
+                stop.wait(wait)
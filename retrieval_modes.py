@@ -0,0 +1,462 @@
+"""
+Retrieval Modes - Healthcare AI RAG System
+Alternative ways of picking chunks from a candidate pool
+
+- mmr: Maximal Marginal Relevance, trades relevance against redundancy
+  so the top results are not near-copies of one page
+- adaptive: fetch a candidate pool and decide per question how many
+  chunks to pass on, from the score distribution and a token budget
+- multi_query: search several variants of the question in one batch and
+  fuse the rankings (see multi_query.py)
+"""
+
+import threading
+from collections import Counter, deque
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from collection_versions import resolve
+from multi_query import DEFAULT_RRF_K, DEFAULT_VARIANTS, multi_query_search
+from partitions import CHUNK_STORE_KEY, load_partition_map, search, search_batch
+
+
+SEARCH_TYPES = ("similarity", "mmr", "adaptive", "multi_query")
+
+# Rough token estimate for chunk text (the same estimate as experiments.py)
+CHARS_PER_TOKEN = 4
+
+
+def _normalize(vectors):
+    """L2-normalize rows (or a single vector) as float32"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def mmr_select(query_embedding, candidate_embeddings, k=5, lambda_mult=0.5):
+    """
+    Select k diverse candidates with Maximal Marginal Relevance
+
+    All similarities are computed up front as matrix products; each
+    selection step is a single vectorized update over the candidate pool.
+
+    Args:
+        query_embedding: Query vector, shape (dim,)
+        candidate_embeddings: Candidate vectors, shape (n, dim)
+        k: Number of candidates to select
+        lambda_mult: 1.0 = pure relevance, 0.0 = pure diversity
+
+    Returns:
+        List of selected candidate indices, in selection order
+    """
+    candidates = _normalize(candidate_embeddings)
+    n = candidates.shape[0]
+    if n == 0 or k <= 0:
+        return []
+    k = min(k, n)
+
+    relevance = candidates @ _normalize(query_embedding)
+    pairwise = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    max_redundancy = pairwise[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_redundancy, pairwise[best], out=max_redundancy)
+
+    return selected
+
+
+def mmr_rerank(pool, query_embedding, k=5, lambda_mult=0.5):
+    """
+    Reorder a candidate pool with MMR and keep the top k
+
+    Args:
+        pool: Query results that include "embeddings"
+        query_embedding: Query vector
+        k: Number of results to keep
+        lambda_mult: Relevance/diversity trade-off
+
+    Returns:
+        Query results in ChromaDB's nested-list format
+    """
+    candidates = pool["embeddings"][0]
+    if len(candidates) == 0:
+        return pool
+
+    order = mmr_select(query_embedding, candidates, k=k, lambda_mult=lambda_mult)
+
+    return {
+        "ids": [[pool["ids"][0][i] for i in order]],
+        "documents": [[pool["documents"][0][i] for i in order]],
+        "metadatas": [[pool["metadatas"][0][i] for i in order]],
+        "distances": [[pool["distances"][0][i] for i in order]],
+    }
+
+
+def mmr_query(client, collection_name, query_embedding, k=5, fetch_k=20, lambda_mult=0.5, where=None):
+    """
+    Run an MMR search against a ChromaDB collection
+
+    Args:
+        client: ChromaDB client
+        collection_name: Collection name (partitions are searched too)
+        query_embedding: Query vector
+        k: Number of results to return
+        fetch_k: Size of the candidate pool fetched by similarity
+        lambda_mult: Relevance/diversity trade-off
+        where: Optional metadata filter pushed into the search
+
+    Returns:
+        Query results in ChromaDB's nested-list format
+    """
+    pool = search(
+        client,
+        collection_name,
+        query_embedding,
+        n_results=max(k, fetch_k),
+        where=where,
+        include=["documents", "metadatas", "distances", "embeddings"]
+    )
+    return mmr_rerank(pool, query_embedding, k=k, lambda_mult=lambda_mult)
+
+
+def distance_to_similarity(distances, space="l2"):
+    """
+    Convert ChromaDB distances to similarities (higher is better)
+
+    For "l2" the vectors are assumed unit-length (true for OpenAI
+    embeddings), where squared distance = 2 - 2 * cosine.
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    if space == "l2":
+        return 1.0 - distances / 2.0
+    return 1.0 - distances
+
+
+def collection_space(client, collection_name):
+    """Distance function of a collection ("l2" unless set at creation)"""
+    metadata = client.get_collection(resolve(client, collection_name)).metadata or {}
+    return metadata.get("hnsw:space", "l2")
+
+
+ADAPTIVE_REASONS = ("gap", "min_similarity", "token_budget", "max_k", "pool")
+
+
+def choose_k(similarities, token_counts, min_k=1, max_k=10, min_similarity=0.0,
+             gap_ratio=0.3, token_budget=None):
+    """
+    Decide how many ranked candidates to keep, for many queries at once
+
+    Candidates are kept in rank order until the first one that
+    - falls below min_similarity,
+    - follows a score drop larger than gap_ratio x the pool's score spread
+      (top minus bottom similarity), i.e. a clear break in the ranking,
+    - would push the total tokens over token_budget, or
+    - would exceed max_k.
+    The first min_k candidates are always kept.
+
+    Args:
+        similarities: (q, n) similarities, best first (NaN pads short pools)
+        token_counts: (q, n) estimated tokens per candidate
+        min_k, max_k: Bounds on the number kept
+        min_similarity: Similarity cut-off
+        gap_ratio: Relative score drop that ends the list (None disables)
+        token_budget: Total context tokens allowed (None disables)
+
+    Returns:
+        (k, reason): (q,) number kept and (q,) index into ADAPTIVE_REASONS
+    """
+    sims = np.atleast_2d(np.asarray(similarities, dtype=np.float64))
+    tokens = np.atleast_2d(np.asarray(token_counts, dtype=np.float64))
+    q, n = sims.shape
+    missing = np.isnan(sims)
+
+    # One (q, n) stop mask per reason, in ADAPTIVE_REASONS order
+    stops = np.zeros((len(ADAPTIVE_REASONS), q, n), dtype=bool)
+    with np.errstate(invalid="ignore"):
+        if gap_ratio is not None and n > 1:
+            spread = np.nanmax(sims, axis=1) - np.nanmin(sims, axis=1)
+            drops = sims[:, :-1] - sims[:, 1:]
+            stops[0, :, 1:] = (drops > gap_ratio * spread[:, None]) & (spread[:, None] > 0)
+        stops[1] = sims < min_similarity
+    if token_budget is not None:
+        stops[2] = np.cumsum(np.where(missing, 0, tokens), axis=1) > token_budget
+    stops[:3, :, :min_k] = False
+    stops[3, :, max_k:] = True
+    stops[4] = missing
+
+    stop_any = stops.any(axis=0)
+    k = np.where(stop_any.any(axis=1), stop_any.argmax(axis=1), n)
+    reason = np.full(q, ADAPTIVE_REASONS.index("pool"))
+    stopped = k < n
+    reason[stopped] = stops[:, stopped, k[stopped]].argmax(axis=0)
+    return k, reason
+
+
+class AdaptiveKStats:
+    """Running statistics of the k chosen by adaptive retrieval"""
+
+    def __init__(self, window=4096):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.reasons = Counter()
+        self.ks = deque(maxlen=window)
+        self.tokens = deque(maxlen=window)
+
+    def record(self, ks, reasons, tokens):
+        with self.lock:
+            self.count += len(ks)
+            self.ks.extend(int(k) for k in ks)
+            self.tokens.extend(float(t) for t in tokens)
+            self.reasons.update(ADAPTIVE_REASONS[r] for r in reasons)
+
+    def snapshot(self):
+        with self.lock:
+            ks = np.array(self.ks)
+            tokens = np.array(self.tokens)
+            reasons = dict(self.reasons)
+        if not len(ks):
+            return {"queries": 0}
+        return {
+            "queries": self.count,
+            "mean_k": round(float(ks.mean()), 2),
+            "p50_k": int(np.percentile(ks, 50)),
+            "p90_k": int(np.percentile(ks, 90)),
+            "k_histogram": {int(k): int(c) for k, c in zip(*np.unique(ks, return_counts=True))},
+            "mean_tokens": round(float(tokens.mean()), 1),
+            "stop_reasons": reasons,
+        }
+
+
+# Shared by every adaptive retriever unless one is given its own
+adaptive_stats = AdaptiveKStats()
+
+
+def adaptive_cut(pools, space="l2", min_k=1, max_k=10, min_similarity=0.0, gap_ratio=0.3,
+                 token_budget=None, stats=None):
+    """
+    Trim candidate pools to their adaptive k
+
+    Args:
+        pools: Single-query results (with documents and distances), best first
+        space: Collection distance function
+        min_k, max_k, min_similarity, gap_ratio, token_budget: See choose_k
+        stats: AdaptiveKStats to record the chosen k in (None = don't record)
+
+    Returns:
+        Trimmed results, one per pool, each with "chosen_k" and "stop_reason"
+    """
+    n = max((len(pool["ids"][0]) for pool in pools), default=0)
+    sims = np.full((len(pools), n), np.nan)
+    tokens = np.zeros((len(pools), n))
+    for i, pool in enumerate(pools):
+        m = len(pool["ids"][0])
+        sims[i, :m] = distance_to_similarity(pool["distances"][0], space)
+        tokens[i, :m] = [len(text or "") / CHARS_PER_TOKEN for text in pool["documents"][0]]
+
+    ks, reasons = choose_k(sims, tokens, min_k, max_k, min_similarity, gap_ratio, token_budget)
+    if stats is not None:
+        stats.record(ks, reasons, [tokens[i, :k].sum() for i, k in enumerate(ks)])
+
+    trimmed = []
+    for pool, k, reason in zip(pools, ks, reasons):
+        result = {key: [values[0][:k]] for key, values in pool.items() if key != "embeddings"}
+        result["chosen_k"] = int(k)
+        result["stop_reason"] = ADAPTIVE_REASONS[reason]
+        trimmed.append(result)
+    return trimmed
+
+
+def adaptive_query(client, collection_name, query_embedding, max_k=10, fetch_k=20, where=None,
+                   min_similarity=0.0, gap_ratio=0.3, token_budget=None, stats=adaptive_stats):
+    """
+    Run an adaptive-k search against a ChromaDB collection
+
+    Args:
+        client: ChromaDB client
+        collection_name: Collection name (partitions are searched too)
+        query_embedding: Query vector
+        max_k: Most results to return
+        fetch_k: Size of the candidate pool the cut is chosen from
+        where: Optional metadata filter pushed into the search
+        min_similarity, gap_ratio, token_budget: See choose_k
+        stats: AdaptiveKStats to record the chosen k in
+
+    Returns:
+        Query results in ChromaDB's nested-list format, plus chosen_k
+    """
+    pool = search(client, collection_name, query_embedding, n_results=max(max_k, fetch_k), where=where)
+    return adaptive_cut([pool], collection_space(client, collection_name), max_k=max_k,
+                        min_similarity=min_similarity, gap_ratio=gap_ratio,
+                        token_budget=token_budget, stats=stats)[0]
+
+
+class ChromaRetriever(BaseRetriever):
+    """LangChain retriever over a Chroma collection, its partitions and filters"""
+
+    client: Any
+    collection_name: str
+    embeddings: Any
+    search_type: str = "similarity"
+    k: int = 5
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+    where: Optional[dict] = None
+
+    min_similarity: float = 0.0
+    gap_ratio: Optional[float] = 0.3
+    token_budget: Optional[int] = None
+    stats: Any = adaptive_stats
+
+    variants: int = DEFAULT_VARIANTS
+    rrf_k: int = DEFAULT_RRF_K
+    rewrite_llm: Any = None
+
+    def _results(self, query_embeddings):
+        """Search for every query vector with this retriever's settings"""
+        if self.search_type == "similarity":
+            return search_batch(self.client, self.collection_name, query_embeddings,
+                                n_results=self.k, where=self.where)
+
+        include = ["documents", "metadatas", "distances"]
+        if self.search_type == "mmr":
+            include.append("embeddings")
+        pools = search_batch(
+            self.client,
+            self.collection_name,
+            query_embeddings,
+            n_results=max(self.k, self.fetch_k),
+            where=self.where,
+            include=include
+        )
+        if self.search_type == "mmr":
+            return [
+                mmr_rerank(pool, vector, k=self.k, lambda_mult=self.lambda_mult)
+                for pool, vector in zip(pools, query_embeddings)
+            ]
+        # adaptive: k is the upper bound
+        return adaptive_cut(pools, collection_space(self.client, self.collection_name), max_k=self.k,
+                            min_similarity=self.min_similarity, gap_ratio=self.gap_ratio,
+                            token_budget=self.token_budget, stats=self.stats)
+
+    def _multi_query(self, queries):
+        return multi_query_search(self.client, self.collection_name, self.embeddings, queries,
+                                  k=self.k, fetch_k=self.fetch_k, where=self.where,
+                                  n_variants=self.variants, llm=self.rewrite_llm, rrf_k=self.rrf_k)
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        if self.search_type == "multi_query":
+            return _to_documents(self._multi_query([query])[0])
+        return _to_documents(self._results([self.embeddings.embed_query(query)])[0])
+
+    def batch(self, inputs, config=None, *, return_exceptions=False, **kwargs) -> List[List[Document]]:
+        """
+        Retrieve for many queries with one embedding call and one multi-vector search
+
+        For multi_query, every variant of every query goes into that one
+        call and search.
+
+        Args:
+            inputs: Query strings
+            return_exceptions: Return the error for every query instead of raising
+
+        Returns:
+            One list of Documents per query, in input order
+        """
+        queries = list(inputs)
+        if not queries:
+            return []
+        try:
+            if self.search_type == "multi_query":
+                results = self._multi_query(queries)
+            else:
+                query_embeddings = np.asarray(self.embeddings.embed_documents(queries), dtype=np.float32)
+                results = self._results(query_embeddings)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            return [e] * len(queries)
+        return [_to_documents(r) for r in results]
+
+
+def _to_documents(results):
+    """Single-query results in ChromaDB's nested-list format -> Documents"""
+    return [
+        Document(id=doc_id, page_content=text, metadata=metadata or {})
+        for doc_id, text, metadata in zip(
+            results["ids"][0], results["documents"][0], results["metadatas"][0]
+        )
+    ]
+
+
+def build_retriever(client, vectorstore, collection_name, embeddings,
+                    search_type="similarity", k=5, fetch_k=20, lambda_mult=0.5, where=None,
+                    min_similarity=0.0, gap_ratio=0.3, token_budget=None,
+                    variants=DEFAULT_VARIANTS, rewrite_llm=None, rrf_k=DEFAULT_RRF_K):
+    """
+    Build a retriever for the requested search type
+
+    Args:
+        client: ChromaDB client
+        vectorstore: LangChain Chroma vectorstore over the collection
+        collection_name: ChromaDB collection name or alias
+        embeddings: Embeddings used for queries
+        search_type: "similarity", "mmr", "adaptive" or "multi_query"
+        k: Number of documents to retrieve (the upper bound for adaptive)
+        fetch_k: Candidate pool size for MMR and adaptive (per variant for multi_query)
+        lambda_mult: Relevance/diversity trade-off for MMR
+        where: Optional metadata filter pushed into the search
+        min_similarity, gap_ratio, token_budget: Adaptive cut-offs (see choose_k)
+        variants, rewrite_llm, rrf_k: Multi-query settings (see multi_query.py);
+            without rewrite_llm the variants come from templates
+
+    Returns:
+        Retriever instance
+    """
+    if search_type not in SEARCH_TYPES:
+        raise ValueError(f"Unknown search_type '{search_type}', expected one of {SEARCH_TYPES}")
+
+    # Aliases are resolved per query (a rebuild may swap them), partitions
+    # are routed and compact collections hydrated by partitions.search
+    physical = resolve(client, collection_name)
+    main = client.get_collection(physical)
+    direct = (physical == collection_name and not load_partition_map(main)
+              and not (main.metadata or {}).get(CHUNK_STORE_KEY))
+
+    if search_type != "similarity" or not direct:
+        return ChromaRetriever(
+            client=client,
+            collection_name=collection_name,
+            embeddings=embeddings,
+            search_type=search_type,
+            k=k,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            where=where,
+            min_similarity=min_similarity,
+            gap_ratio=gap_ratio,
+            token_budget=token_budget,
+            variants=variants,
+            rewrite_llm=rewrite_llm,
+            rrf_k=rrf_k
+        )
+
+    search_kwargs = {"k": k}
+    if where:
+        search_kwargs["filter"] = where
+    return vectorstore.as_retriever(
+        search_type="similarity",
+        search_kwargs=search_kwargs
+    )
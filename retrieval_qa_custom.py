@@ -3,14 +3,20 @@ RAG System with Custom Prompt Template
 Healthcare AI RAG System with LangChain LCEL (Modern Approach)
 """
 
+import asyncio
+import time
+
 import chromadb
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_community.vectorstores import Chroma
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough, RunnableSequence
 from dotenv import load_dotenv
-import os
+from collection_versions import resolve
+from context_assembly import assemble_context
+from embedding_providers import get_embeddings, provider_name
+from openai_pool import get_pool, lane
+from retrieval_modes import build_retriever
 
 load_dotenv()
 
@@ -38,64 +44,111 @@ Answer:"""
     return ChatPromptTemplate.from_template(template)
 
 
+def create_answer_chain(llm):
+    """
+    Answer stage of the RAG chain: {"context", "question"} -> answer string
+    """
+    return create_custom_prompt() | llm | StrOutputParser()
+
+
+def answer_stage(rag_chain):
+    """
+    The answer stage of a chain built by create_rag_chain (everything after retrieval)
+
+    Lets bulk callers retrieve for all questions at once and then run only
+    the prompt, model and parser per question.
+    """
+    return RunnableSequence(*rag_chain.steps[1:])
+
+
 def format_docs(docs):
-    """Format retrieved documents into a single string"""
-    return "\n\n".join(doc.page_content for doc in docs)
+    """Format retrieved documents into a single string, merging overlapping chunks"""
+    return assemble_context(docs)
 
 
 def create_rag_chain(
     collection_name="healthcare_ai_500_large",
     model_name="gpt-4o-mini",
     temperature=0,
-    k=5
+    k=5,
+    search_type="similarity",
+    fetch_k=20,
+    lambda_mult=0.5,
+    where=None,
+    client=None,
+    embeddings=None,
+    llm=None,
+    min_similarity=0.0,
+    gap_ratio=0.3,
+    token_budget=None,
+    variants=4,
+    rewrite_queries=False
 ):
     """
     Create a RAG chain with custom prompt using LCEL
     
     Args:
-        collection_name: ChromaDB collection name
+        collection_name: ChromaDB collection name or alias (see collection_versions.py)
         model_name: OpenAI model to use
         temperature: Model temperature (0 = deterministic)
-        k: Number of documents to retrieve
+        k: Number of documents to retrieve (the upper bound for "adaptive")
+        search_type: "similarity", "mmr" (diversity-aware), "adaptive"
+            (k chosen per question from the score distribution) or
+            "multi_query" (several phrasings searched at once and fused)
+        fetch_k: Candidate pool size for MMR and adaptive (per variant for multi_query)
+        lambda_mult: MMR trade-off (1.0 = relevance only, 0.0 = diversity only)
+        where: Optional metadata filter pushed into the search (see partitions.build_where)
+        client, embeddings, llm: Reuse already-initialised objects (e.g. in a
+            long-running server) instead of creating new ones; embeddings
+            default to the configured provider (see embedding_providers.py)
+        min_similarity, gap_ratio, token_budget: Adaptive cut-offs
+            (see retrieval_modes.choose_k)
+        variants: Multi-query variants per question, the question included
+        rewrite_queries: Multi-query variants from the chat model instead
+            of templates (see multi_query.py)
     """
     # Initialize embeddings
-    embeddings = OpenAIEmbeddings(
-        model="text-embedding-3-large",
-        openai_api_key=os.getenv("OPENAI_API_KEY")
-    )
+    if embeddings is None:
+        embeddings = get_embeddings()
     
     # Connect to ChromaDB
-    client = chromadb.PersistentClient(path="./chroma_db")
+    if client is None:
+        client = chromadb.PersistentClient(path="./chroma_db")
     
-    # Create Chroma vectorstore from existing collection
+    # Create Chroma vectorstore from existing collection (an alias is
+    # resolved here; build_retriever re-resolves it per query)
     vectorstore = Chroma(
         client=client,
-        collection_name=collection_name,
+        collection_name=resolve(client, collection_name),
         embedding_function=embeddings
     )
     
-    # Create retriever
-    retriever = vectorstore.as_retriever(
-        search_type="similarity",
-        search_kwargs={"k": k}
-    )
-    
     # Initialize LLM
-    llm = ChatOpenAI(
-        model=model_name,
-        temperature=temperature,
-        openai_api_key=os.getenv("OPENAI_API_KEY")
-    )
+    if llm is None:
+        llm = get_pool().chat_model(model_name, temperature=temperature)
     
-    # Create custom prompt
-    custom_prompt = create_custom_prompt()
+    # Create retriever
+    retriever = build_retriever(
+        client,
+        vectorstore,
+        collection_name,
+        embeddings,
+        search_type=search_type,
+        k=k,
+        fetch_k=fetch_k,
+        lambda_mult=lambda_mult,
+        where=where,
+        min_similarity=min_similarity,
+        gap_ratio=gap_ratio,
+        token_budget=token_budget,
+        variants=variants,
+        rewrite_llm=llm if rewrite_queries else None
+    )
     
     # Create RAG chain using LCEL
     rag_chain = (
         {"context": retriever | format_docs, "question": RunnablePassthrough()}
-        | custom_prompt
-        | llm
-        | StrOutputParser()
+        | create_answer_chain(llm)
     )
     
     return rag_chain, retriever
@@ -138,6 +191,85 @@ def query_with_rag(question, rag_chain, retriever):
     return {"answer": answer, "source_documents": source_docs}
 
 
+async def aask_many(questions, rag_chain, retriever, max_concurrency=8, timeout=60.0):
+    """
+    Answer many questions concurrently
+    
+    Retrieval runs as one batch (a single embedding call and multi-vector
+    search for ChromaRetriever). Answers are then generated with the answer
+    stage's abatch, at most max_concurrency at a time, in the OpenAI pool's
+    bulk lane. A question that fails or takes longer than timeout is
+    recorded with its error; the others still complete.
+    
+    Args:
+        questions: List of question strings
+        rag_chain: Chain from create_rag_chain
+        retriever: Retriever from create_rag_chain
+        max_concurrency: Answers generated at the same time
+        timeout: Seconds allowed per answer (None = no limit)
+    
+    Returns:
+        One dict per question, in input order: question, answer,
+        source_documents, error (None on success) and latency_ms
+    """
+    questions = list(questions)
+    with lane("bulk"):
+        return await _aask_many(questions, rag_chain, retriever, max_concurrency, timeout)
+
+
+async def _aask_many(questions, rag_chain, retriever, max_concurrency, timeout):
+    retrieved = await asyncio.to_thread(
+        retriever.batch, questions, {"max_concurrency": max_concurrency}, return_exceptions=True
+    )
+    answer_chain = answer_stage(rag_chain)
+
+    async def generate(item):
+        start = time.perf_counter()
+        result = {"question": item["question"], "answer": None, "source_documents": [], "error": None}
+        try:
+            if isinstance(item["docs"], Exception):
+                raise item["docs"]
+            result["source_documents"] = item["docs"]
+            result["answer"] = await asyncio.wait_for(
+                answer_chain.ainvoke({"context": format_docs(item["docs"]), "question": item["question"]}),
+                timeout
+            )
+        except asyncio.TimeoutError:
+            result["error"] = f"TimeoutError: no answer within {timeout}s"
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["latency_ms"] = (time.perf_counter() - start) * 1000
+        return result
+
+    return await RunnableLambda(generate).abatch(
+        [{"question": q, "docs": docs} for q, docs in zip(questions, retrieved)],
+        config={"max_concurrency": max_concurrency}
+    )
+
+
+def ask_many(questions, rag_chain, retriever, max_concurrency=8, timeout=60.0, verbose=True):
+    """
+    Synchronous wrapper around aask_many (see there for arguments)
+    
+    Returns:
+        One result dict per question, in input order
+    """
+    start = time.perf_counter()
+    results = asyncio.run(aask_many(questions, rag_chain, retriever, max_concurrency, timeout))
+    elapsed = time.perf_counter() - start
+
+    if verbose:
+        failed = sum(1 for r in results if r["error"])
+        print(f"✅ Answered {len(results) - failed}/{len(results)} questions in {elapsed:.1f}s "
+              f"({len(results) / elapsed:.1f}/s, concurrency {max_concurrency})")
+        if failed:
+            print(f"⚠️  {failed} failed:")
+            for r in results:
+                if r["error"]:
+                    print(f"   - {r['question'][:60]}: {r['error']}")
+    return results
+
+
 def main():
     """
     Interactive RAG interface with custom prompt
@@ -149,7 +281,7 @@ def main():
     print("Configuration:")
     print("  - Collection: healthcare_ai_500_large")
     print("  - Model: gpt-4o-mini")
-    print("  - Embeddings: text-embedding-3-large")
+    print(f"  - Embeddings: {provider_name()}")
     print("  - Approach: LangChain Expression Language (LCEL)")
     print("  - Retrieved Docs: 5")
     print()
@@ -0,0 +1,287 @@
+"""
+Sharded Collections - Healthcare AI RAG System
+Spread chunks across several ChromaDB collections and search them in parallel
+
+Chunks are placed on a shard by a jump consistent hash of the chunk ID, so
+adding a shard only moves the chunks that now belong on it. Queries are
+sent to every shard concurrently and the per-shard top k lists are merged
+with a heap.
+"""
+
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import chromadb
+import numpy as np
+
+from partitions import chunk_id, index_metadata, ingest_stamp, merge_results
+
+
+def jump_hash(key, num_buckets):
+    """
+    Jump consistent hash (Lamping & Veach)
+
+    Args:
+        key: 64-bit integer key
+        num_buckets: Number of shards
+
+    Returns:
+        Shard index in [0, num_buckets)
+    """
+    b, j = -1, 0
+    while j < num_buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def shard_for(id_, num_shards):
+    """Shard index for a chunk ID"""
+    key = int(hashlib.sha1(id_.encode("utf-8")).hexdigest()[:16], 16)
+    return jump_hash(key, num_shards)
+
+
+class ShardedRAGSystem:
+    """
+    Scatter-gather search over N ChromaDB collections (or on-disk stores)
+    """
+
+    def __init__(self, rag=None, collection_name="healthcare_ai_500_large", num_shards=None,
+                 separate_stores=False, path="./chroma_db", max_workers=None):
+        """
+        Initialize the sharding layer
+
+        Args:
+            rag: RAGSystem used for chunk and query embeddings (optional for raw vectors)
+            collection_name: Base name; shards are "<name>__shard<i>"
+            num_shards: Number of shards (default: read from existing shards, else 4)
+            separate_stores: Give every shard its own PersistentClient directory
+            path: ChromaDB directory
+            max_workers: Threads for parallel shard calls (default: one per shard)
+        """
+        self.rag = rag
+        self.collection_name = collection_name
+        self.separate_stores = separate_stores
+        self.path = path
+        self.max_workers = max_workers
+        self._clients = {}
+        self._collections = {}
+        self._lock = threading.Lock()
+
+        if num_shards is None:
+            num_shards = self._stored_shard_count() or 4
+        self.num_shards = num_shards
+
+    def shard_name(self, shard):
+        """Collection name for a shard"""
+        return f"{self.collection_name}__shard{shard}"
+
+    def _store_path(self, shard):
+        if self.separate_stores:
+            return os.path.join(self.path, "shards", f"shard{shard}")
+        return self.path
+
+    def _client(self, shard):
+        key = shard if self.separate_stores else 0
+        if key not in self._clients:
+            self._clients[key] = chromadb.PersistentClient(path=self._store_path(shard))
+        return self._clients[key]
+
+    def _collection(self, shard):
+        # Shard threads may open handles concurrently; ChromaDB clients are not built thread-safe
+        with self._lock:
+            if shard not in self._collections:
+                self._collections[shard] = self._client(shard).get_or_create_collection(
+                    name=self.shard_name(shard),
+                    metadata={
+                        "sharded_collection": self.collection_name,
+                        **(self.rag.hnsw if self.rag is not None else {})
+                    }
+                )
+            return self._collections[shard]
+
+    def _stored_shard_count(self):
+        count = 0
+        while True:
+            if not os.path.isdir(self._store_path(count)):
+                return count
+            try:
+                self._client(count).get_collection(self.shard_name(count))
+            except Exception:
+                return count
+            count += 1
+
+    def _pool(self):
+        return ThreadPoolExecutor(max_workers=self.max_workers or self.num_shards)
+
+    def count(self):
+        """Total number of chunks across shards"""
+        return sum(self._collection(s).count() for s in range(self.num_shards))
+
+    def add(self, ids, embeddings, texts, metadatas, batch_size=50):
+        """
+        Upsert pre-embedded chunks, routing each to its shard (an existing ID is overwritten)
+
+        Args:
+            ids: Chunk IDs
+            embeddings: Chunk embeddings (float32 array or list of vectors)
+            texts: Chunk texts
+            metadatas: Chunk metadata dicts
+            batch_size: Rows per collection.upsert call
+        """
+        rows = [[] for _ in range(self.num_shards)]
+        for i, id_ in enumerate(ids):
+            rows[shard_for(id_, self.num_shards)].append(i)
+
+        def add_shard(shard):
+            indices = rows[shard]
+            collection = self._collection(shard)
+            for start in range(0, len(indices), batch_size):
+                batch = indices[start:start + batch_size]
+                collection.upsert(
+                    ids=[ids[j] for j in batch],
+                    embeddings=embeddings[batch] if isinstance(embeddings, np.ndarray)
+                    else [embeddings[j] for j in batch],
+                    documents=[texts[j] for j in batch],
+                    metadatas=[metadatas[j] for j in batch]
+                )
+            return len(indices)
+
+        with self._pool() as pool:
+            return list(pool.map(add_shard, range(self.num_shards)))
+
+    def store(self, chunks):
+        """
+        Embed chunks with the wrapped RAGSystem and store them across shards
+
+        IDs come from each chunk's source, content hash (of its document,
+        else of the chunk text) and chunk_index (partitions.chunk_id), so
+        storing another batch adds to the shards and storing the same
+        chunks again overwrites their rows.
+
+        Args:
+            chunks: List of Document chunks
+
+        Returns:
+            Number of chunks placed on each shard
+        """
+        print(f"\n💾 Storing in {self.num_shards} shard(s)...")
+        print(f"   Base collection: {self.collection_name}")
+
+        ingest_date = ingest_stamp()
+        for chunk in chunks:
+            index_metadata(chunk.metadata, ingest_date)
+
+        ids = [
+            chunk_id(chunk.metadata["source"],
+                     chunk.metadata.get("content_hash")
+                     or hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest(),
+                     chunk.metadata.get("chunk_index", i))
+            for i, chunk in enumerate(chunks)
+        ]
+        texts = [chunk.page_content for chunk in chunks]
+        metadatas = [chunk.metadata for chunk in chunks]
+        embeddings = self.rag.embed_texts(texts)
+
+        per_shard = self.add(ids, embeddings, texts, metadatas)
+
+        print(f"✅ Stored {len(chunks)} chunks")
+        for shard, count in enumerate(per_shard):
+            print(f"   • {self.shard_name(shard)}: {count} chunks")
+        return per_shard
+
+    def search(self, query_embedding, n_results=5, where=None, include=None):
+        """
+        Query every shard in parallel and merge the top k
+
+        Args:
+            query_embedding: Query vector
+            n_results: Number of results to return
+            where: Optional metadata filter pushed into each shard's search
+            include: Fields to return (default: documents, metadatas, distances)
+
+        Returns:
+            Query results in ChromaDB's nested-list format
+        """
+        include = include or ["documents", "metadatas", "distances"]
+        kwargs = {"where": where} if where else {}
+
+        def query_shard(shard):
+            collection = self._collection(shard)
+            if collection.count() == 0:
+                return None
+            return collection.query(
+                query_embeddings=[query_embedding],
+                n_results=n_results,
+                include=include,
+                **kwargs
+            )
+
+        with self._pool() as pool:
+            results = [r for r in pool.map(query_shard, range(self.num_shards)) if r is not None]
+
+        if not results:
+            return {key: [[]] for key in ["ids"] + list(include)}
+        return merge_results(results, n_results)
+
+    def query(self, query_text, n_results=5, where=None):
+        """
+        Embed a question and search all shards
+
+        Args:
+            query_text: Query string
+            n_results: Number of results to return
+            where: Optional metadata filter
+
+        Returns:
+            Query results
+        """
+        query_embedding = self.rag.embeddings.embed_query(query_text)
+        return self.search(query_embedding, n_results=n_results, where=where)
+
+    def add_shards(self, count=1, batch_size=50):
+        """
+        Grow the shard set and move the chunks that now hash elsewhere
+
+        With jump consistent hashing only about count/(N+count) of the
+        chunks move, and they only move onto the new shards.
+
+        Args:
+            count: Number of shards to add
+            batch_size: Rows per add/delete call while moving
+
+        Returns:
+            Number of chunks moved
+        """
+        old_shards = self.num_shards
+        self.num_shards += count
+        print(f"\n🔀 Rebalancing: {old_shards} → {self.num_shards} shards")
+
+        moved = 0
+        for shard in range(old_shards):
+            collection = self._collection(shard)
+            stored = collection.get(include=["embeddings", "documents", "metadatas"])
+            moving = [i for i, id_ in enumerate(stored["ids"])
+                      if shard_for(id_, self.num_shards) != shard]
+            if not moving:
+                continue
+
+            for start in range(0, len(moving), batch_size):
+                batch = moving[start:start + batch_size]
+                batch_ids = [stored["ids"][i] for i in batch]
+                self.add(
+                    batch_ids,
+                    [stored["embeddings"][i] for i in batch],
+                    [stored["documents"][i] for i in batch],
+                    [stored["metadatas"][i] for i in batch],
+                    batch_size=batch_size
+                )
+                collection.delete(ids=batch_ids)
+            moved += len(moving)
+            print(f"   • {self.shard_name(shard)}: moved {len(moving)} chunks")
+
+        print(f"✅ Moved {moved} chunks")
+        return moved
@@ -0,0 +1,438 @@
+"""
+Tenant Routing - Healthcare AI RAG System
+One collection per client or topic, behind an LRU of preloaded indexes
+
+The CollectionRouter maps tenant names to collections and keeps the
+busiest tenants resident in memory: their chunk IDs, texts, metadata and
+a float32 embedding matrix, searched exactly without touching ChromaDB.
+Everything else goes through ChromaDB as usual.
+
+- Resident tenants are kept in least-recently-used order. Loading a
+  tenant evicts the coldest ones until the total fits memory_cap_mb.
+- Loading costs as much as dozens of ChromaDB queries, so a cold tenant
+  is only loaded once it has been queried admit_after times recently and
+  more often than every tenant it would evict. Until then, and for
+  tenants too large for the cap or queries with a metadata filter, the
+  query is served from ChromaDB.
+- Open collection handles are kept in their own, smaller LRU.
+- Tenant collections may be aliases (see collection_versions.py): a
+  handle or resident index of a version that has since been swapped out
+  is dropped and the new version is loaded.
+- Query counts are saved next to the database (tenant_stats.json).
+  prewarm() loads the tenants that were busiest last time, skipping any
+  that no longer fit, so a restart starts with the hot tenants resident.
+- stats() reports per-tenant query latency, hit/miss counts, evictions
+  and residency.
+
+Usage:
+    router = CollectionRouter({"acme": "acme_docs_500", "globex": "globex_docs_500"},
+                              memory_cap_mb=512)
+    router.prewarm()
+    results = router.search("acme", query_embedding, n_results=5)
+    print(router.stats())
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+import numpy as np
+
+from collection_versions import resolve
+from partitions import CHUNK_STORE_KEY, load_partition_map, route, search
+
+
+TENANT_STATS = "tenant_stats.json"
+MB = 1024 * 1024
+
+
+def load_tenant_map(tenants):
+    """Tenant -> collection map from a dict or a JSON file"""
+    if isinstance(tenants, dict):
+        return dict(tenants)
+    with open(tenants, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class _Resident:
+    """A tenant's chunks, held in memory for exact search"""
+
+    __slots__ = ("ids", "documents", "metadatas", "vectors", "sq_norms", "space", "nbytes", "load_ms",
+                 "collection")
+
+    def __init__(self, ids, documents, metadatas, vectors, space, load_ms, collection=None):
+        self.collection = collection
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.vectors = vectors
+        self.sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+        self.space = space
+        self.load_ms = load_ms
+        # Text and metadata are estimated from their serialized size
+        self.nbytes = (vectors.nbytes + self.sq_norms.nbytes
+                       + sum(len(doc or "") for doc in documents)
+                       + len(json.dumps(metadatas)) + 64 * len(ids))
+
+    def search(self, query_embedding, n_results):
+        """Exact top n with ChromaDB's distance for the collection's space"""
+        if not self.ids:  # empty collection: no vectors to multiply
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        query = np.asarray(query_embedding, dtype=np.float32)
+        dots = self.vectors @ query
+        if self.space == "cosine":
+            norms = np.sqrt(self.sq_norms) * np.linalg.norm(query)
+            distances = 1.0 - dots / np.maximum(norms, 1e-12)
+        elif self.space == "ip":
+            distances = 1.0 - dots
+        else:
+            distances = self.sq_norms - 2 * dots + float(query @ query)
+
+        n = min(n_results, len(distances))
+        top = np.argpartition(distances, n - 1)[:n] if n else np.array([], dtype=np.int64)
+        top = top[np.argsort(distances[top])]
+        return {
+            "ids": [[self.ids[i] for i in top]],
+            "documents": [[self.documents[i] for i in top]],
+            "metadatas": [[self.metadatas[i] for i in top]],
+            "distances": [[float(distances[i]) for i in top]],
+        }
+
+
+class TenantStats:
+    """Per-tenant query latency and cache behaviour"""
+
+    def __init__(self, window=1024):
+        self.queries = 0
+        self.hits = 0
+        self.misses = 0
+        self.chroma = 0
+        self.evictions = 0
+        self.load_ms = None
+        self.nbytes = 0
+        self.latencies = deque(maxlen=window)
+
+    def snapshot(self):
+        latencies = np.array(self.latencies)
+
+        def pct(q):
+            return round(float(np.percentile(latencies, q)), 2) if len(latencies) else 0.0
+
+        return {
+            "queries": self.queries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "chroma": self.chroma,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / self.queries, 3) if self.queries else 0.0,
+            "load_ms": round(self.load_ms, 1) if self.load_ms is not None else None,
+            "p50_ms": pct(50),
+            "p95_ms": pct(95),
+            "p99_ms": pct(99),
+        }
+
+
+class CollectionRouter:
+    """
+    Routes tenant queries to their collections through an LRU of resident indexes
+
+    Args:
+        tenants: Tenant -> collection name (dict or JSON file path)
+        client: ChromaDB client (default: PersistentClient at path)
+        path: ChromaDB directory; the tenant query counts are stored here
+        memory_cap_mb: Total memory for resident tenants
+        max_handles: Open collection handles kept
+        window: Latencies kept per tenant for the percentiles
+        admit_after: Recent queries a cold tenant needs before it is loaded
+        recent: How many of the latest queries count as "recent"
+    """
+
+    def __init__(self, tenants, client=None, path="./chroma_db", memory_cap_mb=1024,
+                 max_handles=64, window=1024, admit_after=3, recent=1000):
+        import chromadb
+
+        self.tenants = load_tenant_map(tenants)
+        self.client = client or chromadb.PersistentClient(path=path)
+        self.stats_path = os.path.join(path, TENANT_STATS)
+        self.memory_cap = int(memory_cap_mb * MB)
+        self.max_handles = max_handles
+        self.window = window
+        self.admit_after = admit_after
+
+        self.lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._resident = OrderedDict()
+        self._handles = OrderedDict()
+        self._stats = {}
+        self.resident_bytes = 0
+        self.query_counts = Counter(self._saved_counts())
+        self._recent = deque(maxlen=recent)
+        self._recent_counts = Counter()
+
+    # ------------------------------------------------------------------
+    # Tenants and handles
+    # ------------------------------------------------------------------
+
+    def collection_name(self, tenant):
+        if tenant not in self.tenants:
+            raise KeyError(f"Unknown tenant {tenant!r}")
+        return self.tenants[tenant]
+
+    def handle(self, tenant):
+        """Open (or reuse) the tenant's main collection handle (of the current version)"""
+        name = resolve(self.client, self.collection_name(tenant))
+        with self.lock:
+            if tenant in self._handles and self._handles[tenant].name == name:
+                self._handles.move_to_end(tenant)
+                return self._handles[tenant]
+        collection = self.client.get_collection(name)
+        with self.lock:
+            self._handles[tenant] = collection
+            while len(self._handles) > self.max_handles:
+                self._handles.popitem(last=False)
+        return collection
+
+    def _tenant_stats(self, tenant):
+        if tenant not in self._stats:
+            self._stats[tenant] = TenantStats(self.window)
+        return self._stats[tenant]
+
+    # ------------------------------------------------------------------
+    # Residency
+    # ------------------------------------------------------------------
+
+    def _load(self, tenant):
+        """Read every chunk of the tenant's collection (and its partitions) into memory"""
+        start = time.perf_counter()
+        main = self.handle(tenant)
+        name = main.name
+        store = None
+        if (main.metadata or {}).get(CHUNK_STORE_KEY):
+            from chunk_store import hydrate, open_store
+            store = open_store(self.client.get_settings().persist_directory, name)
+        ids, documents, metadatas, vectors = [], [], [], []
+        for part in route(name, load_partition_map(main), None):
+            collection = main if part == name else self.client.get_collection(part)
+            stored = collection.get(include=["documents", "metadatas", "embeddings"])
+            if store is not None:
+                hydrate(stored, store)
+            ids.extend(stored["ids"])
+            documents.extend(stored["documents"])
+            metadatas.extend(stored["metadatas"])
+            if len(stored["ids"]):
+                vectors.append(np.asarray(stored["embeddings"], dtype=np.float32))
+        vectors = np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+        space = (main.metadata or {}).get("hnsw:space", "l2")
+        return _Resident(ids, documents, metadatas, vectors, space, (time.perf_counter() - start) * 1000,
+                         collection=name)
+
+    def _worth_loading(self, tenant):
+        """Admission check: recently popular, and more so than the tenants it would evict"""
+        with self.lock:
+            popularity = self._recent_counts[tenant]
+            if popularity < self.admit_after:
+                return False
+            stats = self._stats.get(tenant)
+            if stats is None or not stats.nbytes:
+                return True  # size unknown until the first load
+            if stats.nbytes > self.memory_cap:
+                return False
+            needed = self.resident_bytes + stats.nbytes - self.memory_cap
+            for cold, resident in self._resident.items():
+                if needed <= 0:
+                    break
+                if self._recent_counts[cold] >= popularity:
+                    return False
+                needed -= resident.nbytes
+            return True
+
+    def _admit(self, tenant, resident):
+        """Make room by evicting the coldest tenants; False if it can never fit"""
+        with self.lock:
+            stats = self._tenant_stats(tenant)
+            stats.nbytes = resident.nbytes
+            stats.load_ms = resident.load_ms
+            if resident.nbytes > self.memory_cap:
+                return False
+            while self.resident_bytes + resident.nbytes > self.memory_cap and self._resident:
+                cold, evicted = self._resident.popitem(last=False)
+                self.resident_bytes -= evicted.nbytes
+                self._tenant_stats(cold).evictions += 1
+            self._resident[tenant] = resident
+            self.resident_bytes += resident.nbytes
+        return True
+
+    def _resident_for(self, tenant):
+        """(resident index or None, how it was found: "hit", "miss" or "chroma")"""
+        current = resolve(self.client, self.collection_name(tenant))
+        with self.lock:
+            resident = self._resident.get(tenant)
+            if resident is not None and resident.collection != current:
+                # The alias was swapped to a rebuilt version
+                del self._resident[tenant]
+                self.resident_bytes -= resident.nbytes
+                resident = None
+            if resident is not None:
+                self._resident.move_to_end(tenant)
+                return resident, "hit"
+        if not self._worth_loading(tenant):
+            return None, "chroma"
+        with self._load_lock:
+            with self.lock:
+                resident = self._resident.get(tenant)
+            if resident is not None:
+                return resident, "hit"
+            resident = self._load(tenant)
+            if self._admit(tenant, resident):
+                return resident, "miss"
+        return None, "chroma"
+
+    def evict(self, tenant):
+        """Drop a tenant from memory (it is reloaded on its next query)"""
+        with self.lock:
+            resident = self._resident.pop(tenant, None)
+            if resident is not None:
+                self.resident_bytes -= resident.nbytes
+                self._tenant_stats(tenant).evictions += 1
+
+    def prewarm(self, tenants=None):
+        """
+        Load tenants, in priority order, while they fit under the memory cap
+
+        A tenant that does not fit in the memory left is skipped (nothing is
+        evicted) and smaller tenants after it are still tried.
+
+        Args:
+            tenants: Tenants in priority order (default: busiest first by
+                the query counts saved from earlier runs)
+
+        Returns:
+            List of tenants that are now resident
+        """
+        if tenants is None:
+            tenants = [t for t, _ in self.query_counts.most_common() if t in self.tenants]
+        warmed, skipped = [], []
+        for tenant in tenants:
+            with self.lock:
+                known = self._stats.get(tenant)
+                if known is not None and known.nbytes and self.resident_bytes + known.nbytes > self.memory_cap:
+                    skipped.append(tenant)  # too big for what is left, no need to load it again
+                    continue
+            resident = self._load(tenant)
+            with self.lock:
+                stats = self._tenant_stats(tenant)
+                stats.nbytes = resident.nbytes
+                stats.load_ms = resident.load_ms
+                fits = self.resident_bytes + resident.nbytes <= self.memory_cap
+            if not fits:
+                skipped.append(tenant)
+                continue
+            self._admit(tenant, resident)
+            warmed.append(tenant)
+        if warmed:
+            print(f"🔥 Pre-warmed {len(warmed)} tenant(s): {', '.join(warmed)} "
+                  f"({self.resident_bytes / MB:.1f} MB)")
+        if skipped:
+            print(f"   Did not fit: {', '.join(skipped)}")
+        return warmed
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def search(self, tenant, query_embedding, n_results=5, where=None):
+        """
+        Search a tenant's collection
+
+        Args:
+            tenant: Tenant name
+            query_embedding: Query vector
+            n_results: Number of results
+            where: Optional metadata filter (served by ChromaDB)
+
+        Returns:
+            Query results in ChromaDB's nested-list format, plus "residency"
+            ("hit", "miss" or "chroma")
+        """
+        start = time.perf_counter()
+        name = self.collection_name(tenant)
+        with self.lock:
+            if len(self._recent) == self._recent.maxlen:
+                self._recent_counts[self._recent[0]] -= 1
+            self._recent.append(tenant)
+            self._recent_counts[tenant] += 1
+        if where is None:
+            resident, residency = self._resident_for(tenant)
+        else:
+            resident, residency = None, "chroma"
+        if resident is not None:
+            results = resident.search(query_embedding, n_results)
+        else:
+            results = search(self.client, name, query_embedding, n_results=n_results, where=where)
+        results["residency"] = residency
+
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            stats = self._tenant_stats(tenant)
+            stats.queries += 1
+            stats.latencies.append(elapsed)
+            if residency == "hit":
+                stats.hits += 1
+            elif residency == "miss":
+                stats.misses += 1
+            else:
+                stats.chroma += 1
+            self.query_counts[tenant] += 1
+        return results
+
+    # ------------------------------------------------------------------
+    # Stats
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        """Memory use, residency and per-tenant latency"""
+        with self.lock:
+            resident = {t: r.nbytes for t, r in self._resident.items()}
+            tenants = {}
+            for tenant in self.tenants:
+                snapshot = self._tenant_stats(tenant).snapshot()
+                snapshot["resident"] = tenant in resident
+                snapshot["resident_mb"] = round(resident.get(tenant, 0) / MB, 2)
+                tenants[tenant] = snapshot
+            return {
+                "memory_cap_mb": round(self.memory_cap / MB, 1),
+                "resident_mb": round(self.resident_bytes / MB, 1),
+                "resident_tenants": list(resident),
+                "open_handles": len(self._handles),
+                "tenants": tenants,
+            }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f"\n🏢 Tenants: {len(stats['tenants'])} | Resident: {len(stats['resident_tenants'])} "
+              f"({stats['resident_mb']} / {stats['memory_cap_mb']} MB)")
+        print(f"\n{'Tenant':<16} {'Queries':>8} {'Hit rate':>9} {'Evict':>6} {'p50 ms':>7} "
+              f"{'p95 ms':>7} {'Load ms':>8} {'Resident MB':>12}")
+        print("─"*79)
+        for tenant, s in stats["tenants"].items():
+            load = f"{s['load_ms']:.0f}" if s["load_ms"] is not None else "-"
+            resident = f"{s['resident_mb']:.1f}" if s["resident"] else "-"
+            print(f"{tenant:<16} {s['queries']:>8} {s['hit_rate']:>9.1%} {s['evictions']:>6} "
+                  f"{s['p50_ms']:>7.2f} {s['p95_ms']:>7.2f} {load:>8} {resident:>12}")
+
+    def _saved_counts(self):
+        if not os.path.exists(self.stats_path):
+            return {}
+        with open(self.stats_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("query_counts", {})
+
+    def save_stats(self):
+        """Persist query counts so the next start can pre-warm the busiest tenants"""
+        from checkpoint import atomic_write
+
+        with self.lock:
+            payload = json.dumps({"query_counts": dict(self.query_counts)}, indent=2).encode("utf-8")
+        os.makedirs(os.path.dirname(self.stats_path) or ".", exist_ok=True)
+        atomic_write(self.stats_path, lambda f: f.write(payload))
@@ -0,0 +1,77 @@
+"""
+Test Context Assembly - Healthcare AI RAG System
+Overlapping chunks are only stitched together within one document
+
+Offsets (start_index) are per document. Two documents that share a source
+(or have none, so partitions.index_metadata labels both "unknown") can
+have chunks at the same offsets; merging them by offset would splice one
+document's text into the other's and drop the rest.
+"""
+
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _chunks(text, size, overlap, **metadata):
+    step = size - overlap
+    return [
+        {"page_content": text[start:start + size],
+         "metadata": {**metadata, "start_index": start, "chunk_index": i}}
+        for i, start in enumerate(range(0, max(len(text) - overlap, 1), step))
+    ]
+
+
+def test_same_source_documents_are_not_spliced():
+    sys.path.insert(0, REPO_DIR)
+    from langchain_core.documents import Document
+    from context_assembly import assemble_context, merge_adjacent_chunks
+
+    print("\n" + "="*70)
+    print(" 🧵 TESTING CONTEXT ASSEMBLY")
+    print("="*70)
+
+    alpha = " ".join(f"alpha{i:02d}" for i in range(30))
+    beta = " ".join(f"beta{i:02d}" for i in range(30))
+
+    def documents(**metadata_by_doc):
+        docs = []
+        for text, metadata in ((alpha, metadata_by_doc.get("alpha", {})), (beta, metadata_by_doc.get("beta", {}))):
+            docs.extend(Document(**c) for c in _chunks(text, 80, 20, **metadata))
+        return docs
+
+    # [1] Same source, no document identity: nothing is merged, nothing is lost
+    for label, metadata in (("no source", {}), ('"unknown"', {"source": "unknown"})):
+        docs = documents(alpha=metadata, beta=metadata)
+        spans = merge_adjacent_chunks(docs)
+        assert len(spans) == len(docs)
+        context = assemble_context(docs)
+        assert all(f"alpha{i:02d}" in context and f"beta{i:02d}" in context for i in range(30))
+        print(f"[1] {label}: {len(docs)} chunks passed through unmerged")
+
+    # [2] Same source, different content_hash: one span per document
+    docs = documents(alpha={"source": "shared.txt", "content_hash": "a" * 64},
+                     beta={"source": "shared.txt", "content_hash": "b" * 64})
+    spans = merge_adjacent_chunks(docs[::-1])
+    assert sorted(span.page_content for span in spans) == sorted([alpha, beta])
+    print("[2] Same source, two content hashes: each document rebuilt exactly")
+
+    # [3] Same source and no hash, but the overlapping text disagrees: not spliced
+    docs = documents(alpha={"source": "https://example.org/a"}, beta={"source": "https://example.org/a"})
+    context = assemble_context(docs)
+    assert all(f"alpha{i:02d}" in context and f"beta{i:02d}" in context for i in range(30))
+    assert "alpha" not in "".join(s.page_content for s in merge_adjacent_chunks(docs) if "beta" in s.page_content)
+    print("[3] Same URL, conflicting overlaps: no text from one document spliced into the other")
+
+    # [4] One document: overlaps still collapse into a single span
+    docs = documents(alpha={"source": "https://example.org/a"})[:len(_chunks(alpha, 80, 20))]
+    spans = merge_adjacent_chunks(docs[::-1])
+    assert [span.page_content for span in spans] == [alpha]
+    print("[4] Single document: chunks merged back into the original text")
+
+    print("\n✅ Chunks are merged within a document only")
+
+
+if __name__ == "__main__":
+    test_same_source_documents_are_not_spliced()
@@ -0,0 +1,126 @@
+"""
+Test Directory Ingestion - Healthcare AI RAG System
+Re-ingesting a local corpus replaces exactly the chunks of the files that changed
+
+ingest_directory upserts chunks under IDs built from each file's path and
+content hash, then deletes the file's chunks from earlier contents. A file
+edited to the same text as another must not take over the other file's
+rows, an edit must only touch the edited file, writes must follow the
+partition map, and compact collections (whose text lives in a chunk store)
+must be refused.
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+COLLECTION = "ingest_test"
+
+
+def _write(path, topic, marker=""):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(f"{topic} {marker} paragraph {i} on prior authorization, claims and staffing."
+                            for i in range(30)))
+
+
+def test_reingest_replaces_only_edited_files():
+    sys.path.insert(0, REPO_DIR)
+    import chromadb
+    from collection_versions import resolve
+    from partitions import load_partition_map, search
+    from rag_pipeline import RAGSystem
+
+    print("\n" + "="*70)
+    print(" 📂 TESTING DIRECTORY RE-INGESTION")
+    print("="*70)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as root:
+        os.chdir(root)  # RAGSystem keeps its database in ./chroma_db
+        try:
+            corpus = os.path.join(root, "corpus")
+            os.makedirs(corpus)
+            paths = {name: os.path.join(corpus, f"{name}.txt") for name in ("a", "b", "c")}
+            _write(paths["a"], "Payer AI")
+            _write(paths["b"], "Claims")
+            _write(paths["c"], "Workforce")
+
+            rag = RAGSystem(embedding_provider="hashing")
+            quiet = contextlib.redirect_stdout(io.StringIO())
+            with quiet:
+                collection = rag.ingest_directory(corpus, COLLECTION, batch_size=16, workers=1)
+
+            def rows(collection):
+                stored = collection.get(include=["metadatas"])
+                by_file = {}
+                for id_, metadata in zip(stored["ids"], stored["metadatas"]):
+                    by_file.setdefault(os.path.basename(metadata["source"]), set()).add(id_)
+                return by_file
+
+            # [1] One set of rows per file
+            first = rows(collection)
+            assert set(first) == {"a.txt", "b.txt", "c.txt"} and all(first.values())
+            assert collection.count() == sum(map(len, first.values()))
+            print(f"\n[1] First run: {collection.count()} chunks from 3 files")
+
+            # [2] Unchanged re-run rewrites the same rows
+            with quiet:
+                rag.ingest_directory(corpus, COLLECTION, batch_size=16, workers=1)
+            assert rows(collection) == first
+            print("[2] Unchanged re-run: same rows")
+
+            # [3] a.txt edited to b.txt's text: a.txt's chunks are replaced, b.txt keeps its own
+            _write(paths["a"], "Claims")
+            with quiet:
+                rag.ingest_directory(corpus, COLLECTION, batch_size=16, workers=1)
+            second = rows(collection)
+            assert second["b.txt"] == first["b.txt"] and second["c.txt"] == first["c.txt"]
+            assert len(second["a.txt"]) == len(first["b.txt"])
+            assert not second["a.txt"] & (first["a.txt"] | first["b.txt"])
+            stored = collection.get(ids=sorted(second["a.txt"]))["documents"]
+            assert stored and all(text.startswith("Claims") for text in stored)
+            assert collection.count() == sum(map(len, second.values()))
+            print(f"[3] a.txt now identical to b.txt: {len(first['a.txt'])} chunks replaced, "
+                  f"b.txt and c.txt untouched")
+
+            # [4] A partitioned collection: the edit lands in the file's partition
+            documents = rag.load_documents_from_directory(corpus, workers=1)
+            with quiet:
+                rag.store_in_chromadb(rag.create_chunks(documents), "ingest_partitioned", partition_threshold=1)
+            client = chromadb.PersistentClient(path="./chroma_db")
+            main = client.get_collection(resolve(client, "ingest_partitioned"))
+            partition_map = load_partition_map(main)
+            source_c = next(source for source in partition_map if source.endswith("c.txt"))
+            _write(paths["c"], "Workforce", marker="(revised)")
+            with quiet:
+                rag.ingest_directory(corpus, "ingest_partitioned", batch_size=16, workers=1)
+            partition = client.get_collection(partition_map[source_c])
+            texts = partition.get(where={"source": source_c})["documents"]
+            assert texts and all("(revised)" in text for text in texts)
+            assert not main.get(where={"source": source_c}, include=[])["ids"]
+            found = search(client, "ingest_partitioned", rag.embeddings.embed_query("Workforce revised"),
+                           n_results=3, where={"source": source_c})
+            assert found["ids"][0] and all("(revised)" in text for text in found["documents"][0])
+            print(f"[4] Partitioned collection: {len(texts)} new chunks written to c.txt's partition")
+
+            # [5] Compact collections are refused before anything is read
+            with quiet:
+                rag.store_compact(documents, "ingest_compact")
+            try:
+                rag.ingest_directory(corpus, "ingest_compact", workers=1)
+            except ValueError as e:
+                assert "compact" in str(e)
+                print(f"[5] Compact collection refused: {e}")
+            else:
+                raise AssertionError("ingest_directory wrote into a compact collection")
+        finally:
+            os.chdir(cwd)
+
+    print("\n✅ Re-ingestion replaces exactly the edited files' chunks")
+
+
+if __name__ == "__main__":
+    test_reingest_replaces_only_edited_files()
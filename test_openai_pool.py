@@ -0,0 +1,133 @@
+"""
+Test OpenAI Pool - Healthcare AI RAG System
+Shared rate limiting and back-off against a local fake OpenAI endpoint
+
+fake_openai.py enforces request limits over a short window and answers
+429s with Retry-After. Through the pool, the LangChain clients the repo
+uses must stay under the limit, recover from 429s that do happen, and
+let interactive calls overtake a bulk backlog. Async calls must keep
+working across event loops (every ask_many call runs its own).
+"""
+
+import os
+import sys
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _run_threads(count, target):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_pool_limits_and_prioritises_openai_traffic():
+    sys.path.insert(0, REPO_DIR)
+    from fake_openai import FakeOpenAI
+    from openai_pool import OpenAIPool, RateLimiter, lane
+
+    print("\n" + "="*70)
+    print(" 📶 TESTING OPENAI POOL")
+    print("="*70)
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+    server = FakeOpenAI(rpm=10, window=1.0).start()
+    try:
+        # [1] Embeddings and chat through the shared clients
+        pool = OpenAIPool(rpm=6000, base_url=server.base_url)
+        embeddings = pool.embeddings("text-embedding-3-large")
+        vectors = embeddings.embed_documents(["prior authorization", "claims denials"])
+        assert len(vectors) == 2 and len(vectors[0]) == 256
+        answer = pool.chat_model("gpt-4o-mini").invoke("What is prior authorization?").content
+        assert answer.startswith("Fake answer to:")
+        metrics = pool.metrics()["interactive"]
+        assert metrics["requests"] == 2 and metrics["tokens"] == server.stats["tokens"]
+        print(f"\n[1] Embeddings + chat via the pool; {metrics['tokens']} tokens settled from usage")
+
+        # [2] A limit above the server's: 429s pause every caller, then all succeed
+        time.sleep(1.0)
+        server.stats.update(requests=0, rate_limited=0)
+        errors = []
+
+        def embed(i):
+            try:
+                for j in range(3):
+                    embeddings.embed_query(f"query {i}-{j}")
+            except Exception as e:
+                errors.append(e)
+
+        _run_threads(8, embed)
+        rate_limited = pool.metrics()["interactive"]["rate_limited"]
+        assert not errors and server.stats["rate_limited"] > 0
+        assert rate_limited == server.stats["rate_limited"]
+        print(f"[2] Over the limit: {rate_limited} x 429 absorbed, 24/24 calls succeeded")
+
+        # [3] A limit within the server's: no 429s at all
+        time.sleep(1.0)
+        server.stats.update(requests=0, rate_limited=0)
+        pool = OpenAIPool(rpm=360, base_url=server.base_url, burst_seconds=0.5)
+        embeddings = pool.embeddings("text-embedding-3-large")
+        errors.clear()
+        _run_threads(6, embed)
+        assert not errors and server.stats["requests"] == 18 and server.stats["rate_limited"] == 0
+        waits = pool.metrics()["interactive"]
+        print(f"[3] Within the limit: 0 x 429, queue wait p95 {waits['wait_p95_ms']:.0f} ms")
+
+        # [4] Async calls from successive event loops (each ask_many runs its own)
+        from langchain_core.documents import Document
+        from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+        from retrieval_qa_custom import ask_many, create_answer_chain, format_docs
+
+        retriever = RunnableLambda(lambda q: [Document(page_content=f"Notes on {q}")])
+        rag_chain = ({"context": retriever | format_docs, "question": RunnablePassthrough()}
+                     | create_answer_chain(pool.chat_model("gpt-4o-mini")))
+        questions = ["What is prior authorization?", "Who uses AI for claims?", "What is HEDIS?"]
+        for run in range(2):
+            results = ask_many(questions, rag_chain, retriever, verbose=False)
+            assert [r["error"] for r in results] == [None] * 3, [r["error"] for r in results]
+            assert all(r["answer"].startswith("Fake answer to:") for r in results)
+        assert pool.metrics()["bulk"]["requests"] == 6
+        print("[4] ask_many twice in one process: 6/6 answers, all through the shared limiter")
+    finally:
+        server.close()
+
+    # [5] Interactive requests overtake a bulk backlog
+    limiter = RateLimiter(rpm=1200, burst_seconds=0.05)  # one request every 50 ms
+    finished = {}
+
+    def bulk(i):
+        with lane("bulk"):
+            limiter.acquire(1)
+        finished[f"bulk{i}"] = time.monotonic()
+
+    threads = [threading.Thread(target=bulk, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    waited = limiter.acquire(1)
+    finished["interactive"] = time.monotonic()
+    for thread in threads:
+        thread.join()
+    order = sorted(finished, key=finished.get)
+    metrics = limiter.metrics()
+    assert metrics["bulk"]["max_queued"] >= 10
+    assert len(order) - 1 - order.index("interactive") >= 10 and waited < 0.2  # overtook most of the queue
+    print(f"[5] Interactive waited {waited * 1000:.0f} ms behind a queue of "
+          f"{metrics['bulk']['max_queued']} bulk requests (finished #{order.index('interactive') + 1} of 21)")
+
+    # [6] Tokens per minute are enforced too
+    limiter = RateLimiter(rpm=6000, tpm=600, burst_seconds=1.0)  # 10 tokens/s
+    assert limiter.acquire(10) < 0.05
+    waited = limiter.acquire(5)
+    assert 0.4 < waited < 0.8
+    print(f"[6] Token bucket: 5 tokens waited {waited * 1000:.0f} ms after a 10-token burst")
+
+    print("\n✅ OpenAI traffic is pooled, limited and prioritised")
+
+
+if __name__ == "__main__":
+    test_pool_limits_and_prioritises_openai_traffic()
@@ -0,0 +1,175 @@
+"""
+Test Recrawl - Healthcare AI RAG System
+Conditional, change-detecting recrawls against a local HTTP server
+
+A local server serves fixture pages with an ETag, only a Last-Modified,
+or no validators at all, and answers conditional requests with 304. The
+fixtures are changed between passes; only pages whose extracted text
+changed may be re-embedded, and their old chunks must be retired.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+COLLECTION = "recrawl_test"
+
+
+def _page(title, body, extra=""):
+    paragraphs = "".join(f"<p>{body} paragraph {i} about prior authorization and claims.</p>" for i in range(40))
+    return f"<html lang='en'><head><title>{title}</title>{extra}</head><body>{paragraphs}</body></html>"
+
+
+class FixtureServer:
+    """Serves {path: {"html", "etag", "last_modified", "status"}} and logs every request"""
+
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+        fixtures = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                page = fixtures.pages.get(self.path)
+                conditional = self.headers.get("If-None-Match") or self.headers.get("If-Modified-Since")
+                fixtures.requests.append((self.path, bool(conditional)))
+                if page is None or page.get("status", 200) != 200:
+                    self.send_response(page["status"] if page else 404)
+                    self.end_headers()
+                    return
+                if ((page.get("etag") and self.headers.get("If-None-Match") == page["etag"])
+                        or (not page.get("etag") and page.get("last_modified")
+                            and self.headers.get("If-Modified-Since") == page["last_modified"])):
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                body = page["html"].encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                if page.get("etag"):
+                    self.send_header("ETag", page["etag"])
+                if page.get("last_modified"):
+                    self.send_header("Last-Modified", page["last_modified"])
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_recrawl_only_reembeds_changed_pages():
+    sys.path.insert(0, REPO_DIR)
+    from rag_pipeline import RAGSystem
+    from recrawl import RecrawlScheduler
+
+    print("\n" + "="*70)
+    print(" 🔁 TESTING INCREMENTAL RECRAWL")
+    print("="*70)
+
+    server = FixtureServer()
+    server.pages = {
+        "/etag": {"html": _page("ETag page", "Payer AI"), "etag": '"a1"'},
+        "/modified": {"html": _page("Dated page", "Workforce"), "last_modified": formatdate(0, usegmt=True)},
+        "/plain": {"html": _page("Plain page", "Cybersecurity")},
+    }
+    urls = [server.url + path for path in server.pages]
+
+    rag = RAGSystem(embedding_provider="hashing")
+    embedded = []
+    embed_texts = rag.embed_texts
+    rag.embed_texts = lambda texts: embedded.append(len(texts)) or embed_texts(texts)
+
+    try:
+        with tempfile.TemporaryDirectory() as root:
+            clock = FakeClock()
+            path = os.path.join(root, "chroma_db")
+            scheduler = RecrawlScheduler(rag, urls, COLLECTION, path=path, interval=60, max_interval=600,
+                                         clock=clock)
+            collection = lambda: scheduler.client.get_collection(COLLECTION)
+
+            def ids(url):
+                return set(collection().get(where={"source": url}, include=[])["ids"])
+
+            # [1] First pass: no validators yet, every page is embedded
+            reports = scheduler.run_once()
+            assert [r["outcome"] for r in reports] == ["changed"] * 3
+            first_ids = {url: ids(url) for url in urls}
+            total = collection().count()
+            assert total == sum(r["chunks_added"] for r in reports) > 0
+            print(f"\n[1] First pass: {total} chunks in {len(embedded)} embedding call(s)")
+
+            # [2] Nothing due before the interval; then nothing changed
+            assert scheduler.due() == []
+            clock.now += 60
+            embedded.clear()
+            server.requests.clear()
+            reports = scheduler.run_once()
+            assert [r["outcome"] for r in reports] == ["not_modified", "not_modified", "unchanged"]
+            assert [conditional for _, conditional in server.requests] == [True, True, False]
+            assert embedded == [] and collection().count() == total
+            print("[2] Unchanged pass: 2 x 304, 1 x same text, no embedding calls")
+
+            # Quiet pages back off
+            assert all(scheduler.state[url]["interval"] == 120 for url in urls)
+
+            # [3] One real change, one markup-only change
+            server.pages["/etag"].update(html=_page("ETag page", "Payer AI (updated)"), etag='"a2"')
+            server.pages["/modified"].update(
+                html=_page("Dated page", "Workforce", extra="<meta name='build' content='2'>"),
+                last_modified=formatdate(86400, usegmt=True))
+            clock.now += 120
+            embedded.clear()
+            reports = scheduler.run_once()
+            assert [r["outcome"] for r in reports] == ["changed", "unchanged", "unchanged"]
+            etag_url = urls[0]
+            assert ids(etag_url) and not ids(etag_url) & first_ids[etag_url]  # old chunks retired
+            assert reports[0]["chunks_retired"] == len(first_ids[etag_url])
+            assert sum(embedded) == reports[0]["chunks_added"]
+            assert collection().count() == total - len(first_ids[etag_url]) + len(ids(etag_url))
+            documents = collection().get(where={"source": etag_url})["documents"]
+            assert all("(updated)" in doc for doc in documents if "paragraph" in doc)
+            assert scheduler.state[etag_url]["interval"] == 60  # a change resets the interval
+            print(f"[3] Changed page: +{reports[0]['chunks_added']} / -{reports[0]['chunks_retired']} chunks; "
+                  f"markup-only change not re-embedded")
+
+            # [4] A page that is gone is retired
+            server.pages["/plain"]["status"] = 410
+            reports = scheduler.run_once(force=True)
+            assert reports[2]["outcome"] == "gone" and not ids(urls[2])
+            print(f"[4] 410 Gone: -{reports[2]['chunks_retired']} chunks")
+
+            # [5] State survives a restart: validators are sent straight away
+            server.requests.clear()
+            restarted = RecrawlScheduler(rag, urls[:2], COLLECTION, path=path, clock=clock)
+            reports = restarted.run_once(force=True)
+            assert [r["outcome"] for r in reports] == ["not_modified", "not_modified"]
+            print("[5] Restarted scheduler: conditional requests from saved state")
+    finally:
+        server.close()
+
+    print("\n✅ Only changed pages were re-embedded")
+
+
+if __name__ == "__main__":
+    test_recrawl_only_reembeds_changed_pages()
@@ -0,0 +1,368 @@
+"""
+Test Regression - Healthcare AI RAG System
+Golden ranking snapshots and per-stage latency budgets
+
+test_retrieval.py and demo_queries.py print results for a person to read;
+nothing fails when a ranking changes or a query gets slower. This test
+builds a collection offline from the fixture corpus and fixture
+embeddings, runs the fixed query sets (the queries of test_retrieval.py,
+demo_queries.py and rag_evaluation.py) in similarity, MMR and adaptive
+mode, and checks:
+- ranked chunk IDs and scores against the golden snapshot (scores within
+  a tolerance; results whose scores are tied within it may swap places)
+- the median time of every stage against its latency budget
+
+Budgets are multiples of a fixed calibration loop timed in the same run,
+not absolute milliseconds, so a slower or busier machine (CI) gets
+proportionally larger budgets.
+
+Any regression is listed and the script exits non-zero.
+
+Fixtures (regression/):
+    corpus.jsonl       source passages
+    queries.json       query sets
+    embeddings.npz     fixture embeddings, keyed by text hash
+    golden.json        expected rankings, tolerances and latency budgets
+                       (in calibration units)
+
+Usage:
+    python test_regression.py                  # check against the golden snapshot
+    python test_regression.py --update         # accept the current rankings
+    python test_regression.py --record         # re-embed the fixtures (offline hashing)
+    python test_regression.py --record openai  # ... or with text-embedding-3-large
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(REPO_DIR, "regression")
+CORPUS_PATH = os.path.join(FIXTURE_DIR, "corpus.jsonl")
+QUERIES_PATH = os.path.join(FIXTURE_DIR, "queries.json")
+EMBEDDINGS_PATH = os.path.join(FIXTURE_DIR, "embeddings.npz")
+GOLDEN_PATH = os.path.join(FIXTURE_DIR, "golden.json")
+
+CONFIG = {"chunk_size": 500, "chunk_overlap": 100, "k": 5, "fetch_k": 20}
+MODES = ("similarity", "mmr", "adaptive")
+QUERY_STAGES = ("search", "mmr", "adaptive", "context")
+DEFAULT_TOLERANCES = {"score": 1e-4}
+# New budgets are the measured time times this factor, at least BUDGET_FLOOR
+# calibration units (then edited by hand)
+BUDGET_HEADROOM = 5
+BUDGET_FLOOR = 0.25
+
+
+def _text_key(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class FixtureEmbeddings:
+    """Embeddings served from regression/embeddings.npz; unknown texts are an error"""
+
+    def __init__(self, path=EMBEDDINGS_PATH):
+        data = np.load(path)
+        self.vectors = dict(zip(data["keys"].tolist(), data["vectors"]))
+
+    def embed_documents(self, texts):
+        missing = [text for text in texts if _text_key(text) not in self.vectors]
+        if missing:
+            raise KeyError(f"No fixture embedding for {len(missing)} text(s), e.g. {missing[0][:60]!r}; "
+                           f"chunking or queries changed, rerun with --record")
+        return [self.vectors[_text_key(text)] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def load_fixtures():
+    """Corpus Documents and query sets"""
+    from langchain_core.documents import Document
+
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    documents = [Document(page_content=r["text"], metadata={"source": r["source"], "title": r["title"]})
+                 for r in records]
+    with open(QUERIES_PATH, encoding="utf-8") as f:
+        query_sets = json.load(f)
+    return documents, query_sets
+
+
+def chunk_corpus(documents):
+    from rag_pipeline import iter_split, make_text_splitter
+
+    splitter = make_text_splitter(CONFIG["chunk_size"], CONFIG["chunk_overlap"])
+    return list(iter_split(splitter, documents))
+
+
+def record_embeddings(model="hashing"):
+    """Embed every fixture chunk and query and write regression/embeddings.npz"""
+    from embedding_providers import get_embeddings
+
+    documents, query_sets = load_fixtures()
+    texts = [chunk.page_content for chunk in chunk_corpus(documents)]
+    texts += sorted({query for queries in query_sets.values() for query in queries})
+
+    if model == "openai":
+        from dotenv import load_dotenv
+        load_dotenv()
+    embeddings = get_embeddings(model, model="text-embedding-3-large", dim=256)
+
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    keys = np.array([_text_key(text) for text in texts])
+    with open(EMBEDDINGS_PATH, "wb") as f:
+        np.savez_compressed(f, keys=keys, vectors=vectors, model=np.array(model))
+    print(f"💾 Recorded {len(texts)} fixture embeddings ({model}, {vectors.shape[1]} dims)")
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def calibration_work():
+    """
+    Fixed workload every stage budget is expressed in
+
+    Mixes Python string handling and a numpy matrix product, like the
+    stages themselves (about 10 ms on a laptop).
+    """
+    texts = [f"calibration passage {i} about prior authorization" for i in range(4000)]
+    words = sorted(word for text in texts for word in text.split())
+    vectors = np.random.default_rng(0).standard_normal((2000, 256), dtype=np.float32)
+    return len(words), float((vectors @ vectors[:64].T).max())
+
+
+def run_fixtures(repeats=5):
+    """
+    Build the fixture collection and run every query set in every mode
+
+    Returns:
+        (results, timings_ms): {set: {query: {mode: {"ids", "scores"}}}} and
+        the median per-stage time (query stages per query), plus the median
+        time of calibration_work under "calibration"
+    """
+    import chromadb
+    from context_assembly import assemble_context
+    from partitions import index_metadata, ingest_stamp, search
+    from rag_pipeline import embed_array
+    from langchain_core.documents import Document
+    from retrieval_modes import (AdaptiveKStats, adaptive_query, collection_space,
+                                 distance_to_similarity, mmr_query)
+
+    documents, query_sets = load_fixtures()
+    embeddings = FixtureEmbeddings()
+    samples = {stage: [] for stage in ("chunk", "embed", "index") + QUERY_STAGES + ("calibration",)}
+    results = {}
+
+    calibration_work()  # warm-up
+    for _ in range(repeats):
+        _, ms = _timed(calibration_work)
+        samples["calibration"].append(ms)
+        chunks, ms = _timed(lambda: chunk_corpus(documents))
+        samples["chunk"].append(ms)
+        texts = [chunk.page_content for chunk in chunks]
+        vectors, ms = _timed(lambda: embed_array(embeddings, texts))
+        samples["embed"].append(ms)
+
+        with tempfile.TemporaryDirectory() as path:
+            client = chromadb.PersistentClient(path=path)
+
+            def build():
+                stamp = ingest_stamp()
+                collection = client.create_collection("regression")
+                collection.add(ids=[f"doc_{i}" for i in range(len(chunks))], embeddings=vectors,
+                               documents=texts,
+                               metadatas=[index_metadata(dict(chunk.metadata), stamp) for chunk in chunks])
+
+            _, ms = _timed(build)
+            samples["index"].append(ms)
+            space = collection_space(client, "regression")
+
+            stage_ms = {stage: 0.0 for stage in QUERY_STAGES}
+            n_queries = 0
+            for set_name, queries in query_sets.items():
+                by_query = results.setdefault(set_name, {})
+                for query in queries:
+                    n_queries += 1
+                    query_embedding = embeddings.embed_query(query)
+                    found = {}
+                    found["similarity"], ms = _timed(
+                        lambda: search(client, "regression", query_embedding, n_results=CONFIG["k"]))
+                    stage_ms["search"] += ms
+                    found["mmr"], ms = _timed(
+                        lambda: mmr_query(client, "regression", query_embedding, k=CONFIG["k"],
+                                          fetch_k=CONFIG["fetch_k"]))
+                    stage_ms["mmr"] += ms
+                    found["adaptive"], ms = _timed(
+                        lambda: adaptive_query(client, "regression", query_embedding, max_k=CONFIG["k"],
+                                               fetch_k=CONFIG["fetch_k"], stats=AdaptiveKStats()))
+                    stage_ms["adaptive"] += ms
+                    docs = [Document(page_content=text, metadata=metadata) for text, metadata in
+                            zip(found["similarity"]["documents"][0], found["similarity"]["metadatas"][0])]
+                    _, ms = _timed(lambda: assemble_context(docs))
+                    stage_ms["context"] += ms
+
+                    by_query[query] = {
+                        mode: {
+                            "ids": found[mode]["ids"][0],
+                            "scores": [round(float(s), 6) for s in
+                                       distance_to_similarity(found[mode]["distances"][0], space)],
+                        }
+                        for mode in MODES
+                    }
+            for stage in QUERY_STAGES:
+                samples[stage].append(stage_ms[stage] / max(n_queries, 1))
+
+    timings = {stage: float(np.median(values)) for stage, values in samples.items()}
+    return results, timings
+
+
+def compare_ranking(golden, current, score_tol):
+    """
+    Differences between a golden and a current ranking
+
+    A different ID at a rank is accepted when both scores at that rank
+    agree within score_tol and the golden ranking has the current ID at a
+    rank whose score is also within score_tol (a reordering of ties).
+
+    Returns:
+        List of problem descriptions (empty when the rankings match)
+    """
+    problems = []
+    g_ids, g_scores = golden["ids"], golden["scores"]
+    ids, scores = current["ids"], current["scores"]
+    if len(ids) != len(g_ids):
+        problems.append(f"{len(ids)} results, expected {len(g_ids)}")
+    for rank, (g_id, g_score, doc_id, score) in enumerate(zip(g_ids, g_scores, ids, scores), 1):
+        if abs(score - g_score) > score_tol:
+            problems.append(f"rank {rank}: score {score:.6f}, expected {g_score:.6f}")
+        elif doc_id != g_id:
+            tied = [i for i, s in zip(g_ids, g_scores) if abs(s - score) <= score_tol]
+            if doc_id not in tied:
+                problems.append(f"rank {rank}: {doc_id}, expected {g_id}")
+    return problems
+
+
+def check(results, timings, golden):
+    """List every ranking and latency regression against the golden snapshot"""
+    failures = []
+    score_tol = golden.get("tolerances", DEFAULT_TOLERANCES)["score"]
+    for set_name, by_query in results.items():
+        for query, by_mode in by_query.items():
+            expected = golden["results"].get(set_name, {}).get(query)
+            if expected is None:
+                failures.append(f"[{set_name}] {query!r}: no golden snapshot (run --update)")
+                continue
+            for mode in MODES:
+                for problem in compare_ranking(expected[mode], by_mode[mode], score_tol):
+                    failures.append(f"[{set_name}] {query!r} {mode}: {problem}")
+
+    for stage, budget_ms in budgets_ms(timings, golden).items():
+        if timings[stage] > budget_ms:
+            failures.append(f"latency {stage}: {timings[stage]:.2f} ms > budget {budget_ms:.2f} ms "
+                            f"({golden['budgets'][stage]} x {timings['calibration']:.2f} ms calibration)")
+    return failures
+
+
+def budgets_ms(timings, golden):
+    """Stage budgets in milliseconds for this run: golden multiples of its calibration time"""
+    unit = timings["calibration"]
+    return {stage: multiple * unit for stage, multiple in (golden or {}).get("budgets", {}).items()
+            if stage in timings}
+
+
+def update_golden(results, timings, golden=None):
+    """Write the current rankings as golden; budgets are kept, missing ones are added"""
+    golden = golden or {}
+    budgets = dict(golden.get("budgets", {}))
+    unit = timings["calibration"]
+    for stage, measured in timings.items():
+        if stage != "calibration":
+            budgets.setdefault(stage, max(BUDGET_FLOOR, math.ceil(measured / unit * BUDGET_HEADROOM * 100) / 100))
+    golden = {
+        "config": CONFIG,
+        "tolerances": golden.get("tolerances", DEFAULT_TOLERANCES),
+        "calibration_ms": round(unit, 2),  # where the budgets were set, for reference only
+        "budgets": budgets,
+        "results": results,
+    }
+    with open(GOLDEN_PATH, "w", encoding="utf-8") as f:
+        json.dump(golden, f, indent=1)
+        f.write("\n")
+    print(f"💾 Golden snapshot written to {os.path.relpath(GOLDEN_PATH, REPO_DIR)}")
+
+
+def print_timings(timings, golden):
+    budgets = budgets_ms(timings, golden)
+    print(f"\n{'Stage':<10} {'Median ms':>10} {'Budget ms':>10}")
+    print("─"*32)
+    for stage, measured in timings.items():
+        if stage == "calibration":
+            continue
+        budget = budgets.get(stage)
+        flag = " ❌" if budget is not None and measured > budget else ""
+        print(f"{stage:<10} {measured:>10.2f} {f'{budget:.2f}' if budget is not None else '-':>10}{flag}")
+    print(f"   (search, mmr, adaptive and context are per query; budgets are multiples of "
+          f"the calibration loop, {timings['calibration']:.2f} ms in this run)")
+
+
+def test_golden_snapshots(repeats=5):
+    """Rankings and stage latencies of the fixture collection match the golden snapshot"""
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        golden = json.load(f)
+    results, timings = run_fixtures(repeats)
+    failures = check(results, timings, golden)
+    assert not failures, "\n".join(failures)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Golden retrieval snapshots and latency budgets")
+    parser.add_argument("--update", action="store_true", help="Accept the current rankings as golden")
+    parser.add_argument("--record", nargs="?", const="hashing", choices=["hashing", "openai"],
+                        help="Re-embed the fixtures before running")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs per stage (the median is used)")
+    args = parser.parse_args(argv)
+
+    print("\n" + "="*70)
+    print(" 🧪 RETRIEVAL REGRESSION TEST")
+    print("="*70)
+
+    if args.record:
+        record_embeddings(args.record)
+
+    golden = None
+    if os.path.exists(GOLDEN_PATH):
+        with open(GOLDEN_PATH, encoding="utf-8") as f:
+            golden = json.load(f)
+
+    results, timings = run_fixtures(args.repeats)
+    n_queries = sum(len(by_query) for by_query in results.values())
+    print(f"   Query sets: {len(results)} | Queries: {n_queries} | Modes: {', '.join(MODES)}")
+
+    if args.update or golden is None:
+        update_golden(results, timings, golden)
+        print_timings(timings, golden)
+        return 0
+
+    failures = check(results, timings, golden)
+    print_timings(timings, golden)
+    if failures:
+        print(f"\n❌ {len(failures)} regression(s):")
+        for failure in failures:
+            print(f"   - {failure}")
+        return 1
+    print("\n✅ Rankings match the golden snapshot and every stage is within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
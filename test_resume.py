@@ -0,0 +1,176 @@
+"""
+Test Resume - Healthcare AI RAG System
+Kill checkpointed ingestion at random points and resume it
+
+The ingestion child process uses deterministic offline embeddings that log
+every call. It is SIGKILLed at random moments, resumed, killed again, and
+finally resumed to completion. The resulting collection must match an
+uninterrupted run, and no batch may be embedded more than once except the
+one in flight at each kill.
+"""
+
+import hashlib
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+COLLECTION = "resume_test"
+BATCH_SIZE = 5
+
+
+class CountingEmbeddings:
+    """Deterministic offline embeddings that append one line per call to a log"""
+
+    def __init__(self, log_path, dim=16, delay=0.05):
+        self.log_path = log_path
+        self.dim = dim
+        self.delay = delay
+
+    def _vector(self, text):
+        seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).standard_normal(self.dim).tolist()
+
+    def embed_documents(self, texts):
+        time.sleep(self.delay)
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps(texts[0][:40]) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def _documents(rag):
+    rng = random.Random(0)
+    words = ["payer", "prior", "authorization", "workforce", "claims", "member", "model", "policy"]
+    return [
+        rag.add_document(
+            " ".join(rng.choice(words) for _ in range(500)),
+            {"source": f"test://doc/{d}", "title": f"Doc {d}"}
+        )
+        for d in range(6)
+    ]
+
+
+def _child(mode, run_dir):
+    """Run (or resume) the ingestion inside a child process"""
+    sys.path.insert(0, REPO_DIR)
+    from rag_pipeline import RAGSystem
+
+    rag = RAGSystem(embedding_provider="hashing")
+    rag.embeddings = CountingEmbeddings(os.path.join(run_dir, "..", "embed_calls.log"))
+    print("READY", flush=True)
+
+    if mode == "start":
+        rag.run_ingestion([], documents=_documents(rag), collection_name=COLLECTION,
+                          run_dir=run_dir, batch_size=BATCH_SIZE)
+    else:
+        rag.resume_ingestion(run_dir)
+
+
+def _spawn(workdir, mode):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--child", mode, os.path.join(workdir, "run")],
+        cwd=workdir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True
+    )
+    for line in proc.stdout:
+        if line.strip() == "READY":
+            break
+    return proc
+
+
+def _finish(proc):
+    proc.stdout.read()
+    return proc.wait()
+
+
+def _snapshot(workdir):
+    import chromadb
+    from collection_versions import resolve
+    client = chromadb.PersistentClient(path=os.path.join(workdir, "chroma_db"))
+    stored = client.get_collection(resolve(client, COLLECTION)).get(include=["documents", "embeddings"])
+    order = np.argsort(stored["ids"])
+    return (
+        [stored["ids"][i] for i in order],
+        [stored["documents"][i] for i in order],
+        np.asarray(stored["embeddings"])[order],
+    )
+
+
+def _embed_calls(workdir):
+    path = os.path.join(workdir, "embed_calls.log")
+    if not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        return sum(1 for _ in f)
+
+
+def test_resume_after_random_kills(kills=4, seed=None):
+    """
+    Kill the ingestion at random points and verify the resumed result
+    """
+    rng = random.Random(seed)
+    print("\n" + "="*70)
+    print(" 💥 TESTING RESUMABLE INGESTION")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as root:
+        # Uninterrupted reference run
+        reference_dir = os.path.join(root, "reference")
+        os.makedirs(reference_dir)
+        proc = _spawn(reference_dir, "start")
+        start = time.perf_counter()
+        assert _finish(proc) == 0
+        work_seconds = time.perf_counter() - start
+        reference = _snapshot(reference_dir)
+        reference_calls = _embed_calls(reference_dir)
+        print(f"\n[1] Reference run: {len(reference[0])} chunks, {reference_calls} embedding calls")
+
+        # Interrupted run
+        crash_dir = os.path.join(root, "crash")
+        os.makedirs(crash_dir)
+        mode = "start"
+        for k in range(kills):
+            proc = _spawn(crash_dir, mode)
+            delay = rng.uniform(0, work_seconds)
+            time.sleep(delay)
+            proc.send_signal(signal.SIGKILL)
+            _finish(proc)
+            print(f"[2] Kill {k + 1}/{kills} after {delay * 1000:.0f} ms")
+            if os.path.exists(os.path.join(crash_dir, "run", "manifest.json")):
+                mode = "resume"
+
+        proc = _spawn(crash_dir, mode)
+        assert _finish(proc) == 0
+
+        crashed = _snapshot(crash_dir)
+        crashed_calls = _embed_calls(crash_dir)
+        print(f"[3] Resumed run: {len(crashed[0])} chunks, {crashed_calls} embedding calls")
+
+        assert crashed[0] == reference[0]
+        assert crashed[1] == reference[1]
+        assert np.allclose(crashed[2], reference[2])
+        # Only a call in flight when a kill landed may be repeated
+        assert crashed_calls <= reference_calls + kills
+
+    print("\n✅ Resumed collection matches the uninterrupted run")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        _child(sys.argv[2], sys.argv[3])
+    else:
+        test_resume_after_random_kills()
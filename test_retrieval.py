@@ -4,9 +4,9 @@ Demonstrate similarity search and retrieval from ChromaDB
 """
 
 import chromadb
-from langchain_openai import OpenAIEmbeddings
+from collection_versions import resolve
+from embedding_providers import embedding_model_name, get_embeddings
 from dotenv import load_dotenv
-import os
 
 load_dotenv()
 
@@ -22,18 +22,15 @@ def test_retrieval():
     # Connect to ChromaDB
     print("\n[1] Connecting to ChromaDB...")
     client = chromadb.PersistentClient(path="./chroma_db")
-    collection = client.get_collection("healthcare_ai_500_large")
+    collection = client.get_collection(resolve(client, "healthcare_ai_500_large"))
     
     print(f"✅ Connected to collection: healthcare_ai_500_large")
     print(f"   Total documents: {collection.count()}")
     
     # Initialize embeddings
     print("\n[2] Initializing embeddings model...")
-    embeddings = OpenAIEmbeddings(
-        model="text-embedding-3-large",
-        openai_api_key=os.getenv("OPENAI_API_KEY")
-    )
-    print(f"✅ Using: text-embedding-3-large")
+    embeddings = get_embeddings()
+    print(f"✅ Using: {embedding_model_name(embeddings)}")
     
     # Test queries
     test_queries = [
@@ -0,0 +1,81 @@
+"""
+Test Tenancy - Healthcare AI RAG System
+Resident tenant indexes: empty tenants, pre-warming under a memory cap
+
+A tenant whose collection is still empty is loaded as a resident index
+with no vectors; searching it must return empty results like ChromaDB
+does. prewarm() must skip a tenant that does not fit in the memory left
+and keep loading the smaller tenants after it.
+"""
+
+import os
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DIM = 32
+
+
+def _tenant(client, name, n_chunks, rng):
+    collection = client.create_collection(name)
+    if n_chunks:
+        collection.add(
+            ids=[f"{name}_{i}" for i in range(n_chunks)],
+            embeddings=rng.standard_normal((n_chunks, DIM)).astype("float32"),
+            documents=[f"{name} chunk {i} about prior authorization " * 4 for i in range(n_chunks)],
+            metadatas=[{"source": f"https://{name}.example/{i % 5}"} for i in range(n_chunks)]
+        )
+
+
+def test_empty_tenants_and_prewarm_under_cap():
+    sys.path.insert(0, REPO_DIR)
+    import chromadb
+    import numpy as np
+    from tenancy import MB, CollectionRouter
+
+    print("\n" + "="*70)
+    print(" 🏢 TESTING TENANT RESIDENCY")
+    print("="*70)
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as path:
+        client = chromadb.PersistentClient(path=path)
+        sizes = {"empty": 0, "large": 4000, "small": 50, "tiny": 20}
+        for name, n_chunks in sizes.items():
+            _tenant(client, name, n_chunks, rng)
+        tenants = {name: name for name in sizes}
+        query = rng.standard_normal(DIM).astype("float32")
+
+        # [1] An empty tenant is served from memory with empty results
+        router = CollectionRouter(tenants, client=client, path=path, admit_after=1)
+        results = router.search("empty", query, n_results=3)
+        assert results["residency"] == "miss"
+        assert {key: results[key] for key in ("ids", "documents", "metadatas", "distances")} == \
+            {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        assert router.search("empty", query, n_results=3)["residency"] == "hit"
+        print("\n[1] Empty tenant: resident, search returns empty nested lists")
+
+        # [2] prewarm skips a tenant that does not fit and keeps going
+        router = CollectionRouter(tenants, client=client, path=path, memory_cap_mb=0.5)
+        warmed = router.prewarm(["large", "small", "empty", "tiny"])
+        assert warmed == ["small", "empty", "tiny"]
+        stats = router.stats()
+        assert stats["resident_tenants"] == warmed and router.resident_bytes <= router.memory_cap
+        assert router._stats["large"].nbytes > router.memory_cap - router.resident_bytes
+        print(f"[2] prewarm under a 0.5 MB cap: {', '.join(warmed)} resident "
+              f"({router.resident_bytes / MB:.2f} MB); large skipped")
+
+        # [3] Resident results match ChromaDB's
+        for name in ("small", "tiny"):
+            resident = router.search(name, query, n_results=5)
+            assert resident["residency"] == "hit"
+            direct = client.get_collection(name).query(query_embeddings=[query], n_results=5)
+            assert resident["ids"] == direct["ids"]
+            assert np.allclose(resident["distances"][0], direct["distances"][0], atol=1e-3)
+        print("[3] Resident search matches ChromaDB for the pre-warmed tenants")
+
+    print("\n✅ Empty tenants and pre-warming behave under the memory cap")
+
+
+if __name__ == "__main__":
+    test_empty_tenants_and_prewarm_under_cap()